@@ -0,0 +1,221 @@
+"""
+Генератор синтетических историй пользователей для бенчмарков запросов.
+
+Заполняет users, tasks, deals, user_stats и user_daily_stats с реалистичным
+перекосом: у большинства пользователей несколько записей (распределение
+Парето), у нескольких «power users» — сотни тысяч. Записи созданы за
+последние HISTORY_DAYS дней. Счётчики считаются тут же, поэтому /report
+после генерации сходится с python -m database.stats.
+
+Генерация дописывает данные к уже имеющимся (tg_id синтетических
+пользователей начинаются с SYNTHETIC_TG_ID), так что базу можно
+наращивать ступенями. На PostgreSQL строки грузятся через COPY (database.db.bulk_insert).
+
+Запуск:
+    python -m benchmarks.datagen --db postgresql+asyncpg://u:p@127.0.0.1:5433/bench --reset
+    python -m benchmarks.datagen --users 100000 --power-users 3 --power-rows 150000
+"""
+
+import sys
+import time
+import random
+import asyncio
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+from benchmarks.db import prepare_database, use_database
+
+logger = logging.getLogger(__name__)
+
+# Синтетические пользователи не пересекаются с настоящими Telegram ID
+SYNTHETIC_TG_ID = 9_000_000_000
+
+TASK_TITLES = ["Позвонить клиенту", "Подготовить КП", "Отправить счёт", "Встреча", "Написать письмо", "Сверить оплату"]
+DEAL_TITLES = ["Поставка", "Договор", "Подписка", "Внедрение", "Консультация", "Опт"]
+TASK_STATUSES = ["Не выполнена", "Выполнена"]
+DEAL_STATUSES = ["Открыта", "В процессе", "Закрыта"]
+DEAL_WEIGHTS = [3, 2, 5]
+
+BATCH = 10_000
+# Глубина истории: created_at равномерно за последние HISTORY_DAYS дней
+HISTORY_DAYS = 365
+# Задача/сделка закрывается в пределах двух недель после создания
+MAX_CLOSE_DAYS = 14
+DAILY_COLUMNS = ["user_id", "day", "tasks_created", "tasks_done", "deals_created", "deals_closed", "deals_closed_sum"]
+
+
+def history_size(rng: random.Random, mean: float, cap: int) -> int:
+    """
+    Длина истории обычного пользователя: Парето с хвостом
+    (alpha=1.5 — у E[X-1] = 2, масштаб подгоняется под mean).
+    """
+    return min(cap, int((rng.paretovariate(1.5) - 1) * mean / 2))
+
+
+async def generate(
+    engine,
+    users: int,
+    power_users: int = 0,
+    power_rows: int = 100_000,
+    mean_rows: float = 8.0,
+    max_rows: int = 5_000,
+    seed: int = 1,
+) -> dict:
+    """
+    Дописывает users новых пользователей (из них power_users — с power_rows
+    задачами и столько же сделками). Возвращает сводку: сколько строк вставлено,
+    id power users и время генерации.
+    """
+    from sqlalchemy import func, select, text
+    from database.db import bulk_insert
+    from database.models import User
+    from services.due_time import local_day
+
+    started = time.monotonic()
+    summary = {"users": 0, "tasks": 0, "deals": 0, "power_user_ids": []}
+
+    async with engine.begin() as conn:
+        first_id = (await conn.execute(select(func.coalesce(func.max(User.id), 0)))).scalar() + 1
+        # Повторный запуск продолжает нумерацию tg_id, а не пересекается с прошлым
+        first_tg = (await conn.execute(
+            select(func.coalesce(func.max(User.tg_id), SYNTHETIC_TG_ID - 1)).where(User.tg_id >= SYNTHETIC_TG_ID)
+        )).scalar() + 1
+        rng = random.Random(f"{seed}:{first_tg}")
+        now = datetime.utcnow()
+        aware_now = now.replace(tzinfo=timezone.utc)
+
+        def timestamps(closed: bool):
+            created = aware_now - timedelta(seconds=rng.random() * HISTORY_DAYS * 86400)
+            if not closed:
+                return created, None
+            delay = min(aware_now - created, timedelta(days=MAX_CLOSE_DAYS)) * rng.random()
+            return created, created + delay
+
+        user_rows, task_rows, deal_rows, stats_rows, daily_rows = [], [], [], [], []
+
+        async def flush(force: bool = False) -> None:
+            if force or len(task_rows) + len(deal_rows) >= BATCH or len(user_rows) >= BATCH:
+                # users — первыми: на них ссылаются внешние ключи
+                await bulk_insert(conn, "users", ["id", "tg_id", "username", "created_at"], user_rows)
+                await bulk_insert(
+                    conn, "tasks", ["user_id", "title", "time", "status", "created_at", "closed_at"], task_rows
+                )
+                await bulk_insert(
+                    conn, "deals", ["user_id", "title", "amount", "status", "created_at", "closed_at"], deal_rows
+                )
+                await bulk_insert(
+                    conn, "user_stats", ["user_id", "tasks_done", "deals_closed", "deals_closed_sum"], stats_rows
+                )
+                await bulk_insert(conn, "user_daily_stats", DAILY_COLUMNS, daily_rows)
+                summary["tasks"] += len(task_rows)
+                summary["deals"] += len(deal_rows)
+                for rows in (user_rows, task_rows, deal_rows, stats_rows, daily_rows):
+                    rows.clear()
+
+        for offset in range(users):
+            user_id = first_id + offset
+            tg_id = first_tg + offset
+            if offset < power_users:
+                n_tasks = n_deals = power_rows
+                summary["power_user_ids"].append(user_id)
+            else:
+                n_tasks = history_size(rng, mean_rows, max_rows)
+                n_deals = history_size(rng, mean_rows / 2, max_rows)
+
+            user_rows.append((user_id, tg_id, f"bench{tg_id}", now))
+            tasks_done = deals_closed = deals_sum = 0
+            # день -> [tasks_created, tasks_done, deals_created, deals_closed, deals_closed_sum]
+            days = defaultdict(lambda: [0, 0, 0, 0, 0])
+            for _ in range(n_tasks):
+                status = TASK_STATUSES[rng.random() < 0.6]
+                created, closed = timestamps(status == "Выполнена")
+                days[local_day(created)][0] += 1
+                if closed:
+                    tasks_done += 1
+                    days[local_day(closed)][1] += 1
+                task_rows.append(
+                    (user_id, rng.choice(TASK_TITLES), f"{rng.randint(8, 20)}:00", status, created, closed)
+                )
+                if len(task_rows) >= BATCH:
+                    await flush()
+            for _ in range(n_deals):
+                status = rng.choices(DEAL_STATUSES, DEAL_WEIGHTS)[0]
+                amount = rng.randint(1, 500) * 1000
+                created, closed = timestamps(status == "Закрыта")
+                days[local_day(created)][2] += 1
+                if closed:
+                    deals_closed += 1
+                    deals_sum += amount
+                    days[local_day(closed)][3] += 1
+                    days[local_day(closed)][4] += amount
+                deal_rows.append((user_id, rng.choice(DEAL_TITLES), amount, status, created, closed))
+                if len(deal_rows) >= BATCH:
+                    await flush()
+            stats_rows.append((user_id, tasks_done, deals_closed, deals_sum))
+            daily_rows.extend((user_id, day, *counters) for day, counters in days.items())
+            await flush()
+        await flush(force=True)
+        summary["users"] = users
+
+        if conn.dialect.name == "postgresql":
+            # id пользователей заданы явно — двигаем последовательность
+            await conn.execute(text("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT max(id) FROM users))"))
+
+    if engine.dialect.name == "postgresql":
+        # Свежая статистика планировщика — иначе планы первых прогонов случайны
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("ANALYZE users, tasks, deals, user_stats, user_daily_stats"))
+
+    summary["seconds"] = time.monotonic() - started
+    logger.info(
+        "Сгенерировано: пользователей %s, задач %s, сделок %s за %.1f с",
+        summary["users"], summary["tasks"], summary["deals"], summary["seconds"],
+    )
+    return summary
+
+
+async def table_sizes(engine) -> Dict[str, int]:
+    from sqlalchemy import text
+
+    sizes = {}
+    async with engine.connect() as conn:
+        for table in ("users", "tasks", "deals"):
+            sizes[table] = (await conn.execute(text(f"SELECT count(*) FROM {table}"))).scalar()
+    return sizes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Генератор синтетических данных для бенчмарков")
+    parser.add_argument("--db", default="", help="URL базы (по умолчанию — из config.py)")
+    parser.add_argument("--reset", action="store_true", help="очистить таблицы бота перед генерацией")
+    parser.add_argument("--users", type=int, default=100_000, help="сколько пользователей добавить")
+    parser.add_argument("--power-users", type=int, default=3, help="из них с огромной историей")
+    parser.add_argument("--power-rows", type=int, default=100_000, help="задач и сделок у power user")
+    parser.add_argument("--mean-rows", type=float, default=8.0, help="средняя длина истории задач")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+async def main(args) -> None:
+    from database.db import engine
+
+    try:
+        await prepare_database(engine, args.reset)
+        summary = await generate(
+            engine, args.users, args.power_users, args.power_rows, args.mean_rows, seed=args.seed
+        )
+        print(f"Добавлено: {summary}")
+        print(f"Размер таблиц: {await table_sizes(engine)}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    arguments = parse_args(sys.argv[1:])
+    use_database(arguments.db)
+    asyncio.run(main(arguments))
@@ -0,0 +1,49 @@
+"""
+Подготовка базы для бенчмарков.
+
+SQLite: схема строится из моделей, версия схемы просто отмечается
+(миграции написаны для PostgreSQL). PostgreSQL: обычные миграции.
+"""
+
+import os
+
+from sqlalchemy import text
+
+# Таблицы бота в порядке, безопасном для удаления (сначала зависимые)
+BOT_TABLES = ("fsm_states", "user_daily_stats", "user_stats", "tasks", "deals", "users")
+
+
+def use_database(url: str) -> None:
+    """
+    Направляет бота в указанную базу. Вызывать до импорта модулей бота:
+    config.py читает DATABASE_URL при импорте. Пустой url — база из config.py.
+    """
+    if url:
+        os.environ["DATABASE_URL"] = url
+
+
+async def prepare_database(engine, reset: bool = False) -> None:
+    """Создаёт схему, при reset=True очищает таблицы бота."""
+    from database.migrate import SCHEMA_VERSION, upgrade
+    from database.models import Base
+
+    if engine.dialect.name == "sqlite":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version "
+                "(version INTEGER PRIMARY KEY, description VARCHAR(255) NOT NULL, applied_at TIMESTAMP)"
+            ))
+            await conn.execute(
+                text("INSERT OR IGNORE INTO schema_version (version, description) VALUES (:v, 'benchmark')"),
+                {"v": SCHEMA_VERSION},
+            )
+            if reset:
+                for table in BOT_TABLES:
+                    await conn.execute(text(f"DELETE FROM {table}"))
+        return
+
+    await upgrade(engine)
+    if reset:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"TRUNCATE {', '.join(BOT_TABLES)} RESTART IDENTITY CASCADE"))
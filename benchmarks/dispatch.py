@@ -0,0 +1,155 @@
+"""
+Накладные расходы диспетчеризации на один апдейт.
+
+Собирает диспетчер из N синтетических разделов — как handlers/tasks.py:
+команда, кнопка меню, шаг FSM и несколько inline-кнопок на раздел — в двух
+вариантах:
+- filters — F.text == ... и F.data.startswith(...), разбор split(":")
+  в хендлере, состояние FSM фильтром-State (прежняя схема);
+- index   — IndexedRouter и фабрики CallbackData (services/routing.py),
+  состояние через StateFilter.
+
+Хендлеры пустые, middleware нет, поэтому время — это поиск хендлера,
+фильтры и разбор данных. Синхронные фильтры (magic F, State) aiogram
+выполняет через asyncio.to_thread — каждый такой фильтр стоит переключения
+на поток, это и есть основная цена перебора. Кнопки и callback-и последнего раздела — худший
+случай для перебора; команда проходит мимо индекса в обоих вариантах.
+
+Запуск:
+    python -m benchmarks.dispatch
+    python -m benchmarks.dispatch --features 7,50,200 --updates 5000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from typing import Dict, List
+
+MODES = ("filters", "index")
+KINDS = ("button", "callback", "command", "unmatched")
+# inline-кнопок на раздел (как ✅ / 🗑 / ◀ ▶ / выбор у задач)
+CALLBACKS_PER_FEATURE = 6
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Накладные расходы диспетчеризации на апдейт")
+    parser.add_argument("--features", default="7,25,50", help="число разделов (роутеров), через запятую")
+    parser.add_argument("--updates", type=int, default=2_000, help="апдейтов на вид и вариант")
+    parser.add_argument("--modes", default=",".join(MODES))
+    return parser.parse_args(argv)
+
+
+def _callback_factory(prefix: str):
+    from aiogram.filters.callback_data import CallbackData
+
+    class Item(CallbackData, prefix=prefix):
+        item_id: int
+
+    return Item
+
+
+def build_dispatcher(mode: str, features: int):
+    from aiogram import Dispatcher, F, Router
+    from aiogram.filters import Command, StateFilter
+    from aiogram.fsm.state import State, StatesGroup
+
+    from services.routing import IndexedRouter, build_dispatch_index
+
+    async def noop(event, **kwargs):
+        return None
+
+    routers = []
+    for i in range(features):
+        waiting = type(f"Feature{i}State", (StatesGroup,), {"waiting": State()}).waiting
+        if mode == "index":
+            router = IndexedRouter(name=f"feature{i}")
+            router.button(f"btn{i}")(noop)
+            for j in range(CALLBACKS_PER_FEATURE):
+                router.callback(_callback_factory(f"f{i}_{j}"))(noop)
+        else:
+            router = Router(name=f"feature{i}")
+            router.message(F.text == f"btn{i}")(noop)
+            for j in range(CALLBACKS_PER_FEATURE):
+                async def parse(event, **kwargs):
+                    int(event.data.split(":")[1])
+                router.callback_query(F.data.startswith(f"f{i}_{j}:"))(parse)
+        router.message(Command(f"cmd{i}"))(noop)
+        router.message(StateFilter(waiting) if mode == "index" else waiting, F.text.len() > 0)(noop)
+        routers.append(router)
+
+    dp = Dispatcher()
+    if mode == "index":
+        dp.include_router(build_dispatch_index(routers))
+    for router in routers:
+        dp.include_router(router)
+    return dp
+
+
+def make_updates(features: int) -> Dict[str, object]:
+    from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+    user = User(id=42, is_bot=False, first_name="Bench")
+    chat = Chat(id=42, type="private")
+    last = features - 1
+
+    def message(text: str) -> Update:
+        return Update(update_id=1, message=Message(
+            message_id=1, date=datetime.now(), chat=chat, from_user=user, text=text,
+        ))
+
+    return {
+        "button": message(f"btn{last}"),
+        "callback": Update(update_id=1, callback_query=CallbackQuery(
+            id="1", from_user=user, chat_instance="1", data=f"f{last}_{CALLBACKS_PER_FEATURE - 1}:7",
+            message=Message(message_id=1, date=datetime.now(), chat=chat, text="list"),
+        )),
+        "command": message(f"/cmd{last}"),
+        "unmatched": message("просто текст"),
+    }
+
+
+async def run(mode: str, features: int, updates: int) -> Dict[str, dict]:
+    from aiogram import Bot
+
+    dp = build_dispatcher(mode, features)
+    bot = Bot(token="42:BENCHMARK")
+    results = {}
+    for kind, update in make_updates(features).items():
+        for _ in range(100):
+            await dp.feed_update(bot, update)
+        timings: List[float] = []
+        for _ in range(updates):
+            started = time.perf_counter()
+            await dp.feed_update(bot, update)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        results[kind] = {
+            "mean_us": sum(timings) / len(timings) * 1e6,
+            "p50_us": timings[len(timings) // 2] * 1e6,
+            "p99_us": timings[int(len(timings) * 0.99)] * 1e6,
+        }
+    await bot.session.close()
+    return results
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    modes = [m for m in args.modes.split(",") if m]
+    print(f"\n{args.updates} апдейтов на вид, {CALLBACKS_PER_FEATURE} inline-кнопок на раздел")
+    print(f"{'разделов':>9}  {'вариант':<9}{'вид':<11}{'сред., мкс':>12}{'p50, мкс':>12}{'p99, мкс':>12}")
+    for features in (int(f) for f in args.features.split(",") if f):
+        for mode in modes:
+            results = asyncio.run(run(mode, features, args.updates))
+            for kind in KINDS:
+                r = results[kind]
+                print(f"{features:>9}  {mode:<9}{kind:<11}"
+                      f"{r['mean_us']:>12.1f}{r['p50_us']:>12.1f}{r['p99_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
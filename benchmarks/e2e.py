@@ -0,0 +1,352 @@
+"""
+Сквозной бенчмарк пропускной способности бота.
+
+Собирает настоящий Dispatcher из bot.py (все роутеры и middleware) и гоняет
+через feed_update поток синтетических апдейтов от множества пользователей:
+мастера добавления задачи и сделки, просмотр списков, смена статусов,
+/report, совет по маркетингу и мотивация. Telegram заменён FakeTelegramSession,
+OpenAI — локальным FakeOpenAIServer. Итог: апдейтов в секунду и p50/p95/p99
+задержки по каждому хендлеру.
+
+Запуск:
+    python -m benchmarks.e2e                                   # SQLite во временном файле
+    python -m benchmarks.e2e --users 200 --duration 60
+    python -m benchmarks.e2e --db postgresql+asyncpg://u:p@127.0.0.1:5433/bench --reset
+    python -m benchmarks.e2e --json baseline.json              # сохранить результат для сравнения
+
+Postgres-база должна быть отдельной: --reset очищает таблицы бота.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import itertools
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from benchmarks.db import prepare_database, use_database
+
+# Сценарии и их веса в смеси по умолчанию
+DEFAULT_MIX = {
+    "add_task": 3,
+    "add_deal": 2,
+    "toggle_task": 3,
+    "toggle_deal": 2,
+    "report": 2,
+    "marketing": 1,
+    "motivation": 2,
+}
+
+QUESTIONS = [
+    "Как увеличить продажи летом?",
+    "Как вернуть старых клиентов?",
+    "Где искать новых клиентов для B2B?",
+    "Как поднять средний чек?",
+    "Что писать в холодном письме?",
+    "Как продавать дороже конкурентов?",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк бота")
+    parser.add_argument("--db", default="sqlite", help="sqlite или URL базы (postgresql+asyncpg://...)")
+    parser.add_argument("--reset", action="store_true", help="очистить таблицы бота перед прогоном (Postgres)")
+    parser.add_argument("--users", type=int, default=50, help="одновременных пользователей")
+    parser.add_argument("--duration", type=float, default=20.0, help="длительность нагрузки, сек")
+    parser.add_argument("--warmup", type=float, default=2.0, help="прогрев без учёта в результатах, сек")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза пользователя между действиями, сек")
+    parser.add_argument("--mix", default="", help="веса сценариев, например add_task=3,report=1")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="задержка фейкового OpenAI, сек")
+    parser.add_argument("--openai-url", default="", help="внешний фейковый OpenAI (python -m benchmarks.fakes)")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="задержка фейкового Bot API, сек")
+    parser.add_argument("--send-queue", action="store_true", help="включить очередь отправки с лимитами Telegram")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default="", help="сохранить результат в JSON-файл")
+    return parser.parse_args(argv)
+
+
+def configure_env(args, workdir: str) -> None:
+    """
+    Настраивает окружение до импорта модулей бота: config.py читает его при импорте.
+    """
+    if args.db == "sqlite":
+        use_database(f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}")
+    else:
+        use_database(args.db)
+    os.environ["MARKETING_CACHE_PATH"] = os.path.join(workdir, "marketing_cache")
+    os.environ["METRICS_PORT"] = "0"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("BOT_TOKEN", "123456789:benchmark-token-0000000000000000")
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise SystemExit(f"Неизвестный сценарий: {name}. Есть: {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Workload:
+    """Виртуальные пользователи: каждый по очереди выполняет случайные сценарии."""
+
+    def __init__(self, dp, bot, session, mix: Dict[str, int], think: float, rng: random.Random):
+        from services.metrics import current_update
+
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.think = think
+        self.rng = rng
+        self.ids = itertools.count(1)
+        self.recording = False
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.updates = 0
+        self.errors = 0
+        self._handlers: Dict[int, str] = {}
+
+        # Имя выбранного хендлера: UpdateMetricsMiddleware кладёт его в current_update
+        async def remember_handler(handler, event, data):
+            try:
+                return await handler(event, data)
+            finally:
+                update = current_update.get()
+                if update is not None:
+                    self._handlers[event.update_id] = update.handler
+
+        dp.update.outer_middleware(remember_handler)
+
+    # --- Апдейты ---
+
+    def _user(self, tg_id: int) -> dict:
+        return {"id": tg_id, "is_bot": False, "first_name": f"user{tg_id}", "username": f"user{tg_id}"}
+
+    def message(self, tg_id: int, text: str) -> dict:
+        return {
+            "update_id": next(self.ids),
+            "message": {
+                "message_id": next(self.ids),
+                "date": int(time.time()),
+                "chat": {"id": tg_id, "type": "private"},
+                "from": self._user(tg_id),
+                "text": text,
+            },
+        }
+
+    def callback(self, tg_id: int, data: str, message_id: int = 1) -> dict:
+        return {
+            "update_id": next(self.ids),
+            "callback_query": {
+                "id": str(next(self.ids)),
+                "chat_instance": str(tg_id),
+                "from": self._user(tg_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": tg_id, "type": "private"},
+                    "text": "…",
+                },
+            },
+        }
+
+    async def feed(self, update: dict) -> None:
+        from aiogram.types import Update
+
+        parsed = Update.model_validate(update, context={"bot": self.bot})
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, parsed)
+        except Exception:
+            self.errors += 1
+        elapsed = time.perf_counter() - started
+        handler = self._handlers.pop(parsed.update_id, "unhandled")
+        if self.recording:
+            self.updates += 1
+            self.latencies[handler].append(elapsed)
+
+    def _buttons(self, tg_id: int, prefix: str):
+        """Кнопки с callback_data prefix:* из последнего списка в чате пользователя."""
+        message = self.session.last_markup.get(tg_id)
+        if message is None or message.reply_markup is None:
+            return None, []
+        found = [
+            button.callback_data
+            for row in message.reply_markup.inline_keyboard
+            for button in row
+            if button.callback_data and button.callback_data.startswith(prefix + ":")
+        ]
+        return message, found
+
+    # --- Сценарии ---
+
+    async def add_task(self, tg_id: int) -> None:
+        await self.feed(self.message(tg_id, "/add_task"))
+        await self.feed(self.message(tg_id, f"Позвонить клиенту {self.rng.randint(1, 10**6)}"))
+        await self.feed(self.message(tg_id, f"{self.rng.randint(9, 19)}:00"))
+
+    async def add_deal(self, tg_id: int) -> None:
+        await self.feed(self.message(tg_id, "/add_deal"))
+        await self.feed(self.message(tg_id, f"Сделка {self.rng.randint(1, 10**6)}"))
+        await self.feed(self.message(tg_id, str(self.rng.randint(1, 500) * 1000)))
+        status = self.rng.choice(["Открыта", "В процессе", "Закрыта"])
+        await self.feed(self.callback(tg_id, f"deal_status:{status}"))
+
+    async def toggle_task(self, tg_id: int) -> None:
+        await self.feed(self.message(tg_id, "/view_tasks"))
+        message, buttons = self._buttons(tg_id, "task_done")
+        if buttons:
+            await self.feed(self.callback(tg_id, self.rng.choice(buttons), message.message_id))
+
+    async def toggle_deal(self, tg_id: int) -> None:
+        await self.feed(self.message(tg_id, "/view_deals"))
+        message, buttons = self._buttons(tg_id, "deal_status_change")
+        if not buttons:
+            return
+        await self.feed(self.callback(tg_id, self.rng.choice(buttons), message.message_id))
+        message, buttons = self._buttons(tg_id, "deal_set")
+        if buttons:
+            await self.feed(self.callback(tg_id, self.rng.choice(buttons), message.message_id))
+
+    async def report(self, tg_id: int) -> None:
+        await self.feed(self.message(tg_id, "/report"))
+
+    async def marketing(self, tg_id: int) -> None:
+        await self.feed(self.message(tg_id, "/marketing"))
+        await self.feed(self.message(tg_id, self.rng.choice(QUESTIONS)))
+
+    async def motivation(self, tg_id: int) -> None:
+        await self.feed(self.message(tg_id, "/motivation"))
+
+    async def run_user(self, tg_id: int, deadline: float) -> None:
+        await self.feed(self.message(tg_id, "/start"))
+        while time.monotonic() < deadline:
+            scenario = self.rng.choices(self.names, self.weights)[0]
+            await getattr(self, scenario)(tg_id)
+            if self.think:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think))
+
+
+def report(workload: Workload, elapsed: float, extra: dict) -> dict:
+    rows = []
+    for handler, values in sorted(workload.latencies.items(), key=lambda item: -len(item[1])):
+        values.sort()
+        rows.append({
+            "handler": handler,
+            "count": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000,
+        })
+    result = {
+        "updates": workload.updates,
+        "seconds": elapsed,
+        "updates_per_sec": workload.updates / elapsed if elapsed else 0.0,
+        "errors": workload.errors,
+        "handlers": rows,
+        **extra,
+    }
+
+    print(f"\nАпдейтов: {workload.updates} за {elapsed:.1f} с — {result['updates_per_sec']:.1f} апд/с, "
+          f"ошибок: {workload.errors}")
+    print(f"{'хендлер':<28}{'кол-во':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for row in rows:
+        print(f"{row['handler']:<28}{row['count']:>8}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+    for name, value in extra.items():
+        print(f"{name}: {value}")
+    return result
+
+
+async def run(args) -> dict:
+    from openai import AsyncOpenAI
+
+    import bot as bot_module
+    from aiogram import Bot
+    from benchmarks.fakes import FakeOpenAIServer, FakeTelegramSession
+    from database.db import engine
+    from database.pool_metrics import db_metrics
+    from services import chatgpt
+    from services.llm_scheduler import llm_scheduler
+    from services.send_queue import send_queue
+
+    await prepare_database(engine, args.reset)
+
+    openai_server: Optional[FakeOpenAIServer] = None
+    if args.openai_url:
+        base_url = args.openai_url
+    else:
+        openai_server = FakeOpenAIServer(latency=args.llm_latency)
+        await openai_server.start()
+        base_url = openai_server.base_url
+    chatgpt.set_client(AsyncOpenAI(base_url=base_url, api_key="bench"))
+
+    session = FakeTelegramSession(latency=args.telegram_latency)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    if args.send_queue:
+        bot.session.middleware(send_queue)
+    dp = bot_module.build_dispatcher()
+    workload = Workload(dp, bot, session, parse_mix(args.mix), args.think, random.Random(args.seed))
+
+    await dp.emit_startup(bot=bot, dispatcher=dp, bots=[bot])
+    try:
+        started = time.monotonic()
+        deadline = started + args.warmup + args.duration
+        users = [asyncio.create_task(workload.run_user(10_000 + i, deadline)) for i in range(args.users)]
+        await asyncio.sleep(args.warmup)
+        workload.recording = True
+        measured_from = time.monotonic()
+        await asyncio.gather(*users)
+        elapsed = time.monotonic() - measured_from
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, bots=[bot])
+        if openai_server is not None:
+            await openai_server.stop()
+        await engine.dispose()
+
+    extra = {
+        "db": engine.dialect.name,
+        "users": args.users,
+        "telegram_calls": dict(session.calls),
+        "db_pool": db_metrics.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+    }
+    if openai_server is not None:
+        extra["openai_requests"] = dict(openai_server.requests)
+    return report(workload, elapsed, extra)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="bot-bench-") as workdir:
+        configure_env(args, workdir)
+        # Корень репозитория — в sys.path, чтобы импортировались модули бота
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        result = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Результат сохранён в {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Заглушки Telegram и OpenAI для бенчмарков.
+
+FakeTelegramSession — сессия aiogram: ничего не шлёт в сеть, записывает
+исходящие запросы и отвечает как Bot API (с настраиваемой задержкой).
+
+FakeOpenAIServer — локальный HTTP-сервер с API OpenAI (chat/completions
+обычный и потоковый, embeddings) и настраиваемой задержкой. Клиент —
+настоящий AsyncOpenAI с base_url на этот сервер, поэтому в замер входят
+HTTP, разбор JSON и SSE, как в проде.
+
+Сервер можно запустить отдельным процессом, чтобы он не делил event loop
+с ботом:
+    python -m benchmarks.fakes --port 8089 --latency 0.3
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import itertools
+from collections import Counter
+from typing import Dict, Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import (
+    AnswerCallbackQuery,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    GetMe,
+    SendMessage,
+    TelegramMethod,
+)
+from aiogram.types import Chat, InlineKeyboardMarkup, Message, User
+
+from services.semantic_cache import HashingEmbedder
+
+BOT_USER = User(id=1, is_bot=True, first_name="bench", username="bench_bot")
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    latency — имитация времени ответа Bot API, сек.
+    last_markup[chat_id] — последнее сообщение чата с inline-клавиатурой
+    (бенчмарк берёт из него id задач/сделок для нажатий кнопок).
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.last_markup: Dict[int, Message] = {}
+        self._message_ids = itertools.count(1_000_000)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            markup = method.reply_markup if isinstance(method.reply_markup, InlineKeyboardMarkup) else None
+            message = Message(
+                message_id=next(self._message_ids),
+                date=datetime.datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                from_user=BOT_USER,
+                text=method.text,
+                reply_markup=markup,
+            ).as_(bot)
+            if markup is not None:
+                self.last_markup[method.chat_id] = message
+            return message
+        if isinstance(method, (EditMessageText, EditMessageReplyMarkup)):
+            if isinstance(method.reply_markup, InlineKeyboardMarkup) and method.chat_id in self.last_markup:
+                previous = self.last_markup[method.chat_id]
+                if previous.message_id == method.message_id:
+                    self.last_markup[method.chat_id] = previous.model_copy(
+                        update={"reply_markup": method.reply_markup}
+                    ).as_(bot)
+            return True
+        if isinstance(method, AnswerCallbackQuery):
+            return True
+        if isinstance(method, GetMe):
+            return BOT_USER
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        # скачивание файлов ботом не используется
+        raise NotImplementedError
+
+
+class FakeOpenAIServer:
+    """
+    latency — задержка до первого токена, сек;
+    token_delay — пауза между кусками стрима, сек;
+    answer — текст ответа (режется на куски по chunk_size символов).
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.3,
+        token_delay: float = 0.02,
+        chunk_size: int = 20,
+        answer: str = "Сфокусируйтесь на повторных продажах: напомните клиентам о себе, "
+                      "предложите бонус за рекомендацию и соберите отзывы. " * 3,
+        embedding_dim: int = 1536,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.token_delay = token_delay
+        self.chunk_size = chunk_size
+        self.answer = answer
+        self.embedder = HashingEmbedder(dim=embedding_dim)
+        self.requests: Counter = Counter()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _answer_for(self, messages) -> str:
+        prompt = messages[-1]["content"] if messages else ""
+        if "разных коротких" in prompt:
+            # пачка мотивационных фраз (generate_motivation_phrases)
+            return "\n".join(f"Фраза для продаж номер {i} 💪" for i in range(1, 11))
+        return self.answer
+
+    @staticmethod
+    def _usage(messages, text: str) -> dict:
+        prompt = sum(len(m["content"].split()) for m in messages)
+        completion = len(text.split())
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        messages = body.get("messages", [])
+        text = self._answer_for(messages)
+        created = int(time.time())
+        await asyncio.sleep(self.latency)
+
+        if not body.get("stream"):
+            self.requests["chat"] += 1
+            return web.json_response({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "bench"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": self._usage(messages, text),
+            })
+
+        self.requests["chat_stream"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        def event(payload: dict) -> bytes:
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+
+        base = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": created, "model": "bench"}
+        for i in range(0, len(text), self.chunk_size):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            await response.write(event({
+                **base,
+                "choices": [{"index": 0, "delta": {"content": text[i:i + self.chunk_size]}, "finish_reason": None}],
+            }))
+        await response.write(event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await response.write(event({**base, "choices": [], "usage": self._usage(messages, text)}))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests["embeddings"] += 1
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, text in enumerate(inputs):
+            vector = await self.embedder.embed(text)
+            data.append({"object": "embedding", "index": i, "embedding": vector.tolist()})
+        tokens = sum(len(text.split()) for text in inputs)
+        return web.json_response({
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "bench"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # port=0 — берём порт, который выдала ОС
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve(args) -> None:
+    server = FakeOpenAIServer(port=args.port, latency=args.latency, token_delay=args.token_delay)
+    await server.start()
+    print(f"Fake OpenAI: {server.base_url} (latency {args.latency}s)")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный сервер с API OpenAI для бенчмарков")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.3, help="задержка до первого токена, сек")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="пауза между кусками стрима, сек")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,132 @@
+"""
+Накладные расходы логирования на один апдейт.
+
+Сравнивает, сколько времени event loop тратит на logger.info внутри
+обработки апдейта:
+- off        — логирование выключено (база для сравнения);
+- sync       — прежняя схема: RotatingFileHandler и StreamHandler прямо в loop;
+- queue-text — QueueHandler + QueueListener, текстовый файл;
+- queue-json — QueueHandler + QueueListener, JSON с контекстом апдейта.
+
+--slow-io-ms имитирует медленный диск (пауза в emit файлового хендлера):
+в sync-режиме она целиком ложится на loop, в queue-режимах — на поток записи.
+
+Запуск:
+    python -m benchmarks.logging_overhead
+    python -m benchmarks.logging_overhead --updates 20000 --logs-per-update 3 --slow-io-ms 1
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+from logging.handlers import RotatingFileHandler
+from typing import List
+
+MODES = ("off", "sync", "queue-text", "queue-json")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Накладные расходы логирования на апдейт")
+    parser.add_argument("--updates", type=int, default=10_000, help="апдейтов на режим")
+    parser.add_argument("--logs-per-update", type=int, default=2, help="записей лога на апдейт")
+    parser.add_argument("--slow-io-ms", type=float, default=0.0, help="имитация медленного диска, мс на запись")
+    parser.add_argument("--modes", default=",".join(MODES))
+    return parser.parse_args(argv)
+
+
+class _SlowFileHandler(RotatingFileHandler):
+    """Файловый хендлер с искусственной задержкой записи."""
+
+    delay_seconds = 0.0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        super().emit(record)
+
+
+def configure(mode: str, workdir: str, slow_io: float) -> None:
+    from services.logging_setup import JsonFormatter, start_queue_logging, stop_logging, text_formatter
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    if mode == "off":
+        root.setLevel(logging.WARNING)
+        return
+
+    path = os.path.join(workdir, f"{mode}.log")
+    file_handler = _SlowFileHandler(path, maxBytes=10 * 1024 * 1024, backupCount=3, encoding="utf-8")
+    file_handler.delay_seconds = slow_io
+    file_handler.setFormatter(JsonFormatter("bot") if mode == "queue-json" else text_formatter())
+    # Консоль — в /dev/null: замеряем стоимость вызовов, а не терминала
+    console_handler = logging.StreamHandler(open(os.devnull, "w"))
+    console_handler.setFormatter(text_formatter())
+
+    if mode == "sync":
+        root.setLevel(logging.INFO)
+        root.addHandler(file_handler)
+        root.addHandler(console_handler)
+    else:
+        start_queue_logging([file_handler, console_handler], level="INFO")
+
+
+async def run_mode(updates: int, logs_per_update: int) -> dict:
+    from services.metrics import UpdateContext, current_update
+
+    logger = logging.getLogger("handlers.tasks")
+    timings: List[float] = []
+    for update_id in range(updates):
+        token = current_update.set(UpdateContext(update_id, 10_000 + update_id % 500))
+        current_update.get().handler = "view_tasks"
+        started = time.perf_counter()
+        for i in range(logs_per_update):
+            logger.info("Task created for user %s: %s at %s", update_id, "Позвонить клиенту", "18:00")
+        timings.append(time.perf_counter() - started)
+        current_update.reset(token)
+        if update_id % 100 == 0:
+            # отдаём управление, как между апдейтами в реальном loop
+            await asyncio.sleep(0)
+    timings.sort()
+    return {
+        "mean_us": sum(timings) / len(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[int(len(timings) * 0.99)] * 1e6,
+        "max_us": timings[-1] * 1e6,
+    }
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from services.logging_setup import stop_logging
+
+    modes = [m for m in args.modes.split(",") if m]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bot-log-bench-") as workdir:
+        os.environ["LOG_DIR"] = workdir
+        for mode in modes:
+            configure(mode, workdir, args.slow_io_ms / 1000)
+            results[mode] = asyncio.run(run_mode(args.updates, args.logs_per_update))
+            # Время дозаписи очереди в queue-режимах — вне loop, но показываем его
+            started = time.perf_counter()
+            configure("off", workdir, 0)
+            results[mode]["flush_ms"] = (time.perf_counter() - started) * 1000
+        stop_logging()
+
+    base = results.get("off", {}).get("mean_us", 0.0)
+    print(f"\n{args.updates} апдейтов × {args.logs_per_update} записей, медленный диск: {args.slow_io_ms} мс")
+    print(f"{'режим':<12}{'сред., мкс':>12}{'p50, мкс':>12}{'p99, мкс':>12}{'max, мкс':>12}{'+к off':>12}{'дозапись, мс':>14}")
+    for mode, r in results.items():
+        print(f"{mode:<12}{r['mean_us']:>12.1f}{r['p50_us']:>12.1f}{r['p99_us']:>12.1f}{r['max_us']:>12.1f}"
+              f"{r['mean_us'] - base:>12.1f}{r['flush_ms']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Микро-бенчмарк запросов хендлеров на больших данных.
+
+Замеряет ровно те запросы, которые выполняют view_tasks, view_deals,
+send_report (и /report month — report_month), mark_task_done и set_deal_status (вызываются те же функции
+хендлеров), для пользователей с разной длиной истории: light, typical,
+heavy (99-й перцентиль) и power. С --scales база наращивается ступенями
+генератором benchmarks/datagen.py, и замер повторяется на каждой ступени.
+
+С --explain для каждого запроса сохраняется план: на PostgreSQL —
+EXPLAIN (ANALYZE, BUFFERS) (изменения откатываются), на SQLite —
+EXPLAIN QUERY PLAN.
+
+Запуск:
+    python -m benchmarks.queries --db postgresql+asyncpg://u:p@127.0.0.1:5433/bench \\
+        --reset --scales 1000,10000,100000 --explain --json baseline.json
+    python -m benchmarks.queries                     # по уже заполненной базе
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+from benchmarks.db import prepare_database, use_database
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = (
+    "view_tasks", "page_tasks", "view_deals", "send_report", "report_month", "mark_task_done", "set_deal_status",
+)
+DEAL_STATUSES = ("Открыта", "В процессе", "Закрыта")
+
+
+class StatementRecorder:
+    """Запоминает SQL и параметры, ушедшие в драйвер внутри блока capture()."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.active = False
+        self.statements: List[tuple] = []
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            if self.active and not executemany:
+                self.statements.append((statement, parameters))
+
+    @contextmanager
+    def capture(self):
+        self.statements = []
+        self.active = True
+        try:
+            yield self.statements
+        finally:
+            self.active = False
+
+
+async def explain(engine, statement: str, parameters) -> str:
+    """План запроса; для DML на PostgreSQL изменения откатываются."""
+    async with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = "\n".join(row[0] for row in result)
+        else:
+            result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan = "\n".join(row[-1] for row in result)
+        await conn.rollback()
+    return plan
+
+
+async def pick_profiles(engine) -> Dict[str, int]:
+    """
+    Пользователи с разной длиной истории задач:
+    light (10-й перцентиль), typical (медиана), heavy (99-й), power (максимум).
+    """
+    from sqlalchemy import func, select
+    from database.models import Task
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(
+            select(Task.user_id, func.count().label("n")).group_by(Task.user_id).order_by("n")
+        )).all()
+    if not rows:
+        raise SystemExit("В базе нет задач — сначала python -m benchmarks.datagen или --scales")
+    last = len(rows) - 1
+    return {
+        "light": rows[int(last * 0.10)].user_id,
+        "typical": rows[int(last * 0.50)].user_id,
+        "heavy": rows[int(last * 0.99)].user_id,
+        "power": rows[last].user_id,
+    }
+
+
+async def sample_ids(engine, model, user_id: int, limit: int = 200) -> List[int]:
+    from sqlalchemy import select
+
+    async with engine.connect() as conn:
+        return list((await conn.execute(
+            select(model.id).where(model.user_id == user_id).limit(limit)
+        )).scalars())
+
+
+async def build_operations(engine, user_id: int, rng: random.Random) -> Dict[str, Callable]:
+    """Операции пользователя — те же функции, что вызывают хендлеры."""
+    from database.db import async_session
+    from database.models import Deal, Task, UserStats
+    from handlers.deals import load_deals_page, update_deal_status
+    from handlers.report import PERIODS, load_period_stats
+    from handlers.tasks import load_tasks_page, toggle_task_status
+
+    task_ids = await sample_ids(engine, Task, user_id)
+    deal_ids = await sample_ids(engine, Deal, user_id)
+
+    # Курсор второй страницы — как у кнопки ▶ под первой
+    rows, _, has_next = await load_tasks_page(user_id)
+    next_cursor = (rows[-1][1], rows[-1][0].id) if rows and has_next else None
+
+    async def send_report():
+        # handlers/report.py: одна строка user_stats по первичному ключу
+        async with async_session() as session:
+            await session.get(UserStats, user_id)
+
+    # /report month: 30 дней и 30 дней перед ними из user_daily_stats
+    today = date.today()
+    month_start = today - timedelta(days=PERIODS["month"] - 1)
+
+    operations = {
+        "view_tasks": lambda: load_tasks_page(user_id),
+        "view_deals": lambda: load_deals_page(user_id),
+        "send_report": send_report,
+        "report_month": lambda: load_period_stats(user_id, month_start, today),
+    }
+    if next_cursor is not None:
+        operations["page_tasks"] = lambda: load_tasks_page(user_id, next_cursor)
+    if task_ids:
+        operations["mark_task_done"] = lambda: toggle_task_status(user_id, rng.choice(task_ids))
+    if deal_ids:
+        operations["set_deal_status"] = lambda: update_deal_status(
+            user_id, rng.choice(deal_ids), rng.choice(DEAL_STATUSES)
+        )
+    return operations
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def measure(engine, recorder: StatementRecorder, profiles: Dict[str, int],
+                  iterations: int, with_plans: bool, rng: random.Random) -> List[dict]:
+    results = []
+    for profile, user_id in profiles.items():
+        operations = await build_operations(engine, user_id, rng)
+        for name in OPERATIONS:
+            operation = operations.get(name)
+            if operation is None:
+                continue
+            # Первый вызов — прогрев и запись выполненных запросов
+            with recorder.capture() as statements:
+                await operation()
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                await operation()
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            row = {
+                "profile": profile,
+                "user_id": user_id,
+                "operation": name,
+                "p50_ms": percentile(timings, 50) * 1000,
+                "p95_ms": percentile(timings, 95) * 1000,
+                "p99_ms": percentile(timings, 99) * 1000,
+                "max_ms": timings[-1] * 1000,
+                "statements": [statement for statement, _ in statements],
+            }
+            if with_plans:
+                row["plans"] = [await explain(engine, statement, parameters) for statement, parameters in statements]
+            results.append(row)
+    return results
+
+
+def print_results(sizes: Dict[str, int], results: List[dict], with_plans: bool) -> None:
+    print(f"\n=== users={sizes['users']} tasks={sizes['tasks']} deals={sizes['deals']} ===")
+    print(f"{'профиль':<10}{'операция':<18}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for row in results:
+        print(f"{row['profile']:<10}{row['operation']:<18}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}")
+    if with_plans:
+        printed = set()
+        for row in results:
+            if row["profile"] not in ("typical", "power"):
+                continue
+            for statement, plan in zip(row["statements"], row["plans"]):
+                key = (row["profile"], " ".join(statement.split()))
+                if key in printed:
+                    continue
+                printed.add(key)
+                print(f"\n--- {row['profile']} / {row['operation']}\n{' '.join(statement.split())}\n{plan}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк запросов хендлеров на больших данных")
+    parser.add_argument("--db", default="", help="URL базы (по умолчанию — из config.py)")
+    parser.add_argument("--reset", action="store_true", help="очистить таблицы бота перед генерацией")
+    parser.add_argument("--scales", default="", help="ступени числа пользователей, например 1000,10000,100000")
+    parser.add_argument("--power-users", type=int, default=3, help="пользователей с огромной историей")
+    parser.add_argument("--power-rows", type=int, default=100_000, help="задач и сделок у power user")
+    parser.add_argument("--iterations", type=int, default=200, help="повторов каждой операции")
+    parser.add_argument("--explain", action="store_true", help="снять планы запросов")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default="", help="сохранить результат в JSON-файл")
+    return parser.parse_args(argv)
+
+
+async def main(args) -> None:
+    from sqlalchemy import func, select
+    from benchmarks.datagen import SYNTHETIC_TG_ID, generate, table_sizes
+    from database.db import engine
+    from database.models import User
+
+    rng = random.Random(args.seed)
+    recorder = StatementRecorder(engine)
+    report = defaultdict(list)
+    try:
+        await prepare_database(engine, args.reset)
+        scales = [int(s) for s in args.scales.split(",") if s] or [None]
+        for target in scales:
+            if target is not None:
+                async with engine.connect() as conn:
+                    existing = (await conn.execute(
+                        select(func.count()).select_from(User).where(User.tg_id >= SYNTHETIC_TG_ID)
+                    )).scalar()
+                if target > existing:
+                    # power users появляются на первой ступени, дальше растёт «толпа»
+                    await generate(
+                        engine,
+                        target - existing,
+                        power_users=args.power_users if not existing else 0,
+                        power_rows=args.power_rows,
+                        seed=args.seed,
+                    )
+            sizes = await table_sizes(engine)
+            results = await measure(engine, recorder, await pick_profiles(engine),
+                                    args.iterations, args.explain, rng)
+            print_results(sizes, results, args.explain)
+            report["steps"].append({"sizes": sizes, "results": results})
+    finally:
+        await engine.dispose()
+
+    if args.json:
+        report["db"] = engine.dialect.name
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результат сохранён в {args.json}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    arguments = parse_args(sys.argv[1:])
+    use_database(arguments.db)
+    asyncio.run(main(arguments))
@@ -0,0 +1,215 @@
+"""
+Время импорта и старта бота — регрессионный бенчмарк.
+
+Каждый прогон — отдельный процесс (холодный импорт, как при рестарте или
+выкатке): замеряется import bot, затем сборка диспетчера и on_startup с
+FakeTelegramSession на SQLite во временном файле. Этапы старта берутся из
+services/startup.py: db_schema, db_pool, bot_me, marketing_cache (идут
+параллельно) и startup целиком. Также проверяется, что при импорте не
+загружены тяжёлые библиотеки (openai, faiss, numpy) — они грузятся при
+первом использовании.
+
+--importtime N печатает N пакетов, на которые уходит больше всего времени
+импорта (сумма собственного времени модулей пакета по python -X importtime).
+Нижняя граница импорта — aiogram (модели Bot API в aiogram.types), затем
+sqlalchemy и aiohttp: они нужны хендлерам при импорте и лениво не грузятся.
+
+Запуск (из корня проекта, как модуль):
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --telegram-latency 0.05 --json baseline.json
+    python -m benchmarks.startup --baseline baseline.json --tolerance 0.2   # код 1 при регрессии
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from statistics import median
+from typing import Dict, List
+
+if not __package__:
+    sys.exit("Запускайте из корня проекта как модуль: python -m benchmarks.startup")
+
+from benchmarks.db import prepare_database, use_database
+
+# Не должны импортироваться вместе с bot.py
+LAZY_MODULES = ("openai", "faiss", "numpy")
+# Этапы, по которым сравнивается с базовым прогоном
+CHECKED = ("import", "startup")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Время импорта и старта бота")
+    parser.add_argument("--runs", type=int, default=5, help="число прогонов (процессов)")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="задержка фейкового getMe, сек")
+    parser.add_argument("--json", default="", help="сохранить результат в JSON-файл")
+    parser.add_argument("--baseline", default="", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое замедление медианы, доля")
+    parser.add_argument("--importtime", type=int, default=8, help="показать N самых дорогих пакетов (0 — не показывать)")
+    parser.add_argument("--child", default="", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def configure_env(workdir: str) -> None:
+    """Окружение до импорта модулей бота: config.py читает его при импорте."""
+    use_database(f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ["MARKETING_CACHE_PATH"] = os.path.join(workdir, "marketing_cache")
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["REMINDERS_ENABLED"] = "0"
+    os.environ["FSM_STORAGE"] = "memory"
+    os.environ.setdefault("BOT_TOKEN", "123456789:benchmark-token-0000000000000000")
+
+
+async def prepare(workdir: str) -> None:
+    configure_env(workdir)
+    from database.db import engine
+
+    await prepare_database(engine)
+    await engine.dispose()
+
+
+def child(workdir: str, telegram_latency: float) -> None:
+    """Один холодный старт; результат — строка JSON в stdout."""
+    configure_env(workdir)
+    started = time.perf_counter()
+    import bot as bot_module
+    import_seconds = time.perf_counter() - started
+    lazy_loaded = [name for name in LAZY_MODULES if name in sys.modules]
+
+    async def start() -> Dict[str, float]:
+        from aiogram import Bot
+        from benchmarks.fakes import FakeTelegramSession
+        from database.db import engine
+        from services.startup import startup_timer
+
+        bot = Bot(token=os.environ["BOT_TOKEN"], session=FakeTelegramSession(latency=telegram_latency))
+        dp = bot_module.build_dispatcher()
+        await dp.emit_startup(bot=bot, dispatcher=dp, bots=[bot])
+        phases = dict(startup_timer.phases)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, bots=[bot])
+        await bot.session.close()
+        await engine.dispose()
+        return phases
+
+    phases = asyncio.run(start())
+    # import по часам бенчмарка: включает и модули, загруженные до bot.py
+    phases["import"] = import_seconds
+    print(json.dumps({"phases": phases, "lazy_loaded": lazy_loaded}))
+
+
+def run_child(workdir: str, telegram_latency: float) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child", workdir,
+         "--telegram-latency", str(telegram_latency)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_breakdown(workdir: str) -> Dict[str, float]:
+    """
+    Время импорта bot.py по пакетам, мс: сумма собственного (self) времени
+    модулей пакета из python -X importtime, по убыванию.
+    """
+    # Родительский процесс бота не импортирует, окружение можно выставить здесь
+    configure_env(workdir)
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"],
+        check=True, capture_output=True, text=True,
+    ).stderr
+    totals: Counter = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            totals[name.strip().split(".")[0]] += int(self_us) / 1000
+    return dict(totals.most_common())
+
+
+def summarize(runs: List[dict]) -> dict:
+    names: List[str] = []
+    for run in runs:
+        names += [name for name in run["phases"] if name not in names]
+    return {
+        "runs": len(runs),
+        "lazy_loaded": sorted({name for run in runs for name in run["lazy_loaded"]}),
+        "phases": {
+            name: {
+                "median_ms": median(values) * 1000,
+                "min_ms": min(values) * 1000,
+                "max_ms": max(values) * 1000,
+            }
+            for name in names
+            for values in [[run["phases"][name] for run in runs if name in run["phases"]]]
+        },
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Регрессии относительно baseline: медиана этапа хуже больше чем на tolerance."""
+    problems = []
+    for name in CHECKED:
+        old = baseline["phases"].get(name)
+        new = result["phases"].get(name)
+        if old and new and new["median_ms"] > old["median_ms"] * (1 + tolerance):
+            problems.append(f"{name}: {old['median_ms']:.0f} -> {new['median_ms']:.0f} мс")
+    return problems
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if args.child:
+        child(args.child, args.telegram_latency)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="bot_startup_") as workdir:
+        # Схема БД — в отдельном процессе, чтобы прогоны импортировали бота с нуля
+        subprocess.run(
+            [sys.executable, "-c", f"import asyncio; from benchmarks.startup import prepare; asyncio.run(prepare({workdir!r}))"],
+            check=True,
+        )
+        # Первый прогон не учитывается: компиляция .pyc, холодный кэш ФС
+        run_child(workdir, args.telegram_latency)
+        runs = [run_child(workdir, args.telegram_latency) for _ in range(args.runs)]
+        breakdown = import_breakdown(workdir) if args.importtime > 0 else {}
+
+    result = summarize(runs)
+    result["import_by_package_ms"] = breakdown
+    print(f"\n{result['runs']} прогонов, getMe {args.telegram_latency * 1000:.0f} мс")
+    print(f"{'этап':<18}{'медиана, мс':>13}{'мин, мс':>11}{'макс, мс':>11}")
+    for name, p in result["phases"].items():
+        print(f"{name:<18}{p['median_ms']:>13.1f}{p['min_ms']:>11.1f}{p['max_ms']:>11.1f}")
+    import_ms = result["phases"]["import"]["median_ms"]
+    startup_ms = result["phases"]["startup"]["median_ms"]
+    print(f"{'до приёма апдейтов':<18}{import_ms + startup_ms:>13.1f}")
+    if breakdown:
+        print("\nИмпорт по пакетам (-X importtime, один прогон), мс:")
+        for name, ms in list(breakdown.items())[:args.importtime]:
+            print(f"  {name:<16}{ms:>11.1f}")
+
+    failed = False
+    if result["lazy_loaded"]:
+        print(f"\nПри импорте загружены: {', '.join(result['lazy_loaded'])}")
+        failed = True
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(result, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"Регрессия {problem}")
+        failed = failed or bool(problems)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,38 @@
+import time
 import asyncio
 import logging
+
+# Отсчёт времени импорта модулей бота (этап import в services/startup.py)
+_IMPORT_STARTED = time.perf_counter()
+
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 
 # --- Импорты из проекта ---
-from config import BOT_TOKEN, setup_logging, validate_bot_token_or_raise
-from database.models import Base
-from database.db import engine
+from config import BOT_MODE, BOT_TOKEN, FSM_STORAGE, REMINDERS_ENABLED, validate_bot_token_or_raise
+from database.db import engine, prewarm_pool
+from database.pool_metrics import db_metrics
+from database.fsm_storage import PostgresStorage
+from database.migrate import verify_schema_version
+from middlewares.metrics import HandlerLabelMiddleware, UpdateMetricsMiddleware
+from middlewares.user_id import UserIdMiddleware
+from services.chatgpt import load_marketing_cache, marketing_cache
+from services.logging_setup import setup_logging
+from services.metrics import metrics_server
+from services.motivation_pool import motivation_pool
+from services.reminders import reminder_scheduler
+from services.routing import build_dispatch_index
+from services.send_queue import send_queue
+from services.startup import startup_timer
+from supervisor import run_supervisor
+from webhook import run_webhook
 
 # --- Импорт хендлеров ---
 from handlers.start import router as start_router
 from handlers.tasks import router as tasks_router
 from handlers.deals import router as deals_router
+from handlers.transfer import router as transfer_router
 
 # --- NEW CODE START: добавлены ChatGPT и отчёт ---
 from handlers.marketing import router as marketing_router
@@ -19,16 +40,115 @@ from handlers.motivation import router as motivation_router
 from handlers.report import router as report_router
 # --- NEW CODE END ---
 
+startup_timer.record("import", time.perf_counter() - _IMPORT_STARTED)
+
 logger = logging.getLogger(__name__)
 
-async def on_startup():
+async def on_startup(bot: Bot):
+    """
+    Прогрев перед приёмом апдейтов — параллельно, старт длится столько,
+    сколько самый долгий этап:
+    - проверка версии схемы БД (DDL при старте не выполняется — таблицы
+      и индексы создаёт python -m database.migrate);
+    - открытие DB_POOL_PREWARM соединений пула;
+    - getMe (aiogram кэширует ответ, start_polling его не повторяет);
+    - загрузка кэша советов с диска (в потоке).
+    Затем запускает наполнение пула мотивационных фраз, планировщик
+    напоминаний и эндпоинт метрик и пишет в лог время этапов старта.
+    Клиент OpenAI создаётся при первом запросе (services/chatgpt.py).
+    """
+    started = time.perf_counter()
+    _, connections, me, _ = await asyncio.gather(
+        startup_timer.measure("db_schema", verify_schema_version(engine)),
+        startup_timer.measure("db_pool", prewarm_pool()),
+        startup_timer.measure("bot_me", bot.me()),
+        startup_timer.measure("marketing_cache", asyncio.to_thread(load_marketing_cache)),
+    )
+    logger.info("✅ Схема БД актуальна, соединений в пуле: %s, бот @%s.", connections, me.username)
+    motivation_pool.start()
+    if REMINDERS_ENABLED:
+        reminder_scheduler.start(bot)
+    await metrics_server.start()
+    startup_timer.record("startup", time.perf_counter() - started)
+    logger.info("⏱ Старт: %s", startup_timer.summary())
+
+async def on_shutdown():
+    """
+    Сохраняет семантический кэш советов, чтобы рестарт был «тёплым»,
+    останавливает пополнение пула мотивации и напоминания и дожидается
+    отправки сообщений, оставшихся в очереди.
+    """
+    await motivation_pool.stop()
+    await reminder_scheduler.stop()
+    await metrics_server.stop()
+    marketing_cache.save()
+    logger.info("Кэш советов: %s", marketing_cache.stats())
+    await send_queue.drain()
+    logger.info("Очередь отправки: %s", send_queue.stats())
+    logger.info("Пул БД: %s", db_metrics.stats())
+    for statement in db_metrics.top_statements():
+        logger.info("Запрос БД: %s", statement)
+
+def build_bot() -> Bot:
+    """
+    Создаёт бота; все исходящие сообщения идут через очередь отправки
+    с учётом лимитов Telegram (services/send_queue.py).
+    """
+    bot = Bot(token=BOT_TOKEN)
+    bot.session.middleware(send_queue)
+    return bot
+
+def build_storage() -> BaseStorage:
     """
-    Создаёт таблицы в БД при первом запуске.
-    Если таблицы уже существуют — пропускает.
+    Хранилище FSM по FSM_STORAGE: postgres — общее для всех процессов
+    и переживает рестарт, memory — только для локальной отладки.
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("✅ Таблицы успешно созданы (если их не было).")
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return PostgresStorage()
+
+def build_dispatcher() -> Dispatcher:
+    """
+    Создаёт диспетчер: хранилище FSM, middleware, индекс кнопок, все роутеры
+    (start, tasks, deals, transfer, marketing, motivation, report) и хуки старта/остановки.
+    """
+    # Хранилище FSM (PostgreSQL; при остановке диспетчер сбросит несохранённое)
+    storage = build_storage()
+    dp = Dispatcher(storage=storage)
+
+    # Время хендлеров, ошибки, переходы FSM, время БД/LLM (services/metrics.py)
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_label_middleware = HandlerLabelMiddleware()
+    dp.message.middleware(handler_label_middleware)
+    dp.callback_query.middleware(handler_label_middleware)
+
+    # users.id по Telegram ID резолвится один раз и кэшируется
+    user_id_middleware = UserIdMiddleware()
+    dp.message.middleware(user_id_middleware)
+    dp.callback_query.middleware(user_id_middleware)
+
+    routers = [
+        start_router,
+        tasks_router,
+        deals_router,
+        transfer_router,
+        # --- NEW CODE START: добавлены модули ChatGPT и отчёт ---
+        marketing_router,
+        motivation_router,
+        report_router,
+        # --- NEW CODE END ---
+    ]
+    # Кнопки меню и inline-кнопки — по словарю, до перебора хендлеров
+    # роутеров (services/routing.py)
+    dp.include_router(build_dispatch_index(routers))
+    # Подключаем роутеры: команды и шаги FSM
+    for router in routers:
+        dp.include_router(router)
+
+    # Проверка схемы БД при старте, сохранение кэшей при остановке
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
 
 async def main():
     """
@@ -37,41 +157,38 @@ async def main():
     1. Настраивает логирование.
     2. Проверяет валидность BOT_TOKEN.
     3. Инициализирует бота и диспетчер (Dispatcher).
-    4. Подключает все роутеры (start, tasks, deals, marketing, motivation, report).
-    5. Создаёт таблицы в БД при старте.
-    6. Запускает постоянный цикл polling.
+    4. Запускает приём апдейтов: long polling, webhook или supervisor
+       с несколькими процессами-воркерами (BOT_MODE).
+       При старте диспетчер параллельно проверяет схему БД, греет
+       пул соединений и запрашивает getMe (on_startup).
     """
-    # Настройка логирования
+    # Настройка логирования (запись в файл — в отдельном потоке)
     setup_logging()
 
     # Проверяем токен
     validate_bot_token_or_raise(BOT_TOKEN)
 
     # Создаём экземпляр бота и диспетчера
-    bot = Bot(token=BOT_TOKEN)
-
-    # Хранилище FSM (в оперативной памяти)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
-
-    # Подключаем роутеры
-    dp.include_router(start_router)
-    dp.include_router(tasks_router)
-    dp.include_router(deals_router)
-
-    # --- NEW CODE START: добавлены модули ChatGPT и отчёт ---
-    dp.include_router(marketing_router)
-    dp.include_router(motivation_router)
-    dp.include_router(report_router)
-    # --- NEW CODE END ---
-
-    # Инициализация базы данных
-    await on_startup()
+    bot = build_bot()
+    dp = build_dispatcher()
+
+    if BOT_MODE == "webhook":
+        logger.info("🤖 Бот запускается в режиме webhook.")
+        await run_webhook(dp, bot)
+        return
+
+    if BOT_MODE == "supervisor":
+        # Супервизору диспетчер нужен только для списка типов апдейтов,
+        # обрабатывают апдейты воркеры со своими диспетчерами
+        logger.info("🤖 Бот запускается в режиме supervisor.")
+        await bot.session.close()
+        await run_supervisor(dp.resolve_used_update_types())
+        return
 
     logger.info("🤖 Бот запущен и готов к работе!")
-    print(f"Start polling\nRun polling for bot @{(await bot.me()).username}")
 
-    # Запуск бесконечного цикла polling (прослушивание обновлений)
+    # Запуск бесконечного цикла polling (прослушивание обновлений);
+    # getMe выполняется в on_startup параллельно с прогревом БД
     await dp.start_polling(bot)
 
 # --- Точка входа ---
@@ -1,7 +1,5 @@
 import os
-import shutil
-import logging
-from logging.handlers import RotatingFileHandler
+import json
 from pathlib import Path
 from dotenv import load_dotenv
 import re
@@ -14,48 +12,132 @@ DOTENV_PATH = BASE_DIR / ".env"
 load_dotenv(dotenv_path=DOTENV_PATH)
 
 # --- Логи ---
-LOG_DIR = str(BASE_DIR / "logs")
-
-def setup_logging():
-    """
-    Очищает папку logs и настраивает логирование.
-    Лимит файла 10 МБ, без бэкапов.
-    """
-    if os.path.exists(LOG_DIR):
-        shutil.rmtree(LOG_DIR)
-    os.makedirs(LOG_DIR, exist_ok=True)
-
-    file_handler = RotatingFileHandler(
-        filename=os.path.join(LOG_DIR, "bot.log"),
-        maxBytes=10 * 1024 * 1024,
-        backupCount=0
-    )
-    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
-    file_handler.setFormatter(formatter)
-
-    root = logging.getLogger()
-    root.setLevel(logging.INFO)
-    if root.hasHandlers():
-        root.handlers.clear()
-    root.addHandler(file_handler)
-    root.addHandler(logging.StreamHandler())
-
-    logging.info("🧹 Логи очищены и инициализированы.")
+# Запись в файлы идёт в отдельном потоке (services/logging_setup.py),
+# старые файлы сжимаются в .gz и хранятся LOG_BACKUP_COUNT штук.
+LOG_DIR = os.getenv("LOG_DIR", str(BASE_DIR / "logs"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")                          # формат файла: json | text
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # размер файла до ротации
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "10"))           # сколько старых файлов хранить
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "true").lower() in ("1", "true", "yes")
+LOG_UPDATES = os.getenv("LOG_UPDATES", "false").lower() in ("1", "true", "yes")  # строка лога на каждый апдейт
 
 # --- Переменные окружения ---
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 
+# --- Режим получения апдейтов: polling | webhook | supervisor ---
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")          # публичный https-адрес бота
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")              # X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "25"))  # ждать апдейты при остановке, сек
+
+# --- Режим supervisor: несколько процессов-воркеров, апдейты по from_user.id ---
+SUPERVISOR_WORKERS = int(os.getenv("SUPERVISOR_WORKERS", "0"))                # 0 — по числу ядер
+SUPERVISOR_QUEUE_SIZE = int(os.getenv("SUPERVISOR_QUEUE_SIZE", "1000"))       # очередь апдейтов воркера
+SUPERVISOR_MAX_RESTARTS = int(os.getenv("SUPERVISOR_MAX_RESTARTS", "5"))      # падений воркера за окно
+SUPERVISOR_RESTART_WINDOW = float(os.getenv("SUPERVISOR_RESTART_WINDOW", "300"))  # окно подсчёта падений, сек
+SUPERVISOR_STATS_INTERVAL = float(os.getenv("SUPERVISOR_STATS_INTERVAL", "60"))   # период статистики, сек
+SUPERVISOR_DRAIN_TIMEOUT = float(os.getenv("SUPERVISOR_DRAIN_TIMEOUT", "25"))     # ждать воркеры при остановке, сек
+
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "admin")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "assistant_bot")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "127.0.0.1")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5433")
 
-DATABASE_URL = (
+# DATABASE_URL целиком переопределяет POSTGRES_* (бенчмарки, SQLite для локальных прогонов)
+DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@"
     f"{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
 
+# --- Метрики (Prometheus) и профилировщик ---
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))    # 0 — эндпоинт выключен
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")           # Bearer-токен для /metrics и /debug/*
+
+# --- Пул соединений с БД ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))                  # постоянных соединений
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))            # сверх пула на пиках
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))          # ждать свободное соединение, сек
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))          # пересоздавать соединение, сек (-1 — никогда)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") == "1"         # проверять соединение перед выдачей
+DB_POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", "4"))             # открыть соединений при старте (не больше пула)
+# Кэш подготовленных выражений asyncpg; 0 — для pgbouncer в режиме transaction
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# Доп. параметры драйвера в JSON, например {"server_settings": {"application_name": "assistant_bot"}}
+DB_CONNECT_ARGS = json.loads(os.getenv("DB_CONNECT_ARGS", "{}"))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))       # писать в лог запросы дольше, мс
+
+# --- Кэш идентификаторов пользователей (tg_id -> users.id) ---
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))   # макс. число записей
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "3600"))      # время жизни записи, сек
+
+# --- Списки задач/сделок ---
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "10"))        # строк на одной странице
+LIST_CACHE_SIZE = int(os.getenv("LIST_CACHE_SIZE", "5000"))     # отрисованных списков в памяти
+LIST_CACHE_TTL = int(os.getenv("LIST_CACHE_TTL", "86400"))      # время жизни записи, сек
+
+# --- Импорт и экспорт задач и сделок (/import, /export) ---
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(5 * 1024 * 1024)))  # макс. размер файла
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "50000"))                 # макс. строк в файле
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))              # строк в одной пачке вставки
+IMPORT_ERRORS_SHOWN = int(os.getenv("IMPORT_ERRORS_SHOWN", "10"))            # ошибок в тексте ответа
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))              # строк за одну выборку курсора
+
+# --- Напоминания о задачах ---
+BOT_TIMEZONE = os.getenv("BOT_TIMEZONE", "Europe/Moscow")                  # часовой пояс времени задач
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "1") == "1"
+REMINDER_WINDOW = float(os.getenv("REMINDER_WINDOW", "300"))                # окно загрузки напоминаний, сек
+REMINDER_WINDOW_LIMIT = int(os.getenv("REMINDER_WINDOW_LIMIT", "5000"))     # макс. напоминаний в памяти
+REMINDER_CATCHUP_RATE = float(os.getenv("REMINDER_CATCHUP_RATE", "10"))     # пропущенных в секунду после рестарта
+REMINDER_MAX_LATENESS = float(os.getenv("REMINDER_MAX_LATENESS", str(6 * 3600)))  # старше — не отправляем, сек
+REMINDER_RETRY_DELAY = float(os.getenv("REMINDER_RETRY_DELAY", "60"))       # повтор после ошибки отправки, сек
+
+# --- Отчёты за период (/report day|week|month|custom) ---
+REPORT_MAX_DAYS = int(os.getenv("REPORT_MAX_DAYS", "366"))   # самый длинный период custom, дней
+
+# --- Семантический кэш советов по маркетингу ---
+MARKETING_CACHE_ENABLED = os.getenv("MARKETING_CACHE_ENABLED", "1") == "1"
+MARKETING_CACHE_EMBEDDER = os.getenv("MARKETING_CACHE_EMBEDDER", "openai")  # openai | hashing
+MARKETING_CACHE_SIZE = int(os.getenv("MARKETING_CACHE_SIZE", "1000"))
+MARKETING_CACHE_THRESHOLD = float(os.getenv("MARKETING_CACHE_THRESHOLD", "0.92"))
+MARKETING_CACHE_PATH = Path(os.getenv("MARKETING_CACHE_PATH", BASE_DIR / "data" / "marketing_cache"))
+
+# --- Планировщик запросов к OpenAI ---
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))          # одновременных запросов к API
+LLM_USER_RATE_PER_MIN = float(os.getenv("LLM_USER_RATE_PER_MIN", "6"))    # квота пользователя, запросов/мин
+LLM_USER_BURST = int(os.getenv("LLM_USER_BURST", "3"))                    # запас квоты на всплеск
+LLM_QUOTA_MAX_WAIT = float(os.getenv("LLM_QUOTA_MAX_WAIT", "10"))         # сколько ждать квоту, сек
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))           # сколько ждать слот, сек
+
+# --- Очередь отправки в Telegram (лимиты Bot API) ---
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))              # запросов/с на бота
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))                   # сообщений/с в личный чат
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "3"))                   # запас на всплеск в личном чате
+SEND_GROUP_RATE_PER_MIN = float(os.getenv("SEND_GROUP_RATE_PER_MIN", "20"))  # сообщений/мин в группу
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))                 # повторов после RetryAfter
+
+# --- Потоковый вывод ответов ChatGPT ---
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # мин. пауза между правками, сек
+STREAM_FINAL_EDIT_ATTEMPTS = int(os.getenv("STREAM_FINAL_EDIT_ATTEMPTS", "3"))  # попыток итоговой правки при RetryAfter
+
+# --- Пул мотивационных фраз ---
+MOTIVATION_POOL_SIZE = int(os.getenv("MOTIVATION_POOL_SIZE", "30"))            # до скольких фраз пополняем
+MOTIVATION_POOL_LOW_WATER = int(os.getenv("MOTIVATION_POOL_LOW_WATER", "10"))  # порог запуска пополнения
+MOTIVATION_BATCH_SIZE = int(os.getenv("MOTIVATION_BATCH_SIZE", "10"))          # фраз за один запрос к API
+MOTIVATION_HISTORY_SIZE = int(os.getenv("MOTIVATION_HISTORY_SIZE", "5"))       # не повторять N последних фраз
+
+# --- Хранилище FSM: postgres | memory ---
+FSM_STORAGE = os.getenv("FSM_STORAGE", "postgres")
+FSM_WRITE_BACK = os.getenv("FSM_WRITE_BACK", "1") == "1"           # копить изменения и писать пачками
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))  # период сброса пачки, сек
+FSM_TTL = int(os.getenv("FSM_TTL", str(7 * 24 * 3600)))            # брошенный мастер живёт, сек
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))         # записей в write-back кэше
+
 # --- Валидация токена (как у BotFather: digits:Base64-like) ---
 _TOKEN_RE = re.compile(r"^\d{6,12}:[A-Za-z0-9_-]{20,}$")
 
@@ -1,14 +1,63 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import asyncio
+from uuid import uuid4
+from typing import Sequence
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from config import (
+    DATABASE_URL,
+    DB_CONNECT_ARGS,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_PREWARM,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE,
+)
+from database.models import Base
+from database.pool_metrics import InstrumentedPool, instrument_engine
 import logging
 
 # Создаём отдельный логгер для работы с базой данных
 logger = logging.getLogger(__name__)
 
+def engine_options(url: str) -> dict:
+    """
+    Параметры create_async_engine из config.py: размер пула, таймауты,
+    кэш подготовленных выражений asyncpg и доп. параметры драйвера.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # БД в памяти живёт в одном соединении — пул не настраиваем
+        return {"connect_args": dict(DB_CONNECT_ARGS)}
+
+    connect_args = dict(DB_CONNECT_ARGS)
+    if parsed.get_driver_name() == "asyncpg":
+        connect_args.setdefault("statement_cache_size", DB_STATEMENT_CACHE_SIZE)
+        connect_args.setdefault("prepared_statement_cache_size", DB_STATEMENT_CACHE_SIZE)
+        if DB_STATEMENT_CACHE_SIZE == 0:
+            # pgbouncer (transaction mode): соединение может смениться между
+            # PREPARE и EXECUTE — имена выражений должны быть уникальными
+            connect_args.setdefault("prepared_statement_name_func", lambda: f"__asyncpg_{uuid4()}__")
+
+    return {
+        "poolclass": InstrumentedPool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
 # --- Асинхронный движок SQLAlchemy ---
 # echo=False — отключает лишние SQL-логи в консоли
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+engine = create_async_engine(DATABASE_URL, echo=False, future=True, **engine_options(DATABASE_URL))
+# Ожидание соединений из пула и время запросов (database/pool_metrics.py)
+instrument_engine(engine)
 
 # --- Фабрика асинхронных сессий ---
 # expire_on_commit=False — данные не будут очищаться после commit
@@ -18,6 +67,24 @@ async_session = sessionmaker(
     expire_on_commit=False
 )
 
+async def prewarm_pool(count: int = DB_POOL_PREWARM) -> int:
+    """
+    Открывает заранее до count соединений пула (не больше DB_POOL_SIZE)
+    параллельно и возвращает их в пул: первые апдейты после рестарта
+    не ждут TCP, TLS и авторизацию в PostgreSQL. Возвращает число соединений.
+    """
+    if not isinstance(engine.pool, InstrumentedPool):
+        # БД в памяти — одно соединение, греть нечего
+        return 0
+    count = max(0, min(count, DB_POOL_SIZE))
+    connections = await asyncio.gather(*(engine.connect() for _ in range(count)), return_exceptions=True)
+    opened = [conn for conn in connections if isinstance(conn, AsyncConnection)]
+    await asyncio.gather(*(conn.close() for conn in opened))
+    errors = [conn for conn in connections if isinstance(conn, BaseException)]
+    if errors:
+        raise errors[0]
+    return len(opened)
+
 async def get_session() -> AsyncSession:
     """
     Асинхронный генератор сессий к базе данных.
@@ -30,3 +97,33 @@ async def get_session() -> AsyncSession:
     """
     async with async_session() as session:
         yield session
+
+
+def insert_for(session: AsyncSession):
+    """
+    Возвращает конструктор INSERT для диалекта текущей сессии.
+    Нужен для ON CONFLICT ... (есть и в PostgreSQL, и в SQLite).
+
+    Пример использования:
+        stmt = insert_for(session)(User).values(...).on_conflict_do_nothing()
+    """
+    if session.bind.dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
+
+
+async def bulk_insert(conn: AsyncConnection, table: str, columns: Sequence[str], records: Sequence[tuple]) -> None:
+    """
+    Пачечная вставка строк в текущей транзакции соединения:
+    на asyncpg — COPY, на остальных драйверах — многострочный INSERT.
+
+    Транзакция asyncpg открывается при первом запросе через SQLAlchemy,
+    поэтому до COPY в транзакции должен быть выполнен хотя бы один запрос.
+    """
+    if not records:
+        return
+    if conn.dialect.driver == "asyncpg":
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(table, records=list(records), columns=list(columns))
+        return
+    await conn.execute(Base.metadata.tables[table].insert(), [dict(zip(columns, record)) for record in records])
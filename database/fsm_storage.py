@@ -0,0 +1,235 @@
+"""
+Хранилище FSM aiogram в PostgreSQL (таблица fsm_states).
+
+Состояния мастеров (TaskAddState, DealAddState, MarketingState) переживают
+рестарт и видны всем процессам бота. Необязательный write-back кэш держит
+записи в памяти и сбрасывает изменения в БД пачкой раз в FSM_FLUSH_INTERVAL:
+set_state + update_data одного апдейта превращаются в одну запись строки.
+
+Write-back кэш безопасен, когда апдейты пользователя обрабатывает один
+процесс (один инстанс или шардирование по user_id). Если апдейты одного
+пользователя могут попасть в разные реплики — включайте FSM_WRITE_BACK=0.
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import delete, select
+
+from config import FSM_CACHE_SIZE, FSM_FLUSH_INTERVAL, FSM_TTL, FSM_WRITE_BACK
+from database.db import async_session, insert_for
+from database.models import FsmState
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять протухшие состояния из БД, сек
+PURGE_INTERVAL = 600
+
+
+def _empty(record: dict) -> bool:
+    return record["state"] is None and not record["data"]
+
+
+class PostgresStorage(BaseStorage):
+    """
+    ttl — через сколько секунд без изменений состояние считается устаревшим,
+    write_back — копить изменения в памяти и писать пачками,
+    flush_interval — период сброса пачки, cache_size — предел записей в кэше.
+    """
+
+    def __init__(
+        self,
+        session_factory=async_session,
+        key_builder: Optional[KeyBuilder] = None,
+        ttl: float = FSM_TTL,
+        write_back: bool = FSM_WRITE_BACK,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        cache_size: int = FSM_CACHE_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.ttl = ttl
+        self.write_back = write_back
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        # key -> {"state": str | None, "data": dict, "updated": unix time}
+        self._cache: "OrderedDict[str, dict]" = OrderedDict()
+        self._dirty: set = set()
+        # Ключи пачки, которая сейчас пишется в БД: до конца транзакции их
+        # нельзя вытеснять — при ошибке запись вернётся в _dirty
+        self._flushing: set = set()
+        self._worker: Optional[asyncio.Task] = None
+        self._last_purge = time.monotonic()
+
+    # --- Фоновый сброс изменений и чистка по TTL ---
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run_worker())
+
+    async def _run_worker(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - self._last_purge >= PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                await self.purge_expired()
+
+    async def flush(self) -> None:
+        """
+        Пишет накопленные изменения одной транзакцией: пачка UPSERT + пачка DELETE.
+        """
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        self._flushing |= keys
+        upserts, deletes = [], []
+        for key in keys:
+            record = self._cache.get(key)
+            if record is None or _empty(record):
+                deletes.append(key)
+            else:
+                upserts.append({
+                    "key": key,
+                    "state": record["state"],
+                    "data": record["data"],
+                    "updated_at": datetime.fromtimestamp(record["updated"], timezone.utc),
+                })
+        try:
+            async with self.session_factory() as session:
+                if upserts:
+                    stmt = insert_for(session)(FsmState)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[FsmState.key],
+                        set_={
+                            "state": stmt.excluded.state,
+                            "data": stmt.excluded.data,
+                            "updated_at": stmt.excluded.updated_at,
+                        },
+                    )
+                    await session.execute(stmt, upserts)
+                if deletes:
+                    await session.execute(delete(FsmState).where(FsmState.key.in_(deletes)))
+                await session.commit()
+        except Exception as e:
+            # Не теряем изменения — попробуем в следующий раз
+            self._dirty |= set(keys)
+            logger.error(f"Не удалось сохранить состояния FSM: {e}")
+        finally:
+            self._flushing -= keys
+
+    async def purge_expired(self) -> int:
+        """Удаляет из БД состояния, не менявшиеся дольше ttl."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        async with self.session_factory() as session:
+            result = await session.execute(delete(FsmState).where(FsmState.updated_at < cutoff))
+            await session.commit()
+        if result.rowcount:
+            logger.info("Удалено устаревших состояний FSM: %s", result.rowcount)
+        return result.rowcount
+
+    # --- Чтение/запись записей ---
+
+    def _expired(self, updated: float) -> bool:
+        return time.time() - updated > self.ttl
+
+    def _remember(self, key: str, record: dict) -> None:
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        # Вытесняем только уже сохранённые записи — несохранённые и
+        # записываемые сейчас ждут конца flush
+        for old_key in list(self._cache):
+            if len(self._cache) <= self.cache_size:
+                break
+            if old_key not in self._dirty and old_key not in self._flushing:
+                del self._cache[old_key]
+
+    async def _fetch(self, key: str) -> dict:
+        async with self.session_factory() as session:
+            row = (await session.execute(
+                select(FsmState.state, FsmState.data, FsmState.updated_at).where(FsmState.key == key)
+            )).one_or_none()
+        if row is None:
+            return {"state": None, "data": {}, "updated": time.time()}
+        updated_at = row.updated_at
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        record = {"state": row.state, "data": dict(row.data or {}), "updated": updated_at.timestamp()}
+        if self._expired(record["updated"]):
+            return {"state": None, "data": {}, "updated": time.time()}
+        return record
+
+    async def _load(self, key: str) -> dict:
+        self._ensure_worker()
+        if not self.write_back:
+            return await self._fetch(key)
+        record = self._cache.get(key)
+        if record is None:
+            record = await self._fetch(key)
+            self._remember(key, record)
+        elif self._expired(record["updated"]):
+            record.update(state=None, data={}, updated=time.time())
+            self._dirty.add(key)
+        else:
+            self._cache.move_to_end(key)
+        return record
+
+    async def _write_through(self, key: str, **values: Any) -> None:
+        values["updated_at"] = datetime.now(timezone.utc)
+        async with self.session_factory() as session:
+            stmt = insert_for(session)(FsmState).values(
+                key=key,
+                state=values.get("state"),
+                data=values.get("data", {}),
+                updated_at=values["updated_at"],
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[FsmState.key],
+                set_={name: getattr(stmt.excluded, name) for name in values},
+            )
+            await session.execute(stmt)
+            await session.commit()
+
+    async def _write(self, key: str, **values: Any) -> None:
+        if not self.write_back:
+            self._ensure_worker()
+            await self._write_through(key, **values)
+            return
+        record = await self._load(key)
+        record.update(values, updated=time.time())
+        self._dirty.add(key)
+
+    # --- Интерфейс BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._write(self.key_builder.build(key), state=state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self.key_builder.build(key)))["state"]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        await self._write(self.key_builder.build(key), data=data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._load(self.key_builder.build(key)))["data"])
+
+    async def close(self) -> None:
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
@@ -0,0 +1,296 @@
+"""
+Версионированные миграции схемы БД (PostgreSQL).
+
+Каждая миграция — номер, описание и список SQL-команд. Применённые версии
+записываются в таблицу schema_version. Бот при старте только сверяет
+версию и DDL не выполняет.
+
+Запуск:
+    python -m database.migrate            # применить новые миграции
+    python -m database.migrate current    # показать текущую версию схемы
+"""
+
+import sys
+import asyncio
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config import BOT_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_xact_lock: несколько реплик не мигрируют одновременно
+_MIGRATION_LOCK_ID = 7_301_2025
+
+# --- Миграции: (версия, описание, [SQL, ...]) ---
+# SQL — строка или text(...) с параметрами (.bindparams).
+# Уже применённые миграции не редактируются — только добавляются новые.
+MIGRATIONS = [
+    (
+        1,
+        "Базовые таблицы users, tasks, deals",
+        [
+            # Совпадает со схемой, которую раньше строил create_all,
+            # поэтому на существующей БД миграция ничего не меняет.
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                tg_id INTEGER NOT NULL UNIQUE,
+                username VARCHAR(100) NOT NULL,
+                created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                title VARCHAR(255) NOT NULL,
+                time VARCHAR(50) NOT NULL,
+                status VARCHAR(50) NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS deals (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                title VARCHAR(255) NOT NULL,
+                amount INTEGER NOT NULL,
+                status VARCHAR(50) NOT NULL
+            )
+            """,
+        ],
+    ),
+    (
+        2,
+        "tg_id -> BIGINT, индексы (user_id, status) для списков и /report",
+        [
+            # Telegram ID давно вышли за пределы INTEGER
+            "ALTER TABLE users ALTER COLUMN tg_id TYPE BIGINT",
+            "CREATE INDEX IF NOT EXISTS ix_tasks_user_status ON tasks (user_id, status)",
+            # amount в INCLUDE — SUM по закрытым сделкам идёт index-only scan
+            "CREATE INDEX IF NOT EXISTS ix_deals_user_status ON deals (user_id, status) INCLUDE (amount)",
+        ],
+    ),
+    (
+        3,
+        "Таблица user_stats для /report и её первичное заполнение",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+                tasks_done INTEGER NOT NULL DEFAULT 0,
+                deals_closed INTEGER NOT NULL DEFAULT 0,
+                deals_closed_sum BIGINT NOT NULL DEFAULT 0
+            )
+            """,
+            """
+            INSERT INTO user_stats (user_id, tasks_done, deals_closed, deals_closed_sum)
+            SELECT u.id,
+                   (SELECT count(*) FROM tasks t
+                     WHERE t.user_id = u.id AND t.status = 'Выполнена'),
+                   (SELECT count(*) FROM deals d
+                     WHERE d.user_id = u.id AND d.status = 'Закрыта'),
+                   (SELECT coalesce(sum(d.amount), 0) FROM deals d
+                     WHERE d.user_id = u.id AND d.status = 'Закрыта')
+              FROM users u
+            ON CONFLICT (user_id) DO NOTHING
+            """,
+        ],
+    ),
+    (
+        4,
+        "Таблица fsm_states — состояния FSM переживают рестарт",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                key VARCHAR(255) PRIMARY KEY,
+                state VARCHAR(255),
+                data JSONB NOT NULL DEFAULT '{}'::jsonb,
+                updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+            )
+            """,
+            # Чистка протухших состояний идёт по updated_at
+            "CREATE INDEX IF NOT EXISTS ix_fsm_states_updated_at ON fsm_states (updated_at)",
+        ],
+    ),
+    (
+        5,
+        "tasks.due_at и tasks.reminded_at для напоминаний",
+        [
+            # Старые задачи остаются без due_at: напоминания только для новых
+            "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS due_at TIMESTAMP WITH TIME ZONE",
+            "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS reminded_at TIMESTAMP WITH TIME ZONE",
+            # Частичный индекс: отправленные напоминания в нём не лежат
+            """
+            CREATE INDEX IF NOT EXISTS ix_tasks_due_pending ON tasks (due_at, id)
+             WHERE due_at IS NOT NULL AND reminded_at IS NULL
+            """,
+        ],
+    ),
+    (
+        6,
+        "created_at/closed_at у задач и сделок, дневные счётчики user_daily_stats",
+        [
+            # У существующих записей истории нет — считаем их созданными
+            # (и выполненные — закрытыми) в момент миграции
+            "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+            "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS closed_at TIMESTAMP WITH TIME ZONE",
+            "UPDATE tasks SET closed_at = created_at WHERE status = 'Выполнена' AND closed_at IS NULL",
+            "ALTER TABLE deals ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+            "ALTER TABLE deals ADD COLUMN IF NOT EXISTS closed_at TIMESTAMP WITH TIME ZONE",
+            "UPDATE deals SET closed_at = created_at WHERE status = 'Закрыта' AND closed_at IS NULL",
+            """
+            CREATE TABLE IF NOT EXISTS user_daily_stats (
+                user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+                day DATE NOT NULL,
+                tasks_created INTEGER NOT NULL DEFAULT 0,
+                tasks_done INTEGER NOT NULL DEFAULT 0,
+                deals_created INTEGER NOT NULL DEFAULT 0,
+                deals_closed INTEGER NOT NULL DEFAULT 0,
+                deals_closed_sum BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day)
+            )
+            """,
+            # День — в часовом поясе бота, как и в database/stats.py;
+            # пояс из окружения — параметром, а не подстановкой в текст SQL
+            text("""
+            INSERT INTO user_daily_stats
+                (user_id, day, tasks_created, tasks_done, deals_created, deals_closed, deals_closed_sum)
+            SELECT user_id, day, sum(tc), sum(td), sum(dc), sum(dd), sum(ds)
+              FROM (
+                SELECT user_id, (created_at AT TIME ZONE :tz)::date AS day,
+                       1 AS tc, 0 AS td, 0 AS dc, 0 AS dd, 0 AS ds
+                  FROM tasks
+                UNION ALL
+                SELECT user_id, (closed_at AT TIME ZONE :tz)::date, 0, 1, 0, 0, 0
+                  FROM tasks WHERE closed_at IS NOT NULL
+                UNION ALL
+                SELECT user_id, (created_at AT TIME ZONE :tz)::date, 0, 0, 1, 0, 0
+                  FROM deals
+                UNION ALL
+                SELECT user_id, (closed_at AT TIME ZONE :tz)::date, 0, 0, 0, 1, amount
+                  FROM deals WHERE closed_at IS NOT NULL
+              ) AS events
+             GROUP BY user_id, day
+            ON CONFLICT (user_id, day) DO NOTHING
+            """).bindparams(tz=BOT_TIMEZONE),
+        ],
+    ),
+    (
+        7,
+        "Индексы (user_id, ранг статуса, id) для страниц списков задач и сделок",
+        [
+            # Выражение совпадает с status_rank() (database/pagination.py):
+            # keyset-страница идёт Index Scan без Sort по всем записям пользователя
+            """
+            CREATE INDEX IF NOT EXISTS ix_tasks_user_rank
+                ON tasks (user_id, (CASE WHEN status = 'Выполнена' THEN 1 ELSE 0 END), id)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_deals_user_rank
+                ON deals (user_id, (CASE WHEN status = 'Закрыта' THEN 1 ELSE 0 END), id)
+            """,
+        ],
+    ),
+]
+
+# Версия схемы, которую ожидает текущий код
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now()
+)
+"""
+
+
+async def get_schema_version(engine: AsyncEngine) -> int:
+    """
+    Возвращает версию схемы БД (0, если миграции ещё не применялись —
+    нет таблицы schema_version). Ошибки подключения не маскируются:
+    недоступная БД или неверный пароль — исключение, а не «версия 0».
+    """
+    async with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            exists = await conn.scalar(text("SELECT to_regclass('schema_version') IS NOT NULL"))
+        else:
+            exists = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("schema_version"))
+        if not exists:
+            return 0
+        return await conn.scalar(text("SELECT max(version) FROM schema_version")) or 0
+
+
+async def verify_schema_version(engine: AsyncEngine) -> None:
+    """
+    Проверяет, что схема БД соответствует коду. Вызывается при старте бота.
+    Бросает RuntimeError, если миграции не применены.
+    """
+    version = await get_schema_version(engine)
+    if version < SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Схема БД устарела: версия {version}, нужна {SCHEMA_VERSION}. "
+            "Выполни: python -m database.migrate"
+        )
+    if version > SCHEMA_VERSION:
+        logger.warning(
+            "Схема БД новее кода (%s > %s) — вероятно, идёт выкатка новой версии.",
+            version, SCHEMA_VERSION,
+        )
+
+
+async def upgrade(engine: AsyncEngine) -> int:
+    """
+    Применяет все миграции новее текущей версии.
+    Каждая миграция выполняется в своей транзакции. Возвращает итоговую версию.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(text(_CREATE_VERSION_TABLE))
+
+    current = await get_schema_version(engine)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _MIGRATION_LOCK_ID})
+            # Пока ждали блокировку, миграцию мог применить другой процесс
+            applied = await conn.execute(
+                text("SELECT 1 FROM schema_version WHERE version = :v"), {"v": version}
+            )
+            if applied.scalar() is not None:
+                continue
+            for statement in statements:
+                await conn.execute(text(statement) if isinstance(statement, str) else statement)
+            await conn.execute(
+                text("INSERT INTO schema_version (version, description) VALUES (:v, :d)"),
+                {"v": version, "d": description},
+            )
+        logger.info("✅ Миграция %s применена: %s", version, description)
+        current = version
+    return current
+
+
+async def main(argv) -> None:
+    from database.db import engine
+
+    command = argv[0] if argv else "upgrade"
+    try:
+        if command == "upgrade":
+            version = await upgrade(engine)
+            print(f"Схема БД в актуальном состоянии: версия {version}")
+        elif command == "current":
+            version = await get_schema_version(engine)
+            print(f"Текущая версия схемы: {version} (код ожидает {SCHEMA_VERSION})")
+        else:
+            print(__doc__)
+            sys.exit(2)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    asyncio.run(main(sys.argv[1:]))
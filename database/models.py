@@ -1,11 +1,18 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, ForeignKey, DateTime
-from datetime import datetime
+from sqlalchemy import JSON, String, Integer, BigInteger, ForeignKey, Date, DateTime, Index, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import date, datetime, timezone
+
+from database.pagination import status_rank
 
 class Base(DeclarativeBase):
     """Базовый класс для всех ORM-моделей."""
     pass
 
+def utcnow() -> datetime:
+    """Текущее время в UTC (для колонок с часовым поясом)."""
+    return datetime.now(timezone.utc)
+
 class User(Base):
     """
     Таблица пользователей бота.
@@ -14,7 +21,7 @@ class User(Base):
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    tg_id: Mapped[int] = mapped_column(unique=True)         # Telegram ID пользователя
+    tg_id: Mapped[int] = mapped_column(BigInteger, unique=True)  # Telegram ID пользователя
     username: Mapped[str] = mapped_column(String(100))      # username или имя
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow
@@ -26,6 +33,18 @@ class Task(Base):
     Связана с таблицей users через user_id (внешний ключ).
     """
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Список задач и /report фильтруют по пользователю и статусу
+        Index("ix_tasks_user_status", "user_id", "status"),
+        # Окна планировщика напоминаний: только ещё не отправленные
+        Index(
+            "ix_tasks_due_pending",
+            "due_at",
+            "id",
+            postgresql_where=text("due_at IS NOT NULL AND reminded_at IS NULL"),
+            sqlite_where=text("due_at IS NOT NULL AND reminded_at IS NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))  # ссылка на пользователя
@@ -33,4 +52,91 @@ class Task(Base):
     time: Mapped[str] = mapped_column(String(50))                 # время выполнения
     status: Mapped[str] = mapped_column(
         String(50), default="Не выполнена"
-    )                                                             # текущий статус
\ No newline at end of file
+    )                                                             # текущий статус
+    due_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )                                                             # срок из time (UTC), см. services/due_time.py
+    reminded_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )                                                             # когда отправлено напоминание
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utcnow, server_default=func.now()
+    )                                                             # когда создана
+    closed_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )                                                             # когда выполнена (None — не выполнена)
+
+class Deal(Base):
+    """
+    Таблица сделок пользователя.
+    Связана с таблицей users через user_id (внешний ключ).
+    """
+    __tablename__ = "deals"
+    __table_args__ = (
+        # amount в INCLUDE — сумма закрытых сделок считается index-only scan
+        Index("ix_deals_user_status", "user_id", "status", postgresql_include=["amount"]),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))  # ссылка на пользователя
+    title: Mapped[str] = mapped_column(String(255))               # название сделки
+    amount: Mapped[int] = mapped_column(Integer)                  # сумма, ₽
+    status: Mapped[str] = mapped_column(
+        String(50), default="Открыта"
+    )                                                             # текущий статус
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utcnow, server_default=func.now()
+    )                                                             # когда создана
+    closed_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )                                                             # когда закрыта (None — не закрыта)
+
+# Страницы списков: keyset по (ранг статуса, id) внутри пользователя
+# (database/pagination.py). Выражение ранга — то же, что в запросе
+Index("ix_tasks_user_rank", Task.user_id, status_rank(Task.status, "Выполнена"), Task.id)
+Index("ix_deals_user_rank", Deal.user_id, status_rank(Deal.status, "Закрыта"), Deal.id)
+
+class UserStats(Base):
+    """
+    Накопительная статистика пользователя для /report.
+    Обновляется в той же транзакции, что и изменения задач/сделок
+    (см. database/stats.py), поэтому отчёт — одно чтение по первичному ключу.
+    """
+    __tablename__ = "user_stats"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    tasks_done: Mapped[int] = mapped_column(Integer, default=0)            # выполненные задачи
+    deals_closed: Mapped[int] = mapped_column(Integer, default=0)          # закрытые сделки
+    deals_closed_sum: Mapped[int] = mapped_column(BigInteger, default=0)   # сумма закрытых сделок, ₽
+
+class UserDailyStats(Base):
+    """
+    Дневные счётчики пользователя для /report за период (день — в BOT_TIMEZONE).
+    Созданные записи считаются по дню created_at, выполненные и закрытые —
+    по дню closed_at. Обновляются в той же транзакции, что и user_stats,
+    поэтому отчёт за период — сумма не более чем нескольких сотен строк.
+    """
+    __tablename__ = "user_daily_stats"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    tasks_created: Mapped[int] = mapped_column(Integer, default=0)         # создано задач
+    tasks_done: Mapped[int] = mapped_column(Integer, default=0)            # выполнено задач
+    deals_created: Mapped[int] = mapped_column(Integer, default=0)         # создано сделок
+    deals_closed: Mapped[int] = mapped_column(Integer, default=0)          # закрыто сделок
+    deals_closed_sum: Mapped[int] = mapped_column(BigInteger, default=0)   # сумма закрытых сделок, ₽
+
+class FsmState(Base):
+    """
+    Состояния FSM aiogram (см. database/fsm_storage.py).
+    key — ключ хранилища (бот, чат, пользователь, destiny); строки,
+    не менявшиеся дольше FSM_TTL, удаляются по updated_at.
+    """
+    __tablename__ = "fsm_states"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str | None] = mapped_column(String(255), nullable=True)   # текущее состояние
+    data: Mapped[dict] = mapped_column(
+        JSON().with_variant(JSONB, "postgresql"), default=dict
+    )                                                                        # данные мастера
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
@@ -0,0 +1,68 @@
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import Select, case, literal, literal_column, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Направления листания списка
+PAGE_NEXT = "next"
+PAGE_PREV = "prev"
+
+
+def status_rank(status_column, last_status: str):
+    """
+    Ранг записи для сортировки: 0 — активные, 1 — завершённые (в конце списка).
+
+    Значения пишутся в SQL литералами, а не параметрами: тогда выражение
+    совпадает с индексами ix_tasks_user_rank / ix_deals_user_rank
+    (database/models.py, миграция 7), и PostgreSQL читает страницу
+    из индекса, без сортировки всех записей пользователя.
+    """
+    return case(
+        (status_column == literal(last_status, literal_execute=True), literal_column("1")),
+        else_=literal_column("0"),
+    )
+
+
+def encode_cursor(rank: int, row_id: int) -> str:
+    """Курсор страницы для callback_data: «<ранг>.<id>»."""
+    return f"{rank}.{row_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    rank, row_id = cursor.split(".")
+    return int(rank), int(row_id)
+
+
+async def fetch_page(
+    session: AsyncSession,
+    stmt: Select,
+    rank,
+    id_column,
+    cursor: Optional[Tuple[int, int]] = None,
+    direction: str = PAGE_NEXT,
+    limit: int = 10,
+) -> Tuple[Sequence[Row], bool, bool]:
+    """
+    Keyset-пагинация по паре (rank, id) с сортировкой на стороне БД.
+
+    stmt должен выбирать rank последней колонкой — по ней строится курсор.
+    Читаем limit + 1 строк: лишняя строка говорит, есть ли следующая страница.
+    Возвращает (строки страницы, есть_предыдущая, есть_следующая).
+    """
+    key = tuple_(rank, id_column)
+    if direction == PAGE_PREV and cursor is not None:
+        stmt = stmt.where(key < tuple_(*cursor)).order_by(rank.desc(), id_column.desc())
+    else:
+        if cursor is not None:
+            stmt = stmt.where(key > tuple_(*cursor))
+        stmt = stmt.order_by(rank, id_column)
+
+    rows = (await session.execute(stmt.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if direction == PAGE_PREV and cursor is not None:
+        rows.reverse()
+        return rows, has_more, True
+    return rows, cursor is not None, has_more
@@ -0,0 +1,138 @@
+"""
+Метрики пула соединений и запросов к БД.
+
+- ожидание соединения из пула (сколько раз, сколько в среднем/максимум,
+  сколько раз не дождались за DB_POOL_TIMEOUT);
+- соединения в работе сейчас и на пике;
+- время выполнения запросов по каждому тексту SQL, медленные — в лог.
+
+Если растёт ожидание соединения, а запросы быстрые — узкое место пул
+(DB_POOL_SIZE / DB_MAX_OVERFLOW). Если медленные сами запросы — PostgreSQL.
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from typing import List
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config import DB_SLOW_QUERY_MS
+from services.metrics import record_span, registry
+
+logger = logging.getLogger(__name__)
+
+# Ключ в connection.info со временем начала текущего запроса
+_QUERY_STARTED = "query_started"
+
+
+class DBMetrics:
+    """
+    slow_query_ms — порог записи запроса в лог,
+    max_statements — сколько разных текстов SQL хранить (LRU).
+    """
+
+    def __init__(self, slow_query_ms: float = DB_SLOW_QUERY_MS, max_statements: int = 200):
+        self.slow_query = slow_query_ms / 1000
+        self.max_statements = max_statements
+
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.in_use = 0
+        self.in_use_peak = 0
+        # SQL -> [count, total, max]
+        self.statements: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def observe_checkout(self, waited: float) -> None:
+        self.checkouts += 1
+        self.checkout_wait_total += waited
+        self.checkout_wait_max = max(self.checkout_wait_max, waited)
+
+    def observe_statement(self, statement: str, elapsed: float) -> None:
+        key = " ".join(statement.split())[:120]
+        stat = self.statements.get(key)
+        if stat is None:
+            stat = self.statements[key] = [0, 0.0, 0.0]
+            while len(self.statements) > self.max_statements:
+                self.statements.popitem(last=False)
+        else:
+            self.statements.move_to_end(key)
+        stat[0] += 1
+        stat[1] += elapsed
+        stat[2] = max(stat[2], elapsed)
+        if elapsed >= self.slow_query:
+            logger.warning("Медленный запрос (%.0f мс): %s", elapsed * 1000, key)
+
+    def top_statements(self, n: int = 5) -> List[dict]:
+        """Запросы с наибольшим суммарным временем."""
+        top = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:n]
+        return [
+            {"sql": sql, "count": count, "avg_ms": total / count * 1000, "max_ms": slowest * 1000}
+            for sql, (count, total, slowest) in top
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_wait_avg": self.checkout_wait_total / self.checkouts if self.checkouts else 0.0,
+            "checkout_wait_max": self.checkout_wait_max,
+            "in_use": self.in_use,
+            "in_use_peak": self.in_use_peak,
+        }
+
+
+# Общие метрики процесса
+db_metrics = DBMetrics()
+registry.register_stats("bot_db_pool", "Пул соединений БД", db_metrics.stats)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool, который замеряет ожидание соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            db_metrics.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            db_metrics.observe_checkout(waited)
+            record_span("db_wait", waited)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Подписывает db_metrics на события пула и выполнения запросов движка."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        db_metrics.in_use += 1
+        db_metrics.in_use_peak = max(db_metrics.in_use_peak, db_metrics.in_use)
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        db_metrics.in_use = max(0, db_metrics.in_use - 1)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info[_QUERY_STARTED] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop(_QUERY_STARTED, None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            db_metrics.observe_statement(statement, elapsed)
+            record_span("db", elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(context):
+        if context.connection is not None:
+            context.connection.info.pop(_QUERY_STARTED, None)
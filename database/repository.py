@@ -0,0 +1,231 @@
+"""
+Изменение задач и сделок пользователя на стороне БД.
+
+Каждая операция — один UPDATE или DELETE с проверкой владельца
+(user_id = :uid) и RETURNING; счётчики /report (database/stats.py)
+обновляются в той же сессии. Коммит — на стороне вызывающего кода.
+
+Список id в PostgreSQL передаётся одним массивом (id = ANY(:ids)): текст
+запроса не зависит от числа id, и asyncpg переиспользует подготовленное
+выражение. На остальных диалектах — IN (...).
+"""
+
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import ARRAY, Integer, any_, bindparam, case, delete, null, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Deal, Task, utcnow
+from database.stats import DEAL_CLOSED, TASK_DONE, deals_changed, tasks_changed
+
+TASK_OPEN = "Не выполнена"
+
+
+class TaskRow(NamedTuple):
+    """Задача после изменения (и её прежние статус и closed_at)."""
+    id: int
+    title: str
+    time: str
+    status: Optional[str]
+    created_at: datetime
+    closed_at: Optional[datetime]
+    old_status: Optional[str]
+    old_closed_at: Optional[datetime]
+
+
+class DealRow(NamedTuple):
+    """Сделка после изменения (и её прежние статус и closed_at)."""
+    id: int
+    title: str
+    amount: int
+    status: Optional[str]
+    created_at: datetime
+    closed_at: Optional[datetime]
+    old_status: Optional[str]
+    old_closed_at: Optional[datetime]
+
+
+def id_in(session: AsyncSession, column, ids: Iterable[int]):
+    """Условие «column входит в ids»: = ANY(:ids) на PostgreSQL, IN на остальных."""
+    ids = list(ids)
+    if session.bind.dialect.name == "postgresql":
+        return column == any_(bindparam("ids", ids, type_=ARRAY(Integer), unique=True))
+    return column.in_(ids)
+
+
+async def _update_returning_old(session: AsyncSession, model, where: list, values: dict,
+                                columns: Sequence, old_columns: Sequence[str]) -> list:
+    """
+    UPDATE ... RETURNING: новые значения columns и прежние old_columns.
+
+    PostgreSQL — одним запросом: прежние значения даёт CTE
+    WITH old AS (SELECT ... FOR UPDATE) UPDATE <таблица> ... FROM old.
+    Блокировка важна: при параллельной правке той же строки (двойное
+    нажатие) READ COMMITTED перечитывает заблокированную строку, и old
+    содержит значения после чужого коммита, а не из снимка запроса —
+    иначе счётчики /report разъедутся с таблицами. SQLite не разрешает
+    ссылаться в RETURNING на другие таблицы, поэтому там прежние значения
+    читаются отдельным SELECT в той же транзакции.
+    """
+    if session.bind.dialect.name == "postgresql":
+        old = (
+            select(model.id, *(getattr(model, name) for name in old_columns))
+            .where(*where)
+            .with_for_update()
+            .cte("old")
+        )
+        stmt = (
+            update(model)
+            .where(model.id == old.c.id)
+            .values(**values)
+            .returning(*columns, *(old.c[name] for name in old_columns))
+        )
+        return [tuple(row) for row in (await session.execute(stmt)).all()]
+
+    previous = {
+        row[0]: tuple(row[1:])
+        for row in await session.execute(select(model.id, *(getattr(model, name) for name in old_columns)).where(*where))
+    }
+    if not previous:
+        return []
+    stmt = update(model).where(model.id.in_(list(previous)), *where).values(**values).returning(*columns)
+    return [tuple(row) + previous[row[0]] for row in (await session.execute(stmt)).all()]
+
+
+def _closed_at_value(model, status: str, closed_status: str):
+    """
+    closed_at после смены статуса на status (выражение для SET):
+    у уже закрытой записи момент закрытия сохраняется.
+    """
+    if status != closed_status:
+        return None
+    return case((model.status == closed_status, model.closed_at), else_=utcnow())
+
+
+# === Задачи ===
+
+_TASK_COLUMNS = (Task.id, Task.title, Task.time, Task.status, Task.created_at, Task.closed_at)
+
+
+async def _update_tasks(session: AsyncSession, user_id: int, where: list, values: dict) -> List[TaskRow]:
+    rows = await _update_returning_old(
+        session, Task, [Task.user_id == user_id, *where], values, _TASK_COLUMNS, ("status", "closed_at")
+    )
+    changed = [TaskRow(*row) for row in rows]
+    await tasks_changed(session, user_id, [
+        (row.old_status, row.status, row.created_at, row.closed_at or row.old_closed_at) for row in changed
+    ])
+    return changed
+
+
+async def _delete_tasks(session: AsyncSession, user_id: int, where: list) -> List[TaskRow]:
+    result = await session.execute(
+        delete(Task).where(Task.user_id == user_id, *where).returning(*_TASK_COLUMNS)
+    )
+    deleted = [
+        TaskRow(task_id, title, time_text, None, created_at, None, status, closed_at)
+        for task_id, title, time_text, status, created_at, closed_at in result.all()
+    ]
+    await tasks_changed(session, user_id, [
+        (row.old_status, None, row.created_at, row.old_closed_at) for row in deleted
+    ])
+    return deleted
+
+
+async def toggle_task(session: AsyncSession, user_id: int, task_id: int) -> Optional[TaskRow]:
+    """
+    Переключает статус задачи пользователя: Выполнена <-> Не выполнена.
+    Новое значение считает CASE по текущему статусу прямо в UPDATE.
+    None — задачи нет или она чужая.
+    """
+    done = Task.status == TASK_DONE
+    rows = await _update_tasks(session, user_id, [Task.id == task_id], {
+        "status": case((done, TASK_OPEN), else_=TASK_DONE),
+        "closed_at": case((done, null()), else_=utcnow()),
+    })
+    return rows[0] if rows else None
+
+
+async def delete_task(session: AsyncSession, user_id: int, task_id: int) -> Optional[TaskRow]:
+    """Удаляет задачу пользователя; None — задачи нет или она чужая."""
+    rows = await _delete_tasks(session, user_id, [Task.id == task_id])
+    return rows[0] if rows else None
+
+
+async def set_tasks_status(session: AsyncSession, user_id: int, task_ids: Iterable[int], status: str) -> List[TaskRow]:
+    """
+    Ставит статус задачам пользователя одним UPDATE.
+    Возвращает только изменённые (чужие и уже имеющие этот статус пропускаются).
+    """
+    return await _update_tasks(
+        session,
+        user_id,
+        [id_in(session, Task.id, task_ids), Task.status != status],
+        {"status": status, "closed_at": _closed_at_value(Task, status, TASK_DONE)},
+    )
+
+
+async def delete_tasks(session: AsyncSession, user_id: int, task_ids: Iterable[int]) -> List[TaskRow]:
+    """Удаляет задачи пользователя одним DELETE; возвращает удалённые (status=None)."""
+    return await _delete_tasks(session, user_id, [id_in(session, Task.id, task_ids)])
+
+
+# === Сделки ===
+
+_DEAL_COLUMNS = (Deal.id, Deal.title, Deal.amount, Deal.status, Deal.created_at, Deal.closed_at)
+
+
+async def _update_deals(session: AsyncSession, user_id: int, where: list, values: dict) -> List[DealRow]:
+    rows = await _update_returning_old(
+        session, Deal, [Deal.user_id == user_id, *where], values, _DEAL_COLUMNS, ("status", "closed_at")
+    )
+    changed = [DealRow(*row) for row in rows]
+    await deals_changed(session, user_id, [
+        (row.old_status, row.status, row.amount, row.created_at, row.closed_at or row.old_closed_at)
+        for row in changed
+    ])
+    return changed
+
+
+async def _delete_deals(session: AsyncSession, user_id: int, where: list) -> List[DealRow]:
+    result = await session.execute(
+        delete(Deal).where(Deal.user_id == user_id, *where).returning(*_DEAL_COLUMNS)
+    )
+    deleted = [
+        DealRow(deal_id, title, amount, None, created_at, None, status, closed_at)
+        for deal_id, title, amount, status, created_at, closed_at in result.all()
+    ]
+    await deals_changed(session, user_id, [
+        (row.old_status, None, row.amount, row.created_at, row.old_closed_at) for row in deleted
+    ])
+    return deleted
+
+
+async def set_deal_status(session: AsyncSession, user_id: int, deal_id: int, status: str) -> Optional[DealRow]:
+    """Ставит статус сделке пользователя; None — сделки нет или она чужая."""
+    rows = await _update_deals(session, user_id, [Deal.id == deal_id], {
+        "status": status, "closed_at": _closed_at_value(Deal, status, DEAL_CLOSED),
+    })
+    return rows[0] if rows else None
+
+
+async def delete_deal(session: AsyncSession, user_id: int, deal_id: int) -> Optional[DealRow]:
+    """Удаляет сделку пользователя; None — сделки нет или она чужая."""
+    rows = await _delete_deals(session, user_id, [Deal.id == deal_id])
+    return rows[0] if rows else None
+
+
+async def set_deals_status(session: AsyncSession, user_id: int, deal_ids: Iterable[int], status: str) -> List[DealRow]:
+    """Ставит статус сделкам пользователя одним UPDATE; возвращает изменённые."""
+    return await _update_deals(
+        session,
+        user_id,
+        [id_in(session, Deal.id, deal_ids), Deal.status != status],
+        {"status": status, "closed_at": _closed_at_value(Deal, status, DEAL_CLOSED)},
+    )
+
+
+async def delete_deals(session: AsyncSession, user_id: int, deal_ids: Iterable[int]) -> List[DealRow]:
+    """Удаляет сделки пользователя одним DELETE; возвращает удалённые (status=None)."""
+    return await _delete_deals(session, user_id, [id_in(session, Deal.id, deal_ids)])
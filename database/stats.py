@@ -0,0 +1,322 @@
+"""
+Инкрементальная статистика пользователей для /report: итоги за всё время
+(user_stats) и дневные счётчики (user_daily_stats).
+
+Хендлеры и database/repository.py вызывают task_status_changed /
+deal_status_changed (tasks_changed / deals_changed для пачки) в той же
+сессии, где меняют задачу или сделку, — счётчики коммитятся вместе с изменением.
+Добавление записи — переход из None, удаление — переход в None.
+Дневные счётчики отражают текущие записи: созданные — по дню created_at,
+выполненные/закрытые — по дню closed_at (удаление вычитает из тех же дней).
+
+Сверка обоих наборов счётчиков с исходными таблицами (дни — в BOT_TIMEZONE,
+недостающие строки user_daily_stats дописываются):
+    python -m database.stats            # показать расхождения
+    python -m database.stats rebuild    # показать и исправить
+"""
+
+import sys
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import insert_for
+from database.models import User, Task, Deal, UserDailyStats, UserStats, utcnow
+from services.due_time import local_day
+
+logger = logging.getLogger(__name__)
+
+TASK_DONE = "Выполнена"
+DEAL_CLOSED = "Закрыта"
+
+
+async def bump_user_stats(
+    session: AsyncSession,
+    user_id: int,
+    tasks_done: int = 0,
+    deals_closed: int = 0,
+    deals_closed_sum: int = 0,
+) -> None:
+    """
+    Прибавляет дельту к счётчикам пользователя одним UPSERT.
+    Коммит — на стороне вызывающего кода.
+    """
+    if not (tasks_done or deals_closed or deals_closed_sum):
+        return
+    stmt = insert_for(session)(UserStats).values(
+        user_id=user_id,
+        tasks_done=tasks_done,
+        deals_closed=deals_closed,
+        deals_closed_sum=deals_closed_sum,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={
+            "tasks_done": UserStats.tasks_done + stmt.excluded.tasks_done,
+            "deals_closed": UserStats.deals_closed + stmt.excluded.deals_closed,
+            "deals_closed_sum": UserStats.deals_closed_sum + stmt.excluded.deals_closed_sum,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def bump_daily_stats(session: AsyncSession, user_id: int, day: date, **deltas: int) -> None:
+    """
+    Прибавляет дельту к дневным счётчикам (user_id, day) одним UPSERT.
+    Коммит — на стороне вызывающего кода.
+    """
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas:
+        return
+    stmt = insert_for(session)(UserDailyStats).values(user_id=user_id, day=day, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserDailyStats.user_id, UserDailyStats.day],
+        set_={name: getattr(UserDailyStats, name) + getattr(stmt.excluded, name) for name in deltas},
+    )
+    await session.execute(stmt)
+
+
+async def _bump_days(
+    session: AsyncSession, user_id: int, changes: Iterable[Tuple[Optional[datetime], Dict[str, int]]]
+) -> None:
+    """Раскладывает дельты по дням их моментов времени (None — сегодня)."""
+    days: Dict[date, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for moment, deltas in changes:
+        day = local_day(moment or utcnow())
+        for name, value in deltas.items():
+            days[day][name] += value
+    for day, deltas in days.items():
+        await bump_daily_stats(session, user_id, day, **deltas)
+
+
+# (старый статус, новый статус, created_at, closed_at) — как в task_status_changed
+TaskChange = Tuple[Optional[str], Optional[str], Optional[datetime], Optional[datetime]]
+# (старый статус, новый статус, сумма, created_at, closed_at) — как в deal_status_changed
+DealChange = Tuple[Optional[str], Optional[str], int, Optional[datetime], Optional[datetime]]
+
+
+async def tasks_changed(session: AsyncSession, user_id: int, changes: Iterable[TaskChange]) -> None:
+    """
+    Учитывает пачку изменений задач пользователя: один UPSERT в user_stats
+    и по одному на каждый затронутый день.
+    """
+    done_total = 0
+    day_changes = []
+    for old_status, new_status, created_at, closed_at in changes:
+        delta = (new_status == TASK_DONE) - (old_status == TASK_DONE)
+        done_total += delta
+        day_changes.append((created_at, {"tasks_created": (new_status is not None) - (old_status is not None)}))
+        day_changes.append((closed_at, {"tasks_done": delta}))
+    await bump_user_stats(session, user_id, tasks_done=done_total)
+    await _bump_days(session, user_id, day_changes)
+
+
+async def deals_changed(session: AsyncSession, user_id: int, changes: Iterable[DealChange]) -> None:
+    """Пачка изменений сделок пользователя — как tasks_changed."""
+    closed_total = closed_sum = 0
+    day_changes = []
+    for old_status, new_status, amount, created_at, closed_at in changes:
+        delta = (new_status == DEAL_CLOSED) - (old_status == DEAL_CLOSED)
+        closed_total += delta
+        closed_sum += delta * amount
+        day_changes.append((created_at, {"deals_created": (new_status is not None) - (old_status is not None)}))
+        day_changes.append((closed_at, {"deals_closed": delta, "deals_closed_sum": delta * amount}))
+    await bump_user_stats(session, user_id, deals_closed=closed_total, deals_closed_sum=closed_sum)
+    await _bump_days(session, user_id, day_changes)
+
+
+async def task_status_changed(
+    session: AsyncSession,
+    user_id: int,
+    old_status: Optional[str],
+    new_status: Optional[str],
+    created_at: Optional[datetime] = None,
+    closed_at: Optional[datetime] = None,
+) -> None:
+    """
+    Учитывает смену статуса задачи (None — задачи не было / задача удалена).
+    created_at — когда задача создана, closed_at — момент выполнения,
+    который этот переход добавляет или снимает.
+    """
+    await tasks_changed(session, user_id, [(old_status, new_status, created_at, closed_at)])
+
+
+async def deal_status_changed(
+    session: AsyncSession,
+    user_id: int,
+    old_status: Optional[str],
+    new_status: Optional[str],
+    amount: int,
+    created_at: Optional[datetime] = None,
+    closed_at: Optional[datetime] = None,
+) -> None:
+    """
+    Учитывает смену статуса сделки (None — сделки не было / сделка удалена).
+    created_at и closed_at — как в task_status_changed.
+    """
+    await deals_changed(session, user_id, [(old_status, new_status, amount, created_at, closed_at)])
+
+
+def _actual_stats_query():
+    """
+    Эталонные значения счётчиков, посчитанные по tasks и deals,
+    рядом с тем, что сейчас лежит в user_stats.
+    """
+    tasks_q = (
+        select(Task.user_id, func.count().label("done"))
+        .where(Task.status == TASK_DONE)
+        .group_by(Task.user_id)
+        .subquery()
+    )
+    deals_q = (
+        select(Deal.user_id, func.count().label("closed"), func.sum(Deal.amount).label("total"))
+        .where(Deal.status == DEAL_CLOSED)
+        .group_by(Deal.user_id)
+        .subquery()
+    )
+    return (
+        select(
+            User.id,
+            func.coalesce(tasks_q.c.done, 0),
+            func.coalesce(deals_q.c.closed, 0),
+            func.coalesce(deals_q.c.total, 0),
+            UserStats.tasks_done,
+            UserStats.deals_closed,
+            UserStats.deals_closed_sum,
+        )
+        .outerjoin(tasks_q, tasks_q.c.user_id == User.id)
+        .outerjoin(deals_q, deals_q.c.user_id == User.id)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+    )
+
+
+async def _user_stats_fixes(session: AsyncSession) -> list:
+    """Строки user_stats, расходящиеся с tasks/deals, — с эталонными значениями."""
+    result = await session.stream(_actual_stats_query().execution_options(yield_per=1000))
+    fixes = []
+    async for user_id, done, closed, total, s_done, s_closed, s_total in result:
+        actual = (done, closed, total)
+        stored = (s_done or 0, s_closed or 0, s_total or 0)
+        if actual == stored:
+            continue
+        logger.warning("Расхождение user_stats для user_id=%s: в таблице %s, по факту %s", user_id, stored, actual)
+        fixes.append(
+            {"user_id": user_id, "tasks_done": done, "deals_closed": closed, "deals_closed_sum": total}
+        )
+    return fixes
+
+
+DAILY_COUNTERS = ("tasks_created", "tasks_done", "deals_created", "deals_closed", "deals_closed_sum")
+
+
+async def _actual_daily_stats(session: AsyncSession) -> Dict[Tuple[int, date], list]:
+    """
+    Эталонные дневные счётчики по tasks и deals: (user_id, день) -> значения
+    в порядке DAILY_COUNTERS. День считается через local_day, как при
+    инкрементальном обновлении, — одинаково на всех диалектах.
+    """
+    actual: Dict[Tuple[int, date], list] = defaultdict(lambda: [0] * len(DAILY_COUNTERS))
+    tasks = await session.stream(
+        select(Task.user_id, Task.status, Task.created_at, Task.closed_at).execution_options(yield_per=1000)
+    )
+    async for user_id, status, created_at, closed_at in tasks:
+        actual[user_id, local_day(created_at)][0] += 1
+        if status == TASK_DONE:
+            actual[user_id, local_day(closed_at or created_at)][1] += 1
+    deals = await session.stream(
+        select(Deal.user_id, Deal.status, Deal.amount, Deal.created_at, Deal.closed_at).execution_options(yield_per=1000)
+    )
+    async for user_id, status, amount, created_at, closed_at in deals:
+        actual[user_id, local_day(created_at)][2] += 1
+        if status == DEAL_CLOSED:
+            day = actual[user_id, local_day(closed_at or created_at)]
+            day[3] += 1
+            day[4] += amount
+    return actual
+
+
+async def _daily_stats_fixes(session: AsyncSession) -> list:
+    """Строки user_daily_stats, расходящиеся с tasks/deals (и недостающие), — с эталонными значениями."""
+    actual = await _actual_daily_stats(session)
+    result = await session.stream(
+        select(UserDailyStats.user_id, UserDailyStats.day, *(getattr(UserDailyStats, name) for name in DAILY_COUNTERS))
+        .execution_options(yield_per=1000)
+    )
+    fixes = []
+    async for user_id, day, *values in result:
+        stored = [value or 0 for value in values]
+        expected = actual.pop((user_id, day), [0] * len(DAILY_COUNTERS))
+        if stored != expected:
+            logger.warning(
+                "Расхождение user_daily_stats для user_id=%s за %s: в таблице %s, по факту %s",
+                user_id, day, tuple(stored), tuple(expected),
+            )
+            fixes.append({"user_id": user_id, "day": day, **dict(zip(DAILY_COUNTERS, expected))})
+    for (user_id, day), expected in actual.items():
+        logger.warning("Нет строки user_daily_stats для user_id=%s за %s: по факту %s", user_id, day, tuple(expected))
+        fixes.append({"user_id": user_id, "day": day, **dict(zip(DAILY_COUNTERS, expected))})
+    return fixes
+
+
+async def reconcile(session: AsyncSession, fix: bool = False) -> int:
+    """
+    Сверяет user_stats и user_daily_stats с исходными таблицами и возвращает
+    число расходящихся строк. При fix=True перезаписывает их эталонными
+    значениями. Запускать лучше в тихие часы: изменения, пришедшие во время
+    сверки, могут быть перезаписаны.
+    """
+    fixes = await _user_stats_fixes(session)
+    daily_fixes = await _daily_stats_fixes(session)
+
+    if fix and (fixes or daily_fixes):
+        stmt = insert_for(session)(UserStats)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_={
+                "tasks_done": stmt.excluded.tasks_done,
+                "deals_closed": stmt.excluded.deals_closed,
+                "deals_closed_sum": stmt.excluded.deals_closed_sum,
+            },
+        )
+        daily_stmt = insert_for(session)(UserDailyStats)
+        daily_stmt = daily_stmt.on_conflict_do_update(
+            index_elements=[UserDailyStats.user_id, UserDailyStats.day],
+            set_={name: getattr(daily_stmt.excluded, name) for name in DAILY_COUNTERS},
+        )
+        for statement, rows in ((stmt, fixes), (daily_stmt, daily_fixes)):
+            for start in range(0, len(rows), 1000):
+                await session.execute(statement, rows[start:start + 1000])
+        await session.commit()
+    return len(fixes) + len(daily_fixes)
+
+
+async def main(argv) -> None:
+    from database.db import async_session, engine
+
+    command = argv[0] if argv else "check"
+    if command not in ("check", "rebuild"):
+        print(__doc__)
+        sys.exit(2)
+    try:
+        async with async_session() as session:
+            drift = await reconcile(session, fix=command == "rebuild")
+    finally:
+        await engine.dispose()
+
+    if not drift:
+        print("user_stats и user_daily_stats совпадают с tasks/deals ✅")
+    elif command == "rebuild":
+        print(f"Исправлено расхождений: {drift}")
+    else:
+        print(f"Найдено расхождений: {drift}. Исправить: python -m database.stats rebuild")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    asyncio.run(main(sys.argv[1:]))
@@ -1,80 +1,93 @@
 import logging
-from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from html import escape
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from aiogram import F
+from aiogram.filters import Command, StateFilter
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from config import LIST_PAGE_SIZE
 from keyboards.reply import BTN_ADD_DEAL, BTN_VIEW_DEALS
+from keyboards.callbacks import (
+    DealDelete, DealNewStatus, DealSet, DealStatusChange, DealsBulk, DealsPage, DealsPick, DealsSelect
+)
+from keyboards.inline import page_nav_buttons, select_cancel_button, select_mode_button
 from states.deal_states import DealAddState
-from sqlalchemy import select, delete
+from sqlalchemy import select
 from database.db import async_session
-from database.models import User, Base
-from sqlalchemy import String, Integer, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column
+from database.models import Deal, utcnow
+from database.stats import DEAL_CLOSED, deal_status_changed
+from database.pagination import PAGE_NEXT, decode_cursor, encode_cursor, fetch_page, status_rank
+from database import repository
+from database.repository import DealRow
+from services.list_cache import (
+    LIST_DEALS,
+    RenderedList,
+    edit_list_markup,
+    edit_list_message,
+    foreign_list,
+    list_cache,
+)
+from services.routing import IndexedRouter
+from services.send_queue import PRIORITY_LOW, send_priority
 
-router = Router()
+router = IndexedRouter(name="deals")
 logger = logging.getLogger(__name__)
 
-# === Таблица сделок ===
-class Deal(Base):
-    """
-    Таблица сделок пользователя.
-    """
-    __tablename__ = "deals"
-
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    title: Mapped[str] = mapped_column(String(255))
-    amount: Mapped[int] = mapped_column(Integer)
-    status: Mapped[str] = mapped_column(String(50), default="Открыта")
+DEALS_HEADER = "💼 <b>Ваши сделки:</b>"
+DEAL_STATUSES = ["Открыта", "В процессе", "Закрыта"]
 
 # === Добавление сделки ===
 
 @router.message(Command("add_deal"))
-@router.message(F.text == BTN_ADD_DEAL)
+@router.button(BTN_ADD_DEAL)
 async def add_deal_start(message: Message, state: FSMContext):
     await state.set_state(DealAddState.waiting_for_title)
     await message.answer("Введите название сделки (например: Сделка с ООО Ромашка):")
 
 
-@router.message(DealAddState.waiting_for_title, F.text.len() > 0)
+@router.message(StateFilter(DealAddState.waiting_for_title), F.text.len() > 0)
 async def add_deal_get_amount(message: Message, state: FSMContext):
     await state.update_data(title=message.text.strip())
     await state.set_state(DealAddState.waiting_for_amount)
     await message.answer("Введите сумму сделки (например: 85000):")
 
 
-@router.message(DealAddState.waiting_for_amount, F.text.regexp(r"^\d+$"))
+@router.message(StateFilter(DealAddState.waiting_for_amount), F.text.regexp(r"^\d+$"))
 async def add_deal_choose_status(message: Message, state: FSMContext):
-    from aiogram.utils.keyboard import InlineKeyboardBuilder
     await state.update_data(amount=int(message.text.strip()))
     builder = InlineKeyboardBuilder()
-    for status in ["Открыта", "В процессе", "Закрыта"]:
-        builder.button(text=status, callback_data=f"deal_status:{status}")
+    for status in DEAL_STATUSES:
+        builder.button(text=status, callback_data=DealNewStatus(status=status))
     builder.adjust(1)
     await state.set_state(DealAddState.waiting_for_status)
     await message.answer("Выберите статус сделки:", reply_markup=builder.as_markup())
 
 
-@router.callback_query(F.data.startswith("deal_status:"))
-async def add_deal_save(callback: CallbackQuery, state: FSMContext):
-    status = callback.data.split(":")[1]
+@router.callback(DealNewStatus)
+async def add_deal_save(
+    callback: CallbackQuery, callback_data: DealNewStatus, state: FSMContext, user_id: int
+):
+    status = callback_data.status
     data = await state.get_data()
     title = data.get("title")
     amount = data.get("amount")
     tg_user = callback.from_user
 
     async with async_session() as session:
-        result = await session.execute(select(User).where(User.tg_id == tg_user.id))
-        user = result.scalar_one_or_none()
-        if user is None:
-            user = User(tg_id=tg_user.id, username=tg_user.username or "")
-            session.add(user)
-            await session.flush()
-
-        deal = Deal(user_id=user.id, title=title, amount=amount, status=status)
+        created_at = utcnow()
+        deal = Deal(
+            user_id=user_id,
+            title=title,
+            amount=amount,
+            status=status,
+            created_at=created_at,
+            closed_at=created_at if status == DEAL_CLOSED else None,
+        )
         session.add(deal)
+        await deal_status_changed(session, user_id, None, status, amount, created_at, deal.closed_at)
         await session.commit()
 
     await state.clear()
@@ -90,89 +103,325 @@ async def cancel_deal(message: Message, state: FSMContext):
     await state.clear()
     await message.answer("Отменено. Возврат в главное меню.")
 
-# --- NEW CODE START: просмотр и сортировка сделок ---
+# --- NEW CODE START: просмотр сделок (сортировка и пагинация в БД) ---
 
-@router.message(F.text == BTN_VIEW_DEALS)
-@router.message(Command("view_deals"))
-async def view_deals(message: Message):
+async def load_deals_page(user_id: int, cursor=None, direction: str = PAGE_NEXT):
     """
-    Показывает список сделок с inline-кнопками:
-    🔄 Изменить статус | 🗑 Удалить
+    Читает одну страницу сделок пользователя.
+    Сначала "Открыта" и "В процессе", затем "Закрыта".
     """
-    tg_user = message.from_user
+    rank = status_rank(Deal.status, "Закрыта")
+    stmt = select(Deal, rank).where(Deal.user_id == user_id)
     async with async_session() as session:
-        result = await session.execute(
-            select(Deal).join(User).where(User.tg_id == tg_user.id)
+        return await fetch_page(
+            session, stmt, rank, Deal.id, cursor, direction, LIST_PAGE_SIZE
         )
-        deals = result.scalars().all()
 
-    if not deals:
-        await message.answer("У вас пока нет сделок.")
+
+def deal_line(deal: Deal) -> str:
+    """Строка сделки в списке."""
+    return f"• <b>{escape(deal.title)}</b> — {deal.amount} ₽ [{deal.status}]"
+
+
+def deal_buttons(deal_id: int) -> List[InlineKeyboardButton]:
+    """Кнопки строки сделки: 🔄 изменить статус | 🗑 удалить."""
+    return [
+        InlineKeyboardButton(text=f"🔄 {deal_id}", callback_data=DealStatusChange(deal_id=deal_id).pack()),
+        InlineKeyboardButton(text=f"🗑 {deal_id}", callback_data=DealDelete(deal_id=deal_id).pack()),
+    ]
+
+
+def deal_status_buttons(deal_id: int) -> List[InlineKeyboardButton]:
+    """Выбор нового статуса — встаёт в список на место кнопок сделки."""
+    return [
+        InlineKeyboardButton(text=status, callback_data=DealSet(deal_id=deal_id, status=status).pack())
+        for status in DEAL_STATUSES
+    ]
+
+
+def render_deals_page(user_id: int, rows, has_prev: bool, has_next: bool) -> RenderedList:
+    """
+    Собирает строки и inline-клавиатуру страницы сделок
+    (результат кэшируется для правок на месте, см. services/list_cache.py).
+    """
+    items = OrderedDict((deal.id, (deal_line(deal), deal_buttons(deal.id))) for deal, _ in rows)
+    (first, first_rank), (last, last_rank) = rows[0], rows[-1]
+    nav = page_nav_buttons(
+        DealsPage,
+        encode_cursor(first_rank, first.id),
+        encode_cursor(last_rank, last.id),
+        has_prev,
+        has_next,
+    )
+    nav.append(select_mode_button(DealsSelect))
+    return RenderedList(LIST_DEALS, user_id, DEALS_HEADER, items, nav)
+
+
+async def show_first_deals_page(message: Message, user_id: int) -> None:
+    """Перерисовывает сообщение message первой страницей сделок (списка нет в кэше)."""
+    rows, has_prev, has_next = await load_deals_page(user_id)
+    if not rows:
+        list_cache.pop(message.chat.id, message.message_id)
+        await message.edit_text("У вас пока нет сделок.")
         return
+    await edit_list_message(message, render_deals_page(user_id, rows, has_prev, has_next))
 
-    # --- NEW CODE START: сортировка по статусу ---
-    # Сначала "Открыта" и "В процессе", затем "Закрыта"
-    def sort_key(deal):
-        if deal.status == "Закрыта":
-            return 1
-        return 0
-    deals.sort(key=sort_key)
-    # --- NEW CODE END ---
 
-    text = "💼 <b>Ваши сделки:</b>\n\n"
-    builder = InlineKeyboardBuilder()
+@router.button(BTN_VIEW_DEALS)
+@router.message(Command("view_deals"))
+async def view_deals(message: Message, user_id: int):
+    """
+    Показывает первую страницу списка сделок с inline-кнопками:
+    🔄 Изменить статус | 🗑 Удалить
+    """
+    rows, has_prev, has_next = await load_deals_page(user_id)
+
+    if not rows:
+        await message.answer("У вас пока нет сделок.")
+        return
 
-    for deal in deals:
-        text += f"• <b>{deal.title}</b> — {deal.amount} ₽ [{deal.status}]\n"
-        builder.button(text=f"🔄 {deal.id}", callback_data=f"deal_status_change:{deal.id}")
-        builder.button(text=f"🗑 {deal.id}", callback_data=f"deal_del:{deal.id}")
+    rendered = render_deals_page(user_id, rows, has_prev, has_next)
+    # Список — самое тяжёлое сообщение бота, пропускаем вперёд короткие ответы
+    with send_priority(PRIORITY_LOW):
+        sent = await message.answer(rendered.text(), reply_markup=rendered.markup(), parse_mode="HTML")
+    list_cache.set(sent.chat.id, sent.message_id, rendered)
 
-    builder.adjust(2)
-    await message.answer(text, reply_markup=builder.as_markup(), parse_mode="HTML")
+
+@router.callback(DealsPage)
+async def page_deals(callback: CallbackQuery, callback_data: DealsPage, user_id: int):
+    """
+    Листает список сделок ◀ / ▶ — редактирует то же сообщение.
+    """
+    message = callback.message
+    if await foreign_list(callback, list_cache.get(message.chat.id, message.message_id, LIST_DEALS), user_id):
+        return
+    rows, has_prev, has_next = await load_deals_page(
+        user_id, decode_cursor(callback_data.cursor), callback_data.direction
+    )
+    if rows:
+        await edit_list_message(message, render_deals_page(user_id, rows, has_prev, has_next))
+    else:
+        # Страница опустела (сделки удалили) — возвращаемся к началу списка
+        await show_first_deals_page(message, user_id)
+    await callback.answer()
 
 # --- NEW CODE END ---
 
 
-@router.callback_query(F.data.startswith("deal_status_change:"))
-async def change_deal_status(callback: CallbackQuery):
+@router.callback(DealStatusChange)
+async def change_deal_status(callback: CallbackQuery, callback_data: DealStatusChange, user_id: int):
     """
-    Предлагает выбрать новый статус для сделки.
+    Предлагает выбрать новый статус для сделки: кнопки статусов встают
+    в список на место кнопок сделки. Если списка нет в кэше — отдельным сообщением.
     """
-    deal_id = int(callback.data.split(":")[1])
+    deal_id = callback_data.deal_id
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_DEALS)
+    if await foreign_list(callback, rendered, user_id):
+        return
+    if rendered is not None and deal_id in rendered.items:
+        rendered.overrides[deal_id] = deal_status_buttons(deal_id)
+        await message.edit_reply_markup(reply_markup=rendered.markup())
+        await callback.answer("Выберите новый статус")
+        return
+
     builder = InlineKeyboardBuilder()
-    for status in ["Открыта", "В процессе", "Закрыта"]:
-        builder.button(text=status, callback_data=f"deal_set:{deal_id}:{status}")
-    builder.adjust(1)
-    await callback.message.answer("Выберите новый статус:", reply_markup=builder.as_markup())
+    for button in deal_status_buttons(deal_id):
+        builder.row(button)
+    await message.answer("Выберите новый статус:", reply_markup=builder.as_markup())
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("deal_set:"))
-async def set_deal_status(callback: CallbackQuery):
+async def update_deal_status(user_id: int, deal_id: int, new_status: str) -> Optional[DealRow]:
     """
-    Сохраняет новый статус сделки.
+    Сохраняет новый статус сделки пользователя.
+    Возвращает сделку или None, если сделки нет (или она чужая).
     """
-    _, deal_id, new_status = callback.data.split(":")
-    deal_id = int(deal_id)
     async with async_session() as session:
-        result = await session.execute(select(Deal).where(Deal.id == deal_id))
-        deal = result.scalar_one_or_none()
-        if deal:
-            deal.status = new_status
-            await session.commit()
-            await callback.answer(f"Статус изменён на «{new_status}» ✅")
-        else:
-            await callback.answer("Сделка не найдена ❌", show_alert=True)
+        deal = await repository.set_deal_status(session, user_id, deal_id, new_status)
+        await session.commit()
+    return deal
+
+
+async def update_deals_message(
+    message: Message, user_id: int, rendered: Optional[RenderedList], changes: Dict[int, Optional[DealRow]]
+) -> None:
+    """
+    Правит список сделок в сообщении после изменения сделок:
+    перерисовываются только их строки (None — строка удаляется).
+    rendered — список этого сообщения из кэша (None — перечитать первую страницу).
+    """
+    for deal_id in changes:
+        list_cache.invalidate_item(message.chat.id, LIST_DEALS, deal_id, keep=message.message_id)
+    if rendered is None:
+        await show_first_deals_page(message, user_id)
+        return
+    for deal_id, deal in changes.items():
+        if deal is None:
+            rendered.remove(deal_id)
+        elif deal_id in rendered.items:
+            rendered.replace(deal_id, deal_line(deal), deal_buttons(deal_id))
+    if not rendered.items:
+        # На странице не осталось сделок — показываем начало списка
+        await show_first_deals_page(message, user_id)
+        return
+    await edit_list_message(message, rendered)
 
 
-@router.callback_query(F.data.startswith("deal_del:"))
-async def delete_deal(callback: CallbackQuery):
+@router.callback(DealSet)
+async def set_deal_status(callback: CallbackQuery, callback_data: DealSet, user_id: int):
     """
-    Удаляет сделку из базы данных.
+    Сохраняет новый статус сделки и обновляет её строку в списке.
     """
-    deal_id = int(callback.data.split(":")[1])
+    deal_id, new_status = callback_data.deal_id, callback_data.status
+    if new_status not in DEAL_STATUSES:
+        await callback.answer("Неизвестный статус ❌", show_alert=True)
+        return
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_DEALS)
+    if await foreign_list(callback, rendered, user_id):
+        return
+    deal = await update_deal_status(user_id, deal_id, new_status)
+    if deal is None:
+        await callback.answer("Сделка не найдена ❌", show_alert=True)
+        return
+    await callback.answer(f"Статус изменён на «{new_status}» ✅")
+    await update_deals_message(message, user_id, rendered, {deal_id: deal})
+
+
+@router.callback(DealDelete)
+async def delete_deal(callback: CallbackQuery, callback_data: DealDelete, user_id: int):
+    """
+    Удаляет сделку из базы данных и убирает её строку из списка.
+    """
+    deal_id = callback_data.deal_id
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_DEALS)
+    if await foreign_list(callback, rendered, user_id):
+        return
     async with async_session() as session:
-        await session.execute(delete(Deal).where(Deal.id == deal_id))
+        deleted = await repository.delete_deal(session, user_id, deal_id)
         await session.commit()
+    if deleted is None:
+        await callback.answer("Сделка не найдена ❌", show_alert=True)
+        return
     await callback.answer("Сделка удалена 🗑")
-    await callback.message.edit_text("Сделка удалена. Обновите список 📊")
+    await update_deals_message(message, user_id, rendered, {deal_id: None})
+
+
+# === Режим выбора: массовые действия над сделками страницы ===
+# Устроен как у задач (handlers/tasks.py): выбор в данных FSM,
+# применение — один UPDATE/DELETE и одна перерисовка списка.
+
+def deals_selection_footer(count: int) -> List[List[InlineKeyboardButton]]:
+    """Кнопки действий над выбранными сделками: статусы, удаление, отмена."""
+    return [
+        [
+            InlineKeyboardButton(text=status, callback_data=DealsBulk(action="set", status=status).pack())
+            for status in DEAL_STATUSES
+        ],
+        [
+            InlineKeyboardButton(text=f"🗑 Удалить ({count})", callback_data=DealsBulk(action="del").pack()),
+            select_cancel_button(DealsSelect),
+        ],
+    ]
+
+
+async def selected_deal_ids(state: FSMContext, message: Message) -> List[int]:
+    """Выбранные сделки этого сообщения (выбор в другом списке не считается)."""
+    selection = (await state.get_data()).get("selection")
+    if not selection or selection["kind"] != LIST_DEALS or selection["message_id"] != message.message_id:
+        return []
+    return selection["ids"]
+
+
+async def show_deals_selection(message: Message, state: FSMContext, rendered: RenderedList, ids: List[int]) -> None:
+    await state.update_data(selection={"kind": LIST_DEALS, "message_id": message.message_id, "ids": ids})
+    rendered.show_selection(
+        ids, lambda deal_id: DealsPick(deal_id=deal_id).pack(), deals_selection_footer(len(ids))
+    )
+    await edit_list_markup(message, rendered)
+
+
+@router.callback(DealsSelect)
+async def deals_selection_mode(
+    callback: CallbackQuery, callback_data: DealsSelect, state: FSMContext, user_id: int
+):
+    """Включает (on) или выключает (off) режим выбора сделок в списке."""
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_DEALS)
+    if await foreign_list(callback, rendered, user_id):
+        return
+    if rendered is None:
+        await state.update_data(selection=None)
+        await show_first_deals_page(message, user_id)
+        await callback.answer("Список обновлён")
+        return
+    if callback_data.mode == "on":
+        await show_deals_selection(message, state, rendered, [])
+        await callback.answer("Отметьте сделки")
+    else:
+        await state.update_data(selection=None)
+        rendered.clear_selection()
+        await edit_list_markup(message, rendered)
+        await callback.answer()
+
+
+@router.callback(DealsPick)
+async def deals_pick(callback: CallbackQuery, callback_data: DealsPick, state: FSMContext, user_id: int):
+    """Отмечает сделку флажком или снимает отметку — меняется только клавиатура."""
+    deal_id = callback_data.deal_id
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_DEALS)
+    if await foreign_list(callback, rendered, user_id):
+        return
+    if rendered is None:
+        await state.update_data(selection=None)
+        await show_first_deals_page(message, user_id)
+        await callback.answer("Список обновлён, выберите сделки заново")
+        return
+    ids = await selected_deal_ids(state, message)
+    ids = [i for i in ids if i != deal_id] if deal_id in ids else ids + [deal_id]
+    await show_deals_selection(message, state, rendered, ids)
+    await callback.answer()
+
+
+@router.callback(DealsBulk)
+async def deals_bulk_apply(
+    callback: CallbackQuery, callback_data: DealsBulk, state: FSMContext, user_id: int
+):
+    """
+    Применяет действие ко всем выбранным сделкам одним запросом
+    и перерисовывает список один раз.
+    """
+    action, new_status = callback_data.action, callback_data.status
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_DEALS)
+    if await foreign_list(callback, rendered, user_id):
+        return
+    ids = await selected_deal_ids(state, message)
+    if not ids:
+        await callback.answer("Сначала отметьте сделки", show_alert=True)
+        return
+    if action == "set" and new_status not in DEAL_STATUSES:
+        await callback.answer("Неизвестный статус ❌", show_alert=True)
+        return
+
+    async with async_session() as session:
+        if action == "del":
+            rows: List[DealRow] = await repository.delete_deals(session, user_id, ids)
+        else:
+            rows = await repository.set_deals_status(session, user_id, ids, new_status)
+        await session.commit()
+
+    await state.update_data(selection=None)
+    if rendered is not None:
+        rendered.clear_selection()
+    if action == "del":
+        await callback.answer(f"Удалено сделок: {len(rows)} 🗑")
+    else:
+        await callback.answer(f"Статус «{new_status}»: {len(rows)} ✅")
+    await update_deals_message(
+        message, user_id, rendered, {row.id: (row if row.status is not None else None) for row in rows}
+    )
+    logger.info("Bulk %s for user %s: %s of %s deals", action, callback.from_user.id, len(rows), len(ids))
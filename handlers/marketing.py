@@ -1,18 +1,19 @@
 # --- NEW FILE: handlers/marketing.py ---
 
 import logging
-from aiogram import Router, F
-from aiogram.filters import Command
+from aiogram.filters import Command, StateFilter
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from states.marketing_states import MarketingState
-from services.chatgpt import get_marketing_advice
+from services.chatgpt import stream_marketing_advice
+from services.streaming import stream_to_message
 from keyboards.reply import BTN_GET_MARKETING
+from services.routing import IndexedRouter
 
-router = Router()
+router = IndexedRouter(name="marketing")
 logger = logging.getLogger(__name__)
 
-@router.message(F.text == BTN_GET_MARKETING)
+@router.button(BTN_GET_MARKETING)
 @router.message(Command("marketing"))
 async def ask_marketing_question(message: Message, state: FSMContext):
     """
@@ -21,13 +22,17 @@ async def ask_marketing_question(message: Message, state: FSMContext):
     await state.set_state(MarketingState.waiting_for_problem)
     await message.answer("Опиши кратко маркетинговую задачу или проблему, например:\n«Как увеличить продажи летом?»")
 
-@router.message(MarketingState.waiting_for_problem)
+@router.message(StateFilter(MarketingState.waiting_for_problem))
 async def send_marketing_advice(message: Message, state: FSMContext):
     """
-    Получает запрос пользователя, отправляет его в ChatGPT и возвращает совет.
+    Получает запрос пользователя, отправляет его в ChatGPT и показывает совет
+    по мере генерации — одно сообщение редактируется с ограничением частоты.
     """
     problem = message.text.strip()
-    await message.answer("⏳ Думаю над советом...")
-    advice = await get_marketing_advice(problem)
     await state.clear()
-    await message.answer(f"💡 Совет по маркетингу:\n\n{advice}")
+    await stream_to_message(
+        message,
+        stream_marketing_advice(problem, message.from_user.id),
+        header="💡 Совет по маркетингу:\n\n",
+        placeholder="⏳ Думаю над советом...",
+    )
@@ -1,21 +1,21 @@
 # --- NEW FILE: handlers/motivation.py ---
 
 import logging
-from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message
-from services.chatgpt import get_motivation_phrase
+from services.motivation_pool import motivation_pool
 from keyboards.reply import BTN_GET_MOTIVATION
+from services.routing import IndexedRouter
 
-router = Router()
+router = IndexedRouter(name="motivation")
 logger = logging.getLogger(__name__)
 
-@router.message(F.text == BTN_GET_MOTIVATION)
+@router.button(BTN_GET_MOTIVATION)
 @router.message(Command("motivation"))
 async def send_motivation(message: Message):
     """
-    Генерирует и отправляет мотивационную фразу через ChatGPT.
+    Отправляет мотивационную фразу из заранее сгенерированного пула.
+    Пул пополняется в фоне, поэтому ответ приходит сразу.
     """
-    await message.answer("💭 Думаю над мотивацией...")
-    phrase = await get_motivation_phrase()
+    phrase = await motivation_pool.get(message.from_user.id)
     await message.answer(f"⚡️ {phrase}")
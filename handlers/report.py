@@ -1,50 +1,168 @@
 # --- NEW FILE: handlers/report.py ---
 
+import re
 import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
 from aiogram import Router
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
-from sqlalchemy import select, func
+from sqlalchemy import case, func, select
+
+from config import REPORT_MAX_DAYS
 from database.db import async_session
-from database.models import User, Task
-from handlers.deals import Deal  # используем ту же модель
-from datetime import datetime
+from database.models import UserDailyStats, UserStats
+from services.due_time import TZ
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Периоды отчёта: последние N дней, включая сегодняшний
+PERIODS = {"day": 1, "week": 7, "month": 30}
+PERIOD_ALIASES = {"сегодня": "day", "день": "day", "неделя": "week", "месяц": "month"}
+DAILY_FIELDS = ("tasks_created", "tasks_done", "deals_created", "deals_closed", "deals_closed_sum")
+
+_DATE_RE = re.compile(r"(\d{1,2})\.(\d{1,2})(?:\.(\d{4}|\d{2}))?")
+
+REPORT_USAGE = (
+    "Отчёт за период:\n"
+    "/report day — сегодня\n"
+    "/report week — 7 дней\n"
+    "/report month — 30 дней\n"
+    "/report custom 01.10.2026 15.10.2026 — свои даты"
+)
+
+
+def parse_period(args: str, today: date) -> Tuple[date, date]:
+    """
+    Период отчёта (первый и последний день) по аргументам команды.
+    Бросает ValueError с текстом для пользователя.
+    """
+    words = args.lower().split()
+    name = PERIOD_ALIASES.get(words[0], words[0]) if words else ""
+    if name in PERIODS:
+        return today - timedelta(days=PERIODS[name] - 1), today
+
+    if name not in ("custom", "период"):
+        raise ValueError(REPORT_USAGE)
+    dates = []
+    for match in _DATE_RE.finditer(args):
+        year = match.group(3)
+        try:
+            dates.append(date(
+                (2000 + int(year) if len(year) == 2 else int(year)) if year else today.year,
+                int(match.group(2)),
+                int(match.group(1)),
+            ))
+        except ValueError:
+            raise ValueError(f"Некорректная дата: {match.group(0)}")
+    if len(dates) != 2:
+        raise ValueError(REPORT_USAGE)
+    start, end = sorted(dates)
+    if (end - start).days + 1 > REPORT_MAX_DAYS:
+        raise ValueError(f"Период длиннее {REPORT_MAX_DAYS} дней — выберите покороче.")
+    return start, end
+
+
+async def load_period_stats(user_id: int, start: date, end: date) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Счётчики за период [start, end] и за такой же период перед ним.
+    Один запрос по первичному ключу user_daily_stats: не больше
+    2 × (длина периода) строк, без чтения tasks и deals.
+    """
+    previous_start = start - (end - start + timedelta(days=1))
+    current_columns = [
+        func.coalesce(func.sum(case((UserDailyStats.day >= start, getattr(UserDailyStats, name)), else_=0)), 0)
+        for name in DAILY_FIELDS
+    ]
+    previous_columns = [
+        func.coalesce(func.sum(case((UserDailyStats.day < start, getattr(UserDailyStats, name)), else_=0)), 0)
+        for name in DAILY_FIELDS
+    ]
+    stmt = select(*current_columns, *previous_columns).where(
+        UserDailyStats.user_id == user_id,
+        UserDailyStats.day >= previous_start,
+        UserDailyStats.day <= end,
+    )
+    async with async_session() as session:
+        row = (await session.execute(stmt)).one()
+    values = [int(value) for value in row]
+    return dict(zip(DAILY_FIELDS, values)), dict(zip(DAILY_FIELDS, values[len(DAILY_FIELDS):]))
+
+
+def format_delta(current: int, previous: int) -> str:
+    """Изменение к прошлому периоду: ▲ +3, +50% / ▼ -2 / =."""
+    diff = current - previous
+    if diff == 0:
+        return "="
+    arrow = "▲" if diff > 0 else "▼"
+    if previous:
+        return f"{arrow} {diff:+d}, {diff / previous:+.0%}"
+    return f"{arrow} {diff:+d}"
+
+
+def period_title(start: date, end: date, args: str) -> str:
+    if start == end:
+        return f"за {end:%d.%m.%Y}"
+    days = (end - start).days + 1
+    span = f"{start:%d.%m}–{end:%d.%m.%Y}"
+    return f"за {days} дн. ({span})" if args.split()[0].lower() not in ("custom", "период") else f"за {span}"
+
+
+async def send_period_report(message: Message, user_id: int, args: str) -> None:
+    """Отчёт за период с изменением к предыдущему периоду той же длины."""
+    today = datetime.now(TZ).date()
+    try:
+        start, end = parse_period(args, today)
+    except ValueError as e:
+        await message.answer(str(e))
+        return
+
+    current, previous = await load_period_stats(user_id, start, end)
+    lines = [f"📊 <b>Отчёт {period_title(start, end, args)}</b>", ""]
+    for icon, label, name, unit in (
+        ("➕", "Создано задач", "tasks_created", ""),
+        ("✅", "Завершено задач", "tasks_done", ""),
+        ("➕", "Создано сделок", "deals_created", ""),
+        ("💼", "Закрыто сделок", "deals_closed", ""),
+        ("💰", "Сумма закрытых", "deals_closed_sum", " ₽"),
+    ):
+        lines.append(f"{icon} {label}: {current[name]}{unit} ({format_delta(current[name], previous[name])})")
+    lines += ["", "<i>В скобках — изменение к предыдущему периоду той же длины.</i>"]
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
 @router.message(Command("report"))
-async def send_report(message: Message):
+async def send_report(message: Message, user_id: int, command: Optional[CommandObject] = None):
     """
-    Отчёт за текущую сессию:
+    Без аргументов — итоги за всё время:
     - количество завершённых задач;
     - количество закрытых сделок и их общая сумма.
+    /report day|week|month|custom — отчёт за период по дневным счётчикам.
     """
     tg_user = message.from_user
 
+    if command is not None and command.args:
+        await send_period_report(message, user_id, command.args)
+        logger.info("Отчёт за период отправлен пользователю %s", tg_user.id)
+        return
+
+    # Счётчики поддерживаются инкрементально (database/stats.py) —
+    # отчёт читается одной строкой по первичному ключу
     async with async_session() as session:
-        # 1️⃣ Завершённые задачи
-        result_tasks = await session.execute(
-            select(func.count(Task.id)).join(User).where(
-                User.tg_id == tg_user.id, Task.status == "Выполнена"
-            )
-        )
-        completed_tasks = result_tasks.scalar() or 0
-
-        # 2️⃣ Закрытые сделки
-        result_deals = await session.execute(
-            select(
-                func.count(Deal.id),
-                func.coalesce(func.sum(Deal.amount), 0)
-            ).join(User).where(User.tg_id == tg_user.id, Deal.status == "Закрыта")
-        )
-        deals_count, deals_sum = result_deals.one()
+        stats = await session.get(UserStats, user_id)
+
+    completed_tasks = stats.tasks_done if stats else 0
+    deals_count = stats.deals_closed if stats else 0
+    deals_sum = stats.deals_closed_sum if stats else 0
 
     report_text = (
-        f"📊 <b>Отчёт на {datetime.now():%d.%m.%Y %H:%M}</b>\n\n"
+        f"📊 <b>Отчёт за всё время на {datetime.now(TZ):%d.%m.%Y %H:%M}</b>\n\n"
         f"✅ Завершено задач: {completed_tasks}\n"
         f"💼 Закрыто сделок: {deals_count}\n"
-        f"💰 Общая сумма: {deals_sum} ₽"
+        f"💰 Общая сумма: {deals_sum} ₽\n\n"
+        "За период: /report day | week | month | custom"
     )
 
     await message.answer(report_text, parse_mode="HTML")
@@ -1,24 +1,47 @@
 import logging
-from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from html import escape
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from aiogram import F
+from aiogram.filters import Command, StateFilter
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from config import LIST_PAGE_SIZE
 from keyboards.reply import BTN_ADD_TASK, BTN_VIEW_TASKS
+from keyboards.callbacks import TaskDelete, TaskDone, TasksBulk, TasksPage, TasksPick, TasksSelect
+from keyboards.inline import page_nav_buttons, select_cancel_button, select_mode_button
 from states.task_states import TaskAddState
 
-from sqlalchemy import select, delete
+from sqlalchemy import select
 from database.db import async_session
-from database.models import User, Task
+from database.models import Task, utcnow
+from database.stats import TASK_DONE, task_status_changed
+from database.pagination import PAGE_NEXT, decode_cursor, encode_cursor, fetch_page, status_rank
+from database import repository
+from database.repository import TaskRow
+from services.due_time import TZ, parse_due_at
+from services.list_cache import (
+    LIST_TASKS,
+    RenderedList,
+    edit_list_markup,
+    edit_list_message,
+    foreign_list,
+    list_cache,
+)
+from services.reminders import reminder_scheduler
+from services.routing import IndexedRouter
+from services.send_queue import PRIORITY_LOW, send_priority
 
-router = Router()
+router = IndexedRouter(name="tasks")
 logger = logging.getLogger(__name__)
 
+TASKS_HEADER = "📋 <b>Ваши задачи:</b>"
+
 # === Добавление задачи ===
 
 @router.message(Command("add_task"))
-@router.message(F.text == BTN_ADD_TASK)
+@router.button(BTN_ADD_TASK)
 async def add_task_start(message: Message, state: FSMContext) -> None:
     """
     Точка входа в мастер добавления задачи.
@@ -28,20 +51,21 @@ async def add_task_start(message: Message, state: FSMContext) -> None:
     await message.answer("Введите название задачи (например: Подготовить КП):")
 
 
-@router.message(TaskAddState.waiting_for_title, F.text.len() > 0)
+@router.message(StateFilter(TaskAddState.waiting_for_title), F.text.len() > 0)
 async def add_task_get_title(message: Message, state: FSMContext) -> None:
     """
     Сохраняем название задачи во временном состоянии и просим время.
     """
     await state.update_data(title=message.text.strip())
     await state.set_state(TaskAddState.waiting_for_time)
-    await message.answer("Укажите время выполнения (например: 18:00):")
+    await message.answer("Укажите время выполнения (например: 18:00 или завтра 10:30):")
 
 
-@router.message(TaskAddState.waiting_for_time, F.text.len() > 0)
-async def add_task_save(message: Message, state: FSMContext) -> None:
+@router.message(StateFilter(TaskAddState.waiting_for_time), F.text.len() > 0)
+async def add_task_save(message: Message, state: FSMContext, user_id: int) -> None:
     """
-    Получаем время, создаём пользователя (если его ещё нет) и сохраняем задачу в БД.
+    Получаем время и сохраняем задачу в БД.
+    Пользователь уже найден/создан в UserIdMiddleware и передан как user_id.
     """
     time_text = message.text.strip()
     data = await state.get_data()
@@ -51,27 +75,25 @@ async def add_task_save(message: Message, state: FSMContext) -> None:
         await message.answer("Слишком длинное время. Укажите, например: 18:00")
         return
 
-    tg_user = message.from_user
+    # Срок для напоминания; нераспознанное время остаётся просто подписью
+    due_at = parse_due_at(time_text)
 
     async with async_session() as session:
-        # находим/создаём пользователя
-        result = await session.execute(
-            select(User).where(User.tg_id == tg_user.id)
+        task = Task(
+            user_id=user_id, title=title, time=time_text, status="Не выполнена", due_at=due_at, created_at=utcnow()
         )
-        user = result.scalar_one_or_none()
-        if user is None:
-            user = User(tg_id=tg_user.id, username=tg_user.username or "")
-            session.add(user)
-            await session.flush()
-
-        # создаём задачу
-        task = Task(user_id=user.id, title=title, time=time_text, status="Не выполнена")
         session.add(task)
+        await task_status_changed(session, user_id, None, task.status, task.created_at)
         await session.commit()
 
+    reminder_scheduler.notify(task.id, message.from_user.id, title, time_text, due_at)
     await state.clear()
-    await message.answer(f"✅ Задача сохранена:\n• {title}\n• Время: {time_text}")
-    logger.info("Task created for user %s: %s at %s", tg_user.id, title, time_text)
+    if due_at is not None:
+        reminder = f"Напоминание: {due_at.astimezone(TZ):%d.%m %H:%M}"
+    else:
+        reminder = "Время не распознано — напоминания не будет"
+    await message.answer(f"✅ Задача сохранена:\n• {title}\n• Время: {time_text}\n• {reminder}")
+    logger.info("Task created for user %s: %s at %s", message.from_user.id, title, time_text)
 
 
 @router.message(Command("cancel"))
@@ -83,70 +105,289 @@ async def cancel(message: Message, state: FSMContext) -> None:
     await message.answer("Отменено. Возврат в главное меню.")
 
 
-# --- NEW CODE START: просмотр и сортировка задач ---
+# --- NEW CODE START: просмотр задач (сортировка и пагинация в БД) ---
 
-@router.message(F.text == BTN_VIEW_TASKS)
-@router.message(Command("view_tasks"))
-async def view_tasks(message: Message):
+async def load_tasks_page(user_id: int, cursor=None, direction: str = PAGE_NEXT):
     """
-    Показывает пользователю список задач.
+    Читает одну страницу задач пользователя.
     Незавершённые задачи идут первыми, завершённые — внизу списка.
     """
-    tg_user = message.from_user
-
+    rank = status_rank(Task.status, "Выполнена")
+    stmt = select(Task, rank).where(Task.user_id == user_id)
     async with async_session() as session:
-        result = await session.execute(
-            select(Task).join(User).where(User.tg_id == tg_user.id)
+        return await fetch_page(
+            session, stmt, rank, Task.id, cursor, direction, LIST_PAGE_SIZE
         )
-        tasks = result.scalars().all()
 
-    if not tasks:
-        await message.answer("У вас пока нет задач.")
+
+def task_line(task: Task) -> str:
+    """Строка задачи в списке."""
+    return f"• <b>{escape(task.title)}</b> — {escape(task.time)} [{task.status}]"
+
+
+def task_buttons(task_id: int) -> List[InlineKeyboardButton]:
+    """Кнопки строки задачи: ✅ переключить статус | 🗑 удалить."""
+    return [
+        InlineKeyboardButton(text=f"✅ {task_id}", callback_data=TaskDone(task_id=task_id).pack()),
+        InlineKeyboardButton(text=f"🗑 {task_id}", callback_data=TaskDelete(task_id=task_id).pack()),
+    ]
+
+
+def render_tasks_page(user_id: int, rows, has_prev: bool, has_next: bool) -> RenderedList:
+    """
+    Собирает строки и inline-клавиатуру страницы задач
+    (результат кэшируется для правок на месте, см. services/list_cache.py).
+    """
+    items = OrderedDict((task.id, (task_line(task), task_buttons(task.id))) for task, _ in rows)
+    (first, first_rank), (last, last_rank) = rows[0], rows[-1]
+    nav = page_nav_buttons(
+        TasksPage,
+        encode_cursor(first_rank, first.id),
+        encode_cursor(last_rank, last.id),
+        has_prev,
+        has_next,
+    )
+    nav.append(select_mode_button(TasksSelect))
+    return RenderedList(LIST_TASKS, user_id, TASKS_HEADER, items, nav)
+
+
+async def show_first_tasks_page(message: Message, user_id: int) -> None:
+    """Перерисовывает сообщение message первой страницей задач (списка нет в кэше)."""
+    rows, has_prev, has_next = await load_tasks_page(user_id)
+    if not rows:
+        list_cache.pop(message.chat.id, message.message_id)
+        await message.edit_text("У вас пока нет задач.")
         return
+    await edit_list_message(message, render_tasks_page(user_id, rows, has_prev, has_next))
 
-    # --- NEW CODE START: сортировка ---
-    tasks.sort(key=lambda t: 0 if t.status != "Выполнена" else 1)
-    # --- NEW CODE END ---
 
-    text = "📋 <b>Ваши задачи:</b>\n\n"
-    builder = InlineKeyboardBuilder()
+@router.button(BTN_VIEW_TASKS)
+@router.message(Command("view_tasks"))
+async def view_tasks(message: Message, user_id: int):
+    """
+    Показывает пользователю первую страницу списка задач.
+    """
+    rows, has_prev, has_next = await load_tasks_page(user_id)
 
-    for task in tasks:
-        text += f"• <b>{task.title}</b> — {task.time} [{task.status}]\n"
-        builder.button(text=f"✅ {task.id}", callback_data=f"task_done:{task.id}")
-        builder.button(text=f"🗑 {task.id}", callback_data=f"task_del:{task.id}")
+    if not rows:
+        await message.answer("У вас пока нет задач.")
+        return
+
+    rendered = render_tasks_page(user_id, rows, has_prev, has_next)
+    # Список — самое тяжёлое сообщение бота, пропускаем вперёд короткие ответы
+    with send_priority(PRIORITY_LOW):
+        sent = await message.answer(rendered.text(), reply_markup=rendered.markup(), parse_mode="HTML")
+    list_cache.set(sent.chat.id, sent.message_id, rendered)
 
-    builder.adjust(2)
-    await message.answer(text, reply_markup=builder.as_markup(), parse_mode="HTML")
+
+@router.callback(TasksPage)
+async def page_tasks(callback: CallbackQuery, callback_data: TasksPage, user_id: int):
+    """
+    Листает список задач ◀ / ▶ — редактирует то же сообщение.
+    """
+    message = callback.message
+    if await foreign_list(callback, list_cache.get(message.chat.id, message.message_id, LIST_TASKS), user_id):
+        return
+    rows, has_prev, has_next = await load_tasks_page(
+        user_id, decode_cursor(callback_data.cursor), callback_data.direction
+    )
+    if rows:
+        await edit_list_message(message, render_tasks_page(user_id, rows, has_prev, has_next))
+    else:
+        # Страница опустела (задачи удалили) — возвращаемся к началу списка
+        await show_first_tasks_page(message, user_id)
+    await callback.answer()
 
 # --- NEW CODE END ---
 
 
-@router.callback_query(F.data.startswith("task_done:"))
-async def mark_task_done(callback: CallbackQuery):
+async def toggle_task_status(user_id: int, task_id: int) -> Optional[TaskRow]:
     """
-    Переключает статус задачи: Выполнена <-> Не выполнена.
+    Переключает статус задачи пользователя: Выполнена <-> Не выполнена.
+    Возвращает задачу с новым статусом или None, если задачи нет (или она чужая).
     """
-    task_id = int(callback.data.split(":")[1])
     async with async_session() as session:
-        result = await session.execute(select(Task).where(Task.id == task_id))
-        task = result.scalar_one_or_none()
-        if task:
-            task.status = "Выполнена" if task.status != "Выполнена" else "Не выполнена"
-            await session.commit()
-            await callback.answer(f"Статус изменён на «{task.status}» ✅")
-        else:
-            await callback.answer("Задача не найдена ❌", show_alert=True)
+        task = await repository.toggle_task(session, user_id, task_id)
+        await session.commit()
+    return task
 
 
-@router.callback_query(F.data.startswith("task_del:"))
-async def delete_task(callback: CallbackQuery):
+async def update_tasks_message(
+    message: Message, user_id: int, rendered: Optional[RenderedList], changes: Dict[int, Optional[TaskRow]]
+) -> None:
     """
-    Удаляет задачу из базы данных.
+    Правит список задач в сообщении после изменения задач:
+    перерисовываются только их строки (None — строка удаляется).
+    rendered — список этого сообщения из кэша (None — перечитать первую страницу).
     """
-    task_id = int(callback.data.split(":")[1])
+    for task_id in changes:
+        list_cache.invalidate_item(message.chat.id, LIST_TASKS, task_id, keep=message.message_id)
+    if rendered is None:
+        await show_first_tasks_page(message, user_id)
+        return
+    for task_id, task in changes.items():
+        if task is None:
+            rendered.remove(task_id)
+        elif task_id in rendered.items:
+            rendered.replace(task_id, task_line(task), task_buttons(task_id))
+    if not rendered.items:
+        # На странице не осталось задач — показываем начало списка
+        await show_first_tasks_page(message, user_id)
+        return
+    await edit_list_message(message, rendered)
+
+
+@router.callback(TaskDone)
+async def mark_task_done(callback: CallbackQuery, callback_data: TaskDone, user_id: int):
+    """
+    Переключает статус задачи: Выполнена <-> Не выполнена
+    и обновляет её строку в том же сообщении.
+    """
+    task_id = callback_data.task_id
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_TASKS)
+    if await foreign_list(callback, rendered, user_id):
+        return
+    task = await toggle_task_status(user_id, task_id)
+    if task is None:
+        await callback.answer("Задача не найдена ❌", show_alert=True)
+        return
+    await callback.answer(f"Статус изменён на «{task.status}» ✅")
+    await update_tasks_message(message, user_id, rendered, {task_id: task})
+
+
+@router.callback(TaskDelete)
+async def delete_task(callback: CallbackQuery, callback_data: TaskDelete, user_id: int):
+    """
+    Удаляет задачу из базы данных и убирает её строку из списка.
+    """
+    task_id = callback_data.task_id
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_TASKS)
+    if await foreign_list(callback, rendered, user_id):
+        return
     async with async_session() as session:
-        await session.execute(delete(Task).where(Task.id == task_id))
+        deleted = await repository.delete_task(session, user_id, task_id)
         await session.commit()
+    if deleted is None:
+        await callback.answer("Задача не найдена ❌", show_alert=True)
+        return
     await callback.answer("Задача удалена 🗑")
-    await callback.message.edit_text("Задача удалена. Обновите список 📋")
+    await update_tasks_message(message, user_id, rendered, {task_id: None})
+
+
+# === Режим выбора: массовые действия над задачами страницы ===
+# Флажки только правят клавиатуру, выбор хранится в данных FSM
+# (selection = {"kind", "message_id", "ids"}). Применение — один
+# UPDATE/DELETE по всем выбранным id и одна перерисовка списка.
+
+def tasks_selection_footer(count: int) -> List[List[InlineKeyboardButton]]:
+    """Кнопки действий над выбранными задачами (вместо листания)."""
+    return [
+        [
+            InlineKeyboardButton(text=f"✅ Выполнены ({count})", callback_data=TasksBulk(action="done").pack()),
+            InlineKeyboardButton(text="↩️ Не выполнены", callback_data=TasksBulk(action="undone").pack()),
+        ],
+        [
+            InlineKeyboardButton(text=f"🗑 Удалить ({count})", callback_data=TasksBulk(action="del").pack()),
+            select_cancel_button(TasksSelect),
+        ],
+    ]
+
+
+async def selected_task_ids(state: FSMContext, message: Message) -> List[int]:
+    """Выбранные задачи этого сообщения (выбор в другом списке не считается)."""
+    selection = (await state.get_data()).get("selection")
+    if not selection or selection["kind"] != LIST_TASKS or selection["message_id"] != message.message_id:
+        return []
+    return selection["ids"]
+
+
+async def show_tasks_selection(message: Message, state: FSMContext, rendered: RenderedList, ids: List[int]) -> None:
+    await state.update_data(selection={"kind": LIST_TASKS, "message_id": message.message_id, "ids": ids})
+    rendered.show_selection(
+        ids, lambda task_id: TasksPick(task_id=task_id).pack(), tasks_selection_footer(len(ids))
+    )
+    await edit_list_markup(message, rendered)
+
+
+@router.callback(TasksSelect)
+async def tasks_selection_mode(
+    callback: CallbackQuery, callback_data: TasksSelect, state: FSMContext, user_id: int
+):
+    """Включает (on) или выключает (off) режим выбора задач в списке."""
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_TASKS)
+    if await foreign_list(callback, rendered, user_id):
+        return
+    if rendered is None:
+        await state.update_data(selection=None)
+        await show_first_tasks_page(message, user_id)
+        await callback.answer("Список обновлён")
+        return
+    if callback_data.mode == "on":
+        await show_tasks_selection(message, state, rendered, [])
+        await callback.answer("Отметьте задачи")
+    else:
+        await state.update_data(selection=None)
+        rendered.clear_selection()
+        await edit_list_markup(message, rendered)
+        await callback.answer()
+
+
+@router.callback(TasksPick)
+async def tasks_pick(callback: CallbackQuery, callback_data: TasksPick, state: FSMContext, user_id: int):
+    """Отмечает задачу флажком или снимает отметку — меняется только клавиатура."""
+    task_id = callback_data.task_id
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_TASKS)
+    if await foreign_list(callback, rendered, user_id):
+        return
+    if rendered is None:
+        await state.update_data(selection=None)
+        await show_first_tasks_page(message, user_id)
+        await callback.answer("Список обновлён, выберите задачи заново")
+        return
+    ids = await selected_task_ids(state, message)
+    ids = [i for i in ids if i != task_id] if task_id in ids else ids + [task_id]
+    await show_tasks_selection(message, state, rendered, ids)
+    await callback.answer()
+
+
+@router.callback(TasksBulk)
+async def tasks_bulk_apply(
+    callback: CallbackQuery, callback_data: TasksBulk, state: FSMContext, user_id: int
+):
+    """
+    Применяет действие ко всем выбранным задачам одним запросом
+    и перерисовывает список один раз.
+    """
+    action = callback_data.action
+    message = callback.message
+    rendered = list_cache.get(message.chat.id, message.message_id, LIST_TASKS)
+    if await foreign_list(callback, rendered, user_id):
+        return
+    ids = await selected_task_ids(state, message)
+    if not ids:
+        await callback.answer("Сначала отметьте задачи", show_alert=True)
+        return
+
+    async with async_session() as session:
+        if action == "del":
+            rows: List[TaskRow] = await repository.delete_tasks(session, user_id, ids)
+        else:
+            status = TASK_DONE if action == "done" else repository.TASK_OPEN
+            rows = await repository.set_tasks_status(session, user_id, ids, status)
+        await session.commit()
+
+    await state.update_data(selection=None)
+    if rendered is not None:
+        rendered.clear_selection()
+    if action == "del":
+        await callback.answer(f"Удалено задач: {len(rows)} 🗑")
+    else:
+        await callback.answer(f"Изменено задач: {len(rows)} ✅")
+    await update_tasks_message(
+        message, user_id, rendered, {row.id: (row if row.status is not None else None) for row in rows}
+    )
+    logger.info("Bulk %s for user %s: %s of %s tasks", action, callback.from_user.id, len(rows), len(ids))
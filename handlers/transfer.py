@@ -0,0 +1,361 @@
+"""
+Импорт и экспорт задач и сделок файлом.
+
+/import — пользователь присылает CSV или JSON (массив объектов либо
+JSON Lines). Строки проверяются по одной по мере чтения файла, корректные
+копятся пачками по IMPORT_BATCH_SIZE и вставляются в одной транзакции
+(COPY на asyncpg, многострочный INSERT на остальных драйверах, см.
+database.db.bulk_insert). В ответ — число загруженных строк и ошибки
+по номерам строк; полный список ошибок прикладывается CSV-файлом.
+
+/export [csv|json] — задачи и сделки пользователя читаются серверным
+курсором (session.stream, yield_per) и пишутся во временный файл
+пачками, так что большой экспорт не держится в памяти целиком.
+Формат экспорта совпадает с форматом импорта.
+
+Колонки: type (task | deal), title, time, amount, status.
+"""
+
+import os
+import io
+import csv
+import json
+import asyncio
+import logging
+import tempfile
+from typing import Iterator, List, Optional, Tuple
+
+from aiogram import Bot, Router, F
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.types import BufferedInputFile, FSInputFile, Message
+from sqlalchemy import select
+
+from config import (
+    EXPORT_BATCH_SIZE,
+    IMPORT_BATCH_SIZE,
+    IMPORT_ERRORS_SHOWN,
+    IMPORT_MAX_BYTES,
+    IMPORT_MAX_ROWS,
+)
+from database.db import async_session, bulk_insert
+from database.models import Deal, Task, User, utcnow
+from database.stats import DEAL_CLOSED, TASK_DONE, bump_daily_stats, bump_user_stats
+from handlers.deals import DEAL_STATUSES
+from services.due_time import local_day, parse_due_at
+from services.reminders import reminder_scheduler
+from states.transfer_states import ImportState
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["type", "title", "time", "amount", "status"]
+TASK_STATUSES = ["Не выполнена", "Выполнена"]
+TASK_COLUMNS = ["user_id", "title", "time", "status", "due_at", "created_at", "closed_at"]
+DEAL_COLUMNS = ["user_id", "title", "amount", "status", "created_at", "closed_at"]
+
+FORMAT_CSV = "csv"
+FORMAT_JSON = "json"
+
+
+class RowError(ValueError):
+    """Строка файла не прошла проверку."""
+
+
+# === Чтение и проверка строк ===
+
+def iter_csv(handle) -> Iterator[Tuple[int, dict]]:
+    """(номер строки, словарь колонок) из CSV с заголовком."""
+    reader = csv.DictReader(handle)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_json(handle) -> Iterator[Tuple[int, dict]]:
+    """
+    (номер, объект) из JSON-массива или JSON Lines.
+    JSON Lines читается построчно; массив — целиком (размер файла
+    ограничен IMPORT_MAX_BYTES).
+    """
+    first = handle.read(1)
+    while first and first.isspace():
+        first = handle.read(1)
+    if first == "[":
+        items = json.loads(first + handle.read())
+        for number, item in enumerate(items, start=1):
+            yield number, item
+        return
+    handle.seek(0)
+    for line_num, line in enumerate(handle, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_num, RowError(f"некорректный JSON: {e.msg}")
+
+
+def _text(row: dict, key: str) -> str:
+    value = row.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def parse_row(row) -> Tuple[str, tuple]:
+    """
+    Проверяет строку импорта и возвращает (вид, значения без user_id).
+    Вид — task или deal; без колонки type строка с суммой считается сделкой.
+    """
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError("ожидался объект с полями " + ", ".join(COLUMNS))
+
+    kind = _text(row, "type").lower() or ("deal" if _text(row, "amount") else "task")
+    title = _text(row, "title")
+    status = _text(row, "status")
+    if not title:
+        raise RowError("пустое название")
+    if len(title) > 255:
+        raise RowError("название длиннее 255 символов")
+
+    if kind == "task":
+        time_text = _text(row, "time")
+        if not time_text:
+            raise RowError("не указано время задачи")
+        if len(time_text) > 50:
+            raise RowError("время длиннее 50 символов")
+        status = status or TASK_STATUSES[0]
+        if status not in TASK_STATUSES:
+            raise RowError(f"статус задачи должен быть одним из: {', '.join(TASK_STATUSES)}")
+        return kind, (title, time_text, status, parse_due_at(time_text))
+
+    if kind == "deal":
+        amount_text = _text(row, "amount")
+        # isdigit() пропускает «²», на котором падает int()
+        if not amount_text.isdecimal():
+            raise RowError("сумма сделки должна быть целым неотрицательным числом")
+        amount = int(amount_text)
+        if amount > 2**31 - 1:
+            raise RowError("слишком большая сумма")
+        status = status or DEAL_STATUSES[0]
+        if status not in DEAL_STATUSES:
+            raise RowError(f"статус сделки должен быть одним из: {', '.join(DEAL_STATUSES)}")
+        return kind, (title, amount, status)
+
+    raise RowError("type должен быть task или deal")
+
+
+class ImportResult:
+    """Итог импорта: сколько строк загружено и ошибки по номерам строк."""
+
+    def __init__(self):
+        self.tasks = 0
+        self.deals = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    def error_report(self) -> bytes:
+        """Полный список ошибок CSV-файлом (line, error)."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["line", "error"])
+        writer.writerows(self.errors)
+        return buffer.getvalue().encode("utf-8-sig")
+
+
+async def import_rows(user_id: int, rows: Iterator[Tuple[int, object]]) -> ImportResult:
+    """
+    Проверяет строки по мере чтения и грузит корректные пачками
+    в одной транзакции вместе со счётчиками user_stats и user_daily_stats
+    (все записи считаются созданными — и закрытыми — в момент импорта).
+    Строки с ошибками пропускаются и попадают в отчёт.
+    """
+    result = ImportResult()
+    tasks: List[tuple] = []
+    deals: List[tuple] = []
+    tasks_done = deals_closed = deals_closed_sum = 0
+    now = utcnow()
+
+    async with async_session() as session:
+        # Блокировка строки пользователя заодно открывает транзакцию
+        # (до COPY на asyncpg в транзакции уже должен быть запрос)
+        await session.execute(select(User.id).where(User.id == user_id).with_for_update())
+        conn = await session.connection()
+
+        async def flush() -> None:
+            await bulk_insert(conn, Task.__tablename__, TASK_COLUMNS, tasks)
+            await bulk_insert(conn, Deal.__tablename__, DEAL_COLUMNS, deals)
+            tasks.clear()
+            deals.clear()
+            # Разбор файла синхронный — даём поработать другим апдейтам
+            await asyncio.sleep(0)
+
+        for number, (line, row) in enumerate(rows, start=1):
+            if number > IMPORT_MAX_ROWS:
+                result.errors.append((line, f"превышен лимит {IMPORT_MAX_ROWS} строк, остаток файла пропущен"))
+                break
+            try:
+                kind, values = parse_row(row)
+            except RowError as e:
+                result.errors.append((line, str(e)))
+                continue
+
+            if kind == "task":
+                done = values[2] == TASK_DONE
+                tasks.append((user_id, *values, now, now if done else None))
+                result.tasks += 1
+                tasks_done += done
+            else:
+                closed = values[2] == DEAL_CLOSED
+                deals.append((user_id, *values, now, now if closed else None))
+                result.deals += 1
+                if closed:
+                    deals_closed += 1
+                    deals_closed_sum += values[1]
+
+            if len(tasks) + len(deals) >= IMPORT_BATCH_SIZE:
+                await flush()
+
+        await flush()
+        await bump_user_stats(session, user_id, tasks_done, deals_closed, deals_closed_sum)
+        await bump_daily_stats(
+            session,
+            user_id,
+            local_day(now),
+            tasks_created=result.tasks,
+            tasks_done=tasks_done,
+            deals_created=result.deals,
+            deals_closed=deals_closed,
+            deals_closed_sum=deals_closed_sum,
+        )
+        await session.commit()
+
+    if result.tasks:
+        # Сроки новых задач могли попасть в уже прочитанное окно напоминаний
+        reminder_scheduler.rescan()
+    return result
+
+
+# === Экспорт ===
+
+async def export_rows(user_id: int, fmt: str, path: str) -> int:
+    """
+    Пишет задачи и сделки пользователя в файл path (csv или json — JSON Lines).
+    Строки читаются серверным курсором пачками по EXPORT_BATCH_SIZE.
+    Возвращает число выгруженных строк.
+    """
+    queries = [
+        (
+            "task",
+            select(Task.title, Task.time, Task.status).where(Task.user_id == user_id).order_by(Task.id),
+        ),
+        (
+            "deal",
+            select(Deal.title, Deal.amount, Deal.status).where(Deal.user_id == user_id).order_by(Deal.id),
+        ),
+    ]
+    total = 0
+    with open(path, "w", encoding="utf-8-sig" if fmt == FORMAT_CSV else "utf-8", newline="") as handle:
+        writer = csv.writer(handle) if fmt == FORMAT_CSV else None
+        if writer:
+            writer.writerow(COLUMNS)
+        async with async_session() as session:
+            for kind, stmt in queries:
+                result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+                async for partition in result.partitions():
+                    records = []
+                    for title, value, status in partition:
+                        time_text, amount = (value, None) if kind == "task" else (None, value)
+                        records.append([kind, title, time_text, amount, status])
+                    if writer:
+                        writer.writerows(records)
+                    else:
+                        handle.writelines(
+                            json.dumps(dict(zip(COLUMNS, record)), ensure_ascii=False) + "\n"
+                            for record in records
+                        )
+                    total += len(records)
+    return total
+
+
+# === Хендлеры ===
+
+def file_format(file_name: Optional[str]) -> Optional[str]:
+    """Формат по расширению файла: csv, json (в т.ч. .jsonl / .ndjson) или None."""
+    extension = os.path.splitext(file_name or "")[1].lower()
+    if extension == ".csv":
+        return FORMAT_CSV
+    if extension in (".json", ".jsonl", ".ndjson"):
+        return FORMAT_JSON
+    return None
+
+
+@router.message(Command("import"))
+async def import_start(message: Message, state: FSMContext):
+    await state.set_state(ImportState.waiting_for_file)
+    await message.answer(
+        "Пришлите файл CSV или JSON с задачами и сделками.\n"
+        f"Колонки: {', '.join(COLUMNS)}.\n"
+        "type — task или deal (без type строка с суммой считается сделкой).\n"
+        "Для отмены — /cancel."
+    )
+
+
+@router.message(StateFilter(ImportState.waiting_for_file), F.document)
+async def import_file(message: Message, state: FSMContext, bot: Bot, user_id: int):
+    document = message.document
+    fmt = file_format(document.file_name)
+    if fmt is None:
+        await message.answer("Нужен файл .csv, .json или .jsonl.")
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await message.answer(f"Файл больше {IMPORT_MAX_BYTES // 1024} КБ — разбейте его на части.")
+        return
+
+    await state.clear()
+    with tempfile.TemporaryDirectory(prefix="bot-import-") as workdir:
+        path = os.path.join(workdir, f"import.{fmt}")
+        await bot.download(document, destination=path)
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as handle:
+                rows = iter_csv(handle) if fmt == FORMAT_CSV else iter_json(handle)
+                result = await import_rows(user_id, rows)
+        except (UnicodeDecodeError, csv.Error, json.JSONDecodeError) as e:
+            logger.warning("Import failed for user %s: %s", message.from_user.id, e)
+            await message.answer(f"❌ Не удалось прочитать файл: {e}")
+            return
+
+    lines = [f"✅ Импорт завершён: задач — {result.tasks}, сделок — {result.deals}."]
+    if result.errors:
+        lines.append(f"⚠️ Пропущено строк с ошибками: {len(result.errors)}")
+        lines += [f"• строка {line}: {error}" for line, error in result.errors[:IMPORT_ERRORS_SHOWN]]
+    await message.answer("\n".join(lines))
+    if len(result.errors) > IMPORT_ERRORS_SHOWN:
+        await message.answer_document(BufferedInputFile(result.error_report(), filename="import_errors.csv"))
+    logger.info(
+        "Import for user %s: %s tasks, %s deals, %s errors",
+        message.from_user.id, result.tasks, result.deals, len(result.errors),
+    )
+
+
+@router.message(StateFilter(ImportState.waiting_for_file))
+async def import_expect_file(message: Message):
+    await message.answer("Пришлите файл документом или отмените импорт командой /cancel.")
+
+
+@router.message(Command("export"))
+async def export_data(message: Message, command: CommandObject, user_id: int):
+    fmt = (command.args or FORMAT_CSV).strip().lower()
+    if fmt not in (FORMAT_CSV, FORMAT_JSON):
+        await message.answer("Формат экспорта: /export csv или /export json.")
+        return
+
+    with tempfile.TemporaryDirectory(prefix="bot-export-") as workdir:
+        file_name = "export.csv" if fmt == FORMAT_CSV else "export.jsonl"
+        path = os.path.join(workdir, file_name)
+        total = await export_rows(user_id, fmt, path)
+        if not total:
+            await message.answer("У вас пока нет задач и сделок.")
+            return
+        await message.answer_document(FSInputFile(path, filename=file_name), caption=f"📦 Выгружено строк: {total}")
+    logger.info("Export for user %s: %s rows (%s)", message.from_user.id, total, fmt)
@@ -0,0 +1,90 @@
+"""
+Фабрики callback_data inline-кнопок (aiogram CallbackData).
+
+Формат прежний — «<префикс>:<поле>:<поле>», поэтому кнопки в уже
+отправленных сообщениях продолжают работать. Хендлеры получают
+разобранные данные в аргументе callback_data, а префикс — ключ
+индекса диспетчеризации (services/routing.py).
+"""
+
+from typing import Optional
+
+from aiogram.filters.callback_data import CallbackData
+
+
+# === Задачи ===
+
+class TaskDone(CallbackData, prefix="task_done"):
+    """✅ — переключить статус задачи."""
+    task_id: int
+
+
+class TaskDelete(CallbackData, prefix="task_del"):
+    """🗑 — удалить задачу."""
+    task_id: int
+
+
+class TasksPage(CallbackData, prefix="tasks_page"):
+    """◀ / ▶ — страница списка задач от курсора."""
+    direction: str
+    cursor: str
+
+
+class TasksSelect(CallbackData, prefix="tasks_sel"):
+    """Режим выбора задач: mode = on / off."""
+    mode: str
+
+
+class TasksPick(CallbackData, prefix="tasks_pick"):
+    """Флажок задачи в режиме выбора."""
+    task_id: int
+
+
+class TasksBulk(CallbackData, prefix="tasks_bulk"):
+    """Действие над выбранными задачами: done / undone / del."""
+    action: str
+
+
+# === Сделки ===
+
+class DealNewStatus(CallbackData, prefix="deal_status"):
+    """Статус новой сделки (последний шаг мастера добавления)."""
+    status: str
+
+
+class DealStatusChange(CallbackData, prefix="deal_status_change"):
+    """🔄 — показать выбор статуса сделки."""
+    deal_id: int
+
+
+class DealSet(CallbackData, prefix="deal_set"):
+    """Выбранный новый статус сделки."""
+    deal_id: int
+    status: str
+
+
+class DealDelete(CallbackData, prefix="deal_del"):
+    """🗑 — удалить сделку."""
+    deal_id: int
+
+
+class DealsPage(CallbackData, prefix="deals_page"):
+    """◀ / ▶ — страница списка сделок от курсора."""
+    direction: str
+    cursor: str
+
+
+class DealsSelect(CallbackData, prefix="deals_sel"):
+    """Режим выбора сделок: mode = on / off."""
+    mode: str
+
+
+class DealsPick(CallbackData, prefix="deals_pick"):
+    """Флажок сделки в режиме выбора."""
+    deal_id: int
+
+
+class DealsBulk(CallbackData, prefix="deals_bulk"):
+    """Действие над выбранными сделками: set (со статусом) / del."""
+    action: str
+    status: Optional[str] = None
@@ -0,0 +1,40 @@
+from typing import List, Type
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton
+
+from database.pagination import PAGE_NEXT, PAGE_PREV
+
+BTN_PAGE_PREV = "◀"
+BTN_PAGE_NEXT = "▶"
+BTN_SELECT = "☑️ Выбрать"
+BTN_SELECT_CANCEL = "✖️ Отмена"
+
+
+def page_nav_buttons(
+    page: Type[CallbackData], first_cursor: str, last_cursor: str, has_prev: bool, has_next: bool
+) -> List[InlineKeyboardButton]:
+    """
+    Кнопки листания списка ◀ / ▶.
+    page — фабрика с полями direction и cursor (TasksPage, DealsPage).
+    """
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(
+            text=BTN_PAGE_PREV, callback_data=page(direction=PAGE_PREV, cursor=first_cursor).pack()
+        ))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            text=BTN_PAGE_NEXT, callback_data=page(direction=PAGE_NEXT, cursor=last_cursor).pack()
+        ))
+    return buttons
+
+
+def select_mode_button(select: Type[CallbackData]) -> InlineKeyboardButton:
+    """Кнопка входа в режим выбора записей (фабрика с полем mode)."""
+    return InlineKeyboardButton(text=BTN_SELECT, callback_data=select(mode="on").pack())
+
+
+def select_cancel_button(select: Type[CallbackData]) -> InlineKeyboardButton:
+    """Кнопка выхода из режима выбора без изменений."""
+    return InlineKeyboardButton(text=BTN_SELECT_CANCEL, callback_data=select(mode="off").pack())
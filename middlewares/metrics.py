@@ -0,0 +1,95 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.types import TelegramObject
+
+from config import LOG_UPDATES
+from services.metrics import (
+    UpdateContext,
+    current_update,
+    fsm_transitions,
+    handler_errors,
+    handler_seconds,
+    handler_span_seconds,
+)
+
+# Строка на каждый апдейт (LOG_UPDATES): хендлер и время обработки
+update_logger = logging.getLogger("bot.updates")
+
+_UNSET = object()
+
+
+class _TrackedFSMContext(FSMContext):
+    """FSMContext, который запоминает новое состояние — для счётчика переходов без лишних чтений."""
+
+    def __init__(self, storage, key):
+        super().__init__(storage, key)
+        self.new_state: Any = _UNSET
+
+    async def set_state(self, state=None) -> None:
+        await super().set_state(state)
+        self.new_state = state.state if isinstance(state, State) else state
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware на dp.update: время обработки апдейта, ошибки,
+    время БД/LLM внутри апдейта и переходы FSM. Метки хендлера проставляет
+    HandlerLabelMiddleware — внешнему middleware хендлер ещё не известен.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        update = UpdateContext(getattr(event, "update_id", None), user.id if user else None)
+        token = current_update.set(update)
+
+        state: Optional[FSMContext] = data.get("state")
+        if state is not None:
+            state = data["state"] = _TrackedFSMContext(state.storage, state.key)
+
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            handler_errors.inc(router=update.router, handler=update.handler, error=type(e).__name__)
+            raise
+        finally:
+            elapsed = update.elapsed()
+            handler_seconds.observe(elapsed, router=update.router, handler=update.handler)
+            if LOG_UPDATES:
+                update_logger.info("update handled", extra={"latency_ms": round(elapsed * 1000, 2)})
+            for kind, seconds in update.spans.items():
+                handler_span_seconds.observe(seconds, router=update.router, handler=update.handler, span=kind)
+            if state is not None and state.new_state is not _UNSET and state.new_state != data.get("raw_state"):
+                fsm_transitions.inc(
+                    from_state=data.get("raw_state") or "none",
+                    to_state=state.new_state or "none",
+                )
+            current_update.reset(token)
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware: сообщает метрикам, какой хендлер выбран
+    (роутер — имя модуля хендлера, например tasks / deals).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        update = current_update.get()
+        if update is not None:
+            callback = data["handler"].callback
+            update.router = callback.__module__.rsplit(".", 1)[-1]
+            update.handler = callback.__name__
+        return await handler(event, data)
@@ -0,0 +1,105 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User as TgUser
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from database.db import async_session, insert_for
+from database.models import User
+
+logger = logging.getLogger(__name__)
+
+
+class UserIdCache:
+    """
+    Ограниченный LRU-кэш tg_id -> users.id с временем жизни записей.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[int, tuple[int, float]]" = OrderedDict()
+
+    def get(self, tg_id: int) -> Optional[int]:
+        item = self._data.get(tg_id)
+        if item is None:
+            return None
+        user_id, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[tg_id]
+            return None
+        self._data.move_to_end(tg_id)
+        return user_id
+
+    def set(self, tg_id: int, user_id: int) -> None:
+        self._data[tg_id] = (user_id, time.monotonic() + self.ttl)
+        self._data.move_to_end(tg_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, tg_id: int) -> None:
+        self._data.pop(tg_id, None)
+
+
+async def get_or_create_user_id(session: AsyncSession, tg_user: TgUser) -> int:
+    """
+    Возвращает users.id для пользователя Telegram, создавая запись при необходимости.
+    Вставка идёт через INSERT ... ON CONFLICT DO NOTHING RETURNING, поэтому
+    параллельные апдейты одного пользователя не ловят нарушение UNIQUE(tg_id).
+    """
+    result = await session.execute(select(User.id).where(User.tg_id == tg_user.id))
+    user_id = result.scalar_one_or_none()
+    if user_id is not None:
+        return user_id
+
+    stmt = (
+        insert_for(session)(User)
+        .values(tg_id=tg_user.id, username=tg_user.username or "")
+        .on_conflict_do_nothing(index_elements=[User.tg_id])
+        .returning(User.id)
+    )
+    user_id = (await session.execute(stmt)).scalar_one_or_none()
+    if user_id is None:
+        # Пользователя успел создать параллельный запрос — просто читаем его id
+        result = await session.execute(select(User.id).where(User.tg_id == tg_user.id))
+        user_id = result.scalar_one()
+    else:
+        logger.info("User %s registered with id %s", tg_user.id, user_id)
+    await session.commit()
+    return user_id
+
+
+class UserIdMiddleware(BaseMiddleware):
+    """
+    Определяет users.id по Telegram ID один раз и передаёт его в хендлер
+    аргументом user_id. Поиск делается только для хендлеров, у которых
+    есть параметр user_id — остальным лишний запрос в БД не нужен.
+    """
+
+    def __init__(self, cache: Optional[UserIdCache] = None):
+        self.cache = cache or UserIdCache()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_obj = data.get("handler")
+        tg_user: Optional[TgUser] = data.get("event_from_user")
+        if tg_user is None or handler_obj is None or "user_id" not in handler_obj.params:
+            return await handler(event, data)
+
+        user_id = self.cache.get(tg_user.id)
+        if user_id is None:
+            async with async_session() as session:
+                user_id = await get_or_create_user_id(session, tg_user)
+            self.cache.set(tg_user.id, user_id)
+
+        data["user_id"] = user_id
+        return await handler(event, data)
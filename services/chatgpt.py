@@ -1,50 +1,221 @@
 # --- NEW FILE: services/chatgpt.py ---
 
 import os
+import re
+import time
+import asyncio
 import logging
-from openai import AsyncOpenAI
+import threading
+from typing import AsyncIterator, Callable, Optional
+
+from config import (
+    MARKETING_CACHE_ENABLED,
+    MARKETING_CACHE_EMBEDDER,
+    MARKETING_CACHE_PATH,
+    MARKETING_CACHE_SIZE,
+    MARKETING_CACHE_THRESHOLD,
+)
+from services.llm_scheduler import QuotaExceeded, llm_scheduler
+from services.metrics import llm_errors, llm_request_seconds, observe_llm_usage, record_span, registry
+from services.semantic_cache import HashingEmbedder, OpenAIEmbedder, SemanticCache
 
 logger = logging.getLogger(__name__)
 
-# Клиент ChatGPT
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Клиент ChatGPT. Создаётся при первом запросе (get_client): импорт openai —
+# заметная доля времени старта, и без OPENAI_API_KEY бот всё равно запускается
+client = None
+_client_lock = threading.Lock()
+
+def _build_client():
+    with _client_lock:
+        global client
+        if client is None:
+            from openai import AsyncOpenAI
+
+            client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return client
+
+async def get_client():
+    """
+    Возвращает клиента OpenAI, при первом вызове создаёт его
+    в отдельном потоке, чтобы импорт openai не останавливал event loop.
+    """
+    if client is not None:
+        return client
+    return await asyncio.to_thread(_build_client)
+
+# Семантический кэш советов: похожие вопросы получают готовый ответ без запроса к API
+marketing_cache = SemanticCache(
+    embedder=HashingEmbedder() if MARKETING_CACHE_EMBEDDER == "hashing" else OpenAIEmbedder(get_client),
+    threshold=MARKETING_CACHE_THRESHOLD,
+    max_size=MARKETING_CACHE_SIZE,
+    path=MARKETING_CACHE_PATH,
+)
+registry.register_stats("bot_marketing_cache", "Семантический кэш советов", marketing_cache.stats)
+
+def set_client(new_client) -> None:
+    """
+    Подменяет клиента OpenAI — например, на FakeStreamingClient в тестах.
+    """
+    global client
+    client = new_client
+
+def load_marketing_cache() -> None:
+    """
+    Поднимает кэш советов с диска (тёплый рестарт). Блокирует — при старте
+    вызывается в потоке, параллельно с прогревом БД. Если кэш выключен,
+    faiss не загружается.
+    """
+    if MARKETING_CACHE_ENABLED:
+        marketing_cache.load()
+
+def _marketing_messages(problem: str) -> list[dict]:
+    return [
+        {"role": "system", "content": "Ты опытный маркетолог, помоги кратко и чётко."},
+        {"role": "user", "content": problem}
+    ]
 
-async def get_marketing_advice(problem: str) -> str:
+async def _cache_lookup(problem: str):
     """
-    Возвращает совет по маркетингу, основываясь на запросе пользователя.
+    Ищет совет в семантическом кэше. Возвращает (ответ или None, эмбеддинг).
+    Ошибка эмбеддинга не мешает получить совет — просто идём в API.
     """
+    if not MARKETING_CACHE_ENABLED:
+        return None, None
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Ты опытный маркетолог, помоги кратко и чётко."},
-                {"role": "user", "content": problem}
-            ],
-            temperature=0.7,
-        )
-        answer = response.choices[0].message.content.strip()
-        logger.info("Совет по маркетингу сгенерирован.")
-        return answer
+        vector = await marketing_cache.embed(problem)
+    except Exception as e:
+        logger.error(f"Ошибка эмбеддинга для семантического кэша: {e}")
+        return None, None
+    return marketing_cache.search(vector), vector
+
+async def _create_completion(kind: str, **kwargs):
+    """
+    client.chat.completions.create с метриками: время запроса (спан llm)
+    и расход токенов по виду запроса kind.
+    """
+    llm = await get_client()
+    started = time.perf_counter()
+    try:
+        response = await llm.chat.completions.create(**kwargs)
+    except Exception:
+        llm_errors.inc(kind=kind)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        llm_request_seconds.observe(elapsed, kind=kind)
+        record_span("llm", elapsed)
+    observe_llm_usage(kind, getattr(response, "usage", None))
+    return response
+
+def _quota_message(e: QuotaExceeded) -> str:
+    return f"⏳ Слишком много запросов. Попробуй через {max(int(e.retry_after), 1)} сек."
+
+def _marketing_stream(problem: str, vector) -> Callable[[], AsyncIterator[str]]:
+    """
+    Фабрика потокового запроса совета для llm_scheduler.stream: читает стрим
+    OpenAI с метриками времени и токенов и кладёт готовый ответ в кэш.
+    На группу склеенных одинаковых вопросов выполняется один раз.
+    """
+    async def produce() -> AsyncIterator[str]:
+        parts = []
+        started = None
+        try:
+            llm = await get_client()
+            started = time.perf_counter()
+            stream = await llm.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=_marketing_messages(problem),
+                temperature=0.7,
+                stream=True,
+                # последний кусок стрима приносит расход токенов
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                observe_llm_usage("marketing_stream", getattr(chunk, "usage", None))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except Exception:
+            llm_errors.inc(kind="marketing_stream")
+            raise
+        finally:
+            if started is not None:
+                elapsed = time.perf_counter() - started
+                llm_request_seconds.observe(elapsed, kind="marketing_stream")
+                record_span("llm", elapsed)
+
+        answer = "".join(parts).strip()
+        logger.info("Совет по маркетингу сгенерирован (стриминг).")
+        if vector is not None and answer:
+            marketing_cache.add(problem, answer, vector)
+
+    return produce
+
+async def stream_marketing_advice(problem: str, user_id: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Совет по маркетингу кусками по мере генерации (stream=True).
+    Сначала ищет ответ на похожий вопрос в семантическом кэше — он приходит
+    одним куском. Одинаковые вопросы, которые уже генерируются, склеиваются:
+    все ждущие получают куски одного стрима (llm_scheduler.stream).
+    Слот планировщика занят, пока читается стрим.
+    """
+    cached, vector = await _cache_lookup(problem)
+    if cached is not None:
+        logger.info("Совет по маркетингу взят из кэша.")
+        yield cached
+        return
+
+    received = False
+    try:
+        async for delta in llm_scheduler.stream(
+            _marketing_stream(problem, vector),
+            user_id=user_id,
+            key=("marketing", marketing_cache.normalize_question(problem)),
+        ):
+            received = True
+            yield delta
+    except QuotaExceeded as e:
+        yield _quota_message(e)
     except Exception as e:
         logger.error(f"Ошибка ChatGPT при получении совета: {e}")
-        return "Не удалось получить совет. Попробуй позже."
+        if not received:
+            yield "Не удалось получить совет. Попробуй позже."
 
-async def get_motivation_phrase() -> str:
+async def generate_motivation_phrases(count: int) -> list[str]:
     """
-    Возвращает случайную мотивационную фразу для пользователя.
+    Генерирует пачку из count разных мотивационных фраз одним запросом.
+    Используется фоновым пополнением пула (services/motivation_pool.py).
+    При ошибке возвращает пустой список.
     """
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Ты коуч по продажам. Дай короткую мотивирующую фразу."},
-                {"role": "user", "content": "Мотивируй меня на успех в продажах."}
-            ],
-            temperature=0.9,
+        response = await llm_scheduler.run(
+            lambda: _create_completion(
+                "motivation_batch",
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "Ты коуч по продажам. Даёшь короткие мотивирующие фразы."},
+                    {"role": "user", "content": (
+                        f"Дай {count} разных коротких мотивирующих фраз для менеджера по продажам. "
+                        "Каждая фраза — с новой строки, без нумерации и кавычек."
+                    )},
+                ],
+                temperature=0.9,
+            ),
+            key=("motivation_batch", count),
         )
-        phrase = response.choices[0].message.content.strip()
-        logger.info("Мотивационная фраза сгенерирована.")
-        return phrase
+        text = response.choices[0].message.content or ""
+        phrases = []
+        for line in text.splitlines():
+            # убираем нумерацию и маркеры списка, если модель их всё же добавила
+            phrase = re.sub(r"^\s*(?:\d+[.)]|[-•*])\s*", "", line).strip().strip('"«»')
+            if phrase and phrase not in phrases:
+                phrases.append(phrase)
+        logger.info("Сгенерировано мотивационных фраз: %s", len(phrases))
+        return phrases[:count]
     except Exception as e:
-        logger.error(f"Ошибка ChatGPT при получении мотивации: {e}")
-        return "Сегодня отличный день для успеха! 💪"
+        logger.error(f"Ошибка ChatGPT при генерации мотивации: {e}")
+        return []
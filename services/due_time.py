@@ -0,0 +1,110 @@
+"""
+Разбор времени задачи («18:00», «завтра 10:30», «25.10 18:00») в момент времени.
+
+Время вводится в часовом поясе BOT_TIMEZONE, результат — datetime в UTC
+(колонка tasks.due_at). Текст, который не удалось разобрать, остаётся
+только подписью задачи: напоминания для неё не будет.
+"""
+
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from config import BOT_TIMEZONE
+
+TZ = ZoneInfo(BOT_TIMEZONE)
+
+# Время по умолчанию, если указана только дата
+DEFAULT_TIME = time(9, 0)
+
+_DAY_WORDS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+_TIME_RE = re.compile(r"(?<![\d.])([01]?\d|2[0-3])[:.]([0-5]\d)(?![\d.])")
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_DATE_RE = re.compile(r"(?<![\d:])(\d{1,2})\.(\d{1,2})(?:\.(\d{2}|\d{4}))?(?![\d:])")
+
+
+def parse_due_at(text: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Возвращает срок задачи в UTC или None.
+
+    Без даты берётся ближайшее такое время (сегодня или завтра),
+    дата без года — ближайшая в будущем. Срок в прошлом («сегодня 10:00»
+    в 11:00, дата с прошлым годом) не ставится.
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(TZ)
+    text = re.sub(r"(\d)t(\d)", r"\1 \2", text.strip().lower())
+
+    day: Optional[date] = None
+    dated = False
+    for word, offset in _DAY_WORDS.items():
+        if re.search(rf"\b{word}\b", text):
+            day = now.date() + timedelta(days=offset)
+            dated = True
+            text = re.sub(rf"\b{word}\b", " ", text)
+            break
+
+    iso = _ISO_DATE_RE.search(text)
+    if iso:
+        try:
+            day = date(int(iso.group(1)), int(iso.group(2)), int(iso.group(3)))
+        except ValueError:
+            return None
+        dated = True
+        text = text[: iso.start()] + " " + text[iso.end():]
+
+    # Дата раньше времени: «12.11 18:00» — 12 ноября, а не 12:11.
+    # Совпадение, которое не дата («18.00»), остаётся для поиска времени
+    year_given = False
+    if not dated:
+        for match in _DATE_RE.finditer(text):
+            year = match.group(3)
+            try:
+                day = date(
+                    (2000 + int(year) if len(year) == 2 else int(year)) if year else now.year,
+                    int(match.group(2)),
+                    int(match.group(1)),
+                )
+            except ValueError:
+                if _TIME_RE.fullmatch(match.group(0)):
+                    continue
+                return None
+            year_given = year is not None
+            dated = True
+            text = text[: match.start()] + " " + text[match.end():]
+            break
+
+    clock: Optional[time] = None
+    match = _TIME_RE.search(text)
+    if match:
+        clock = time(int(match.group(1)), int(match.group(2)))
+
+    if clock is None and not dated:
+        return None
+
+    due = datetime.combine(day or now.date(), clock or DEFAULT_TIME, tzinfo=TZ)
+    if due < now:
+        if not dated:
+            due += timedelta(days=1)
+        elif day is not None and not year_given and not iso and due.date() < now.date():
+            # «25.01» в октябре — это январь следующего года
+            try:
+                due = due.replace(year=due.year + 1)
+            except ValueError:
+                return None
+    if due < now:
+        # «сегодня 10:00» в 11:00: напоминание сработало бы сразу
+        return None
+    return due.astimezone(timezone.utc)
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """due_at из БД в UTC (SQLite возвращает время без пояса)."""
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def local_day(value: datetime) -> date:
+    """День момента времени в BOT_TIMEZONE (для дневной статистики)."""
+    return as_utc(value).astimezone(TZ).date()
@@ -0,0 +1,87 @@
+"""
+Поддельный клиент OpenAI для тестов и локального запуска без сети.
+
+Повторяет ту часть интерфейса AsyncOpenAI, которой пользуется бот:
+chat.completions.create (в том числе stream=True) и embeddings.create.
+
+Пример:
+    from services import chatgpt
+    from services.fake_openai import FakeStreamingClient
+    chatgpt.set_client(FakeStreamingClient(text="Совет", delay=0.05))
+
+Используется в tests/test_streaming.py.
+"""
+
+import asyncio
+from types import SimpleNamespace
+from typing import List, Optional
+
+from services.semantic_cache import HashingEmbedder
+
+
+class FakeStreamingClient:
+    """
+    text — ответ модели, chunk_size — символов в одном куске стрима,
+    first_token_delay — задержка до первого куска, delay — между кусками.
+    Все вызовы записываются в self.requests.
+    """
+
+    def __init__(
+        self,
+        text: str = "Проведите летнюю акцию и напомните о себе постоянным клиентам.",
+        chunk_size: int = 8,
+        first_token_delay: float = 0.0,
+        delay: float = 0.0,
+        embedding_dim: int = 1536,
+    ):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.first_token_delay = first_token_delay
+        self.delay = delay
+        self.requests: List[dict] = []
+        self._embedder = HashingEmbedder(dim=embedding_dim)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+
+    def _chunks(self) -> List[str]:
+        return [self.text[i:i + self.chunk_size] for i in range(0, len(self.text), self.chunk_size)]
+
+    @staticmethod
+    def _usage(prompt: str, completion: str) -> SimpleNamespace:
+        prompt_tokens, completion_tokens = len(prompt.split()), len(completion.split())
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+
+    async def _create_completion(self, *, messages, stream: bool = False, **kwargs):
+        self.requests.append({"messages": messages, "stream": stream, **kwargs})
+        if stream:
+            include_usage = (kwargs.get("stream_options") or {}).get("include_usage", False)
+            prompt = " ".join(m["content"] for m in messages)
+            return self._stream(self._usage(prompt, self.text) if include_usage else None)
+        await asyncio.sleep(self.first_token_delay + self.delay * len(self._chunks()))
+        prompt = " ".join(m["content"] for m in messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.text))],
+            usage=self._usage(prompt, self.text),
+        )
+
+    async def _stream(self, usage: Optional[SimpleNamespace] = None):
+        await asyncio.sleep(self.first_token_delay)
+        for i, chunk in enumerate(self._chunks()):
+            if i:
+                await asyncio.sleep(self.delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))], usage=None)
+        if usage is not None:
+            # как у OpenAI с stream_options={"include_usage": True}: пустые choices + usage
+            yield SimpleNamespace(choices=[], usage=usage)
+
+    async def _create_embedding(self, *, input, model: Optional[str] = None, **kwargs):
+        vector = await self._embedder.embed(input)
+        tokens = len(input.split())
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=vector.tolist())],
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens),
+        )
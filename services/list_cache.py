@@ -0,0 +1,211 @@
+"""
+Кэш отрисованных списков задач и сделок.
+
+После /view_tasks, /view_deals и листания страницы строки списка
+(текст и кнопки каждой записи) запоминаются по (чат, id сообщения).
+Смена статуса или удаление перерисовывает только затронутую строку
+и правит сообщение одним edit_text — без повторного чтения списка из БД.
+
+Режим выбора (массовые действия) меняет только клавиатуру: у записей
+флажки, вместо листания — кнопки действий (footer).
+
+Кнопки чужого списка (групповой чат) ничего не меняют: хендлер сверяет
+владельца закэшированного списка с нажавшим (foreign_list).
+
+Если сообщения нет в кэше (рестарт, вытеснение), хендлер заново читает
+первую страницу. Другие закэшированные списки чата с изменённой записью
+сбрасываются, чтобы не показать устаревшую строку.
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Collection, Dict, List, Optional, Set, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from config import LIST_CACHE_SIZE, LIST_CACHE_TTL
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Виды списков
+LIST_TASKS = "tasks"
+LIST_DEALS = "deals"
+
+
+class RenderedList:
+    """
+    Одна отрисованная страница списка: заголовок, строки записей
+    (id -> (текст строки, кнопки)) и кнопки листания.
+    overrides — временная замена кнопок записи (выбор статуса сделки,
+    флажки режима выбора), footer — кнопки действий вместо листания.
+    """
+
+    __slots__ = ("kind", "user_id", "header", "items", "nav", "overrides", "footer")
+
+    def __init__(
+        self,
+        kind: str,
+        user_id: int,
+        header: str,
+        items: "OrderedDict[int, Tuple[str, List[InlineKeyboardButton]]]",
+        nav: List[InlineKeyboardButton],
+    ):
+        self.kind = kind
+        self.user_id = user_id
+        self.header = header
+        self.items = items
+        self.nav = nav
+        self.overrides: Dict[int, List[InlineKeyboardButton]] = {}
+        self.footer: Optional[List[List[InlineKeyboardButton]]] = None
+
+    def text(self) -> str:
+        return "\n".join([self.header, ""] + [line for line, _ in self.items.values()])
+
+    def markup(self) -> InlineKeyboardMarkup:
+        builder = InlineKeyboardBuilder()
+        for item_id, (_, buttons) in self.items.items():
+            builder.row(*self.overrides.get(item_id, buttons))
+        if self.footer is not None:
+            for row in self.footer:
+                builder.row(*row)
+        elif self.nav:
+            builder.row(*self.nav)
+        return builder.as_markup()
+
+    def replace(self, item_id: int, line: str, buttons: List[InlineKeyboardButton]) -> None:
+        """Перерисовывает одну строку (позиция в списке сохраняется)."""
+        self.items[item_id] = (line, buttons)
+        self.overrides.pop(item_id, None)
+
+    def remove(self, item_id: int) -> None:
+        self.items.pop(item_id, None)
+        self.overrides.pop(item_id, None)
+
+    def show_selection(
+        self,
+        selected: Collection[int],
+        pick: Callable[[int], str],
+        footer: List[List[InlineKeyboardButton]],
+    ) -> None:
+        """Режим выбора: у каждой записи флажок (callback_data — pick(id)), внизу — footer."""
+        for item_id in self.items:
+            mark = "☑️" if item_id in selected else "⬜"
+            self.overrides[item_id] = [
+                InlineKeyboardButton(text=f"{mark} {item_id}", callback_data=pick(item_id))
+            ]
+        self.footer = footer
+
+    def clear_selection(self) -> None:
+        """Выход из режима выбора: обычные кнопки записей и листание."""
+        self.overrides.clear()
+        self.footer = None
+
+
+class RenderedListCache:
+    """
+    LRU-кэш (chat_id, message_id) -> RenderedList с временем жизни записей.
+    """
+
+    def __init__(self, maxsize: int = LIST_CACHE_SIZE, ttl: float = LIST_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Tuple[int, int], Tuple[RenderedList, float]]" = OrderedDict()
+        self._by_chat: Dict[int, Set[int]] = {}
+
+        # --- метрики ---
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chat_id: int, message_id: int, kind: str) -> Optional[RenderedList]:
+        key = (chat_id, message_id)
+        item = self._data.get(key)
+        if item is None or item[0].kind != kind:
+            self.misses += 1
+            return None
+        rendered, expires_at = item
+        if expires_at < time.monotonic():
+            self.pop(chat_id, message_id)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return rendered
+
+    def set(self, chat_id: int, message_id: int, rendered: RenderedList) -> None:
+        key = (chat_id, message_id)
+        self._data[key] = (rendered, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        self._by_chat.setdefault(chat_id, set()).add(message_id)
+        while len(self._data) > self.maxsize:
+            (old_chat, old_message), _ = self._data.popitem(last=False)
+            self._forget(old_chat, old_message)
+
+    def pop(self, chat_id: int, message_id: int) -> None:
+        if self._data.pop((chat_id, message_id), None) is not None:
+            self._forget(chat_id, message_id)
+
+    def _forget(self, chat_id: int, message_id: int) -> None:
+        messages = self._by_chat.get(chat_id)
+        if messages is not None:
+            messages.discard(message_id)
+            if not messages:
+                del self._by_chat[chat_id]
+
+    def invalidate_item(self, chat_id: int, kind: str, item_id: int, keep: Optional[int] = None) -> None:
+        """Сбрасывает списки чата, где показана изменённая запись (кроме сообщения keep)."""
+        for message_id in list(self._by_chat.get(chat_id, ())):
+            if message_id == keep:
+                continue
+            rendered = self._data[(chat_id, message_id)][0]
+            if rendered.kind == kind and item_id in rendered.items:
+                self.pop(chat_id, message_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+async def foreign_list(callback: CallbackQuery, rendered: Optional[RenderedList], user_id: int) -> bool:
+    """
+    Кнопка нажата в чужом списке: отвечает на callback и возвращает True,
+    хендлер выходит, ничего не меняя.
+    """
+    if rendered is None or rendered.user_id == user_id:
+        return False
+    await callback.answer("Это список другого пользователя", show_alert=True)
+    return True
+
+
+async def edit_list_message(message: Message, rendered: RenderedList) -> None:
+    """Показывает список в сообщении message и запоминает его в кэше."""
+    list_cache.set(message.chat.id, message.message_id, rendered)
+    try:
+        await message.edit_text(rendered.text(), reply_markup=rendered.markup(), parse_mode="HTML")
+    except TelegramBadRequest as e:
+        # «message is not modified» — в сообщении уже то же самое
+        if "not modified" not in str(e):
+            raise
+
+
+async def edit_list_markup(message: Message, rendered: RenderedList) -> None:
+    """Меняет только клавиатуру списка (режим выбора), текст сообщения не трогается."""
+    list_cache.set(message.chat.id, message.message_id, rendered)
+    try:
+        await message.edit_reply_markup(reply_markup=rendered.markup())
+    except TelegramBadRequest as e:
+        if "not modified" not in str(e):
+            raise
+
+
+# Общий кэш списков бота
+list_cache = RenderedListCache()
+registry.register_stats("bot_list_cache", "Кэш отрисованных списков", list_cache.stats)
@@ -0,0 +1,332 @@
+"""
+Планировщик запросов к OpenAI.
+
+- глобальный лимит одновременных запросов (LLM_MAX_CONCURRENCY);
+- честная очередь: освободившийся слот получает следующий пользователь
+  по кругу, а не тот, кто успел накидать больше запросов;
+- квоты на пользователя (token bucket);
+- склейка одинаковых запросов, которые уже выполняются (single-flight),
+  в том числе потоковых: все ждущие читают куски одного стрима;
+- метрики: глубина очереди, время ожидания, число склеенных и отклонённых запросов.
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_QUEUE_TIMEOUT,
+    LLM_QUOTA_MAX_WAIT,
+    LLM_USER_BURST,
+    LLM_USER_RATE_PER_MIN,
+)
+from services.metrics import registry
+from services.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceeded(Exception):
+    """Пользователь исчерпал квоту запросов к ChatGPT или очередь слишком длинная."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM quota exceeded, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class _SharedStream:
+    """
+    Куски потокового ответа, общие для склеенных запросов. Каждый читатель
+    получает все куски с начала — и уже пришедшие, и следующие.
+    """
+
+    def __init__(self):
+        self.parts: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0
+        self.task: Optional[asyncio.Future] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def put(self, part: Any) -> None:
+        self.parts.append(part)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def read(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            if index < len(self.parts):
+                index += 1
+                yield self.parts[index - 1]
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+class LLMScheduler:
+    """
+    user_id=None — системные запросы (например, пополнение пула мотивации):
+    они не расходуют квоты пользователей, но занимают общие слоты.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        user_rate_per_min: float = LLM_USER_RATE_PER_MIN,
+        user_burst: int = LLM_USER_BURST,
+        quota_max_wait: float = LLM_QUOTA_MAX_WAIT,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        max_users: int = 10000,
+    ):
+        self.max_concurrency = max_concurrency
+        self.user_rate = user_rate_per_min / 60
+        self.user_burst = user_burst
+        self.quota_max_wait = quota_max_wait
+        self.queue_timeout = queue_timeout
+        self.max_users = max_users
+
+        self._free = max_concurrency
+        self._waiters: "OrderedDict[Optional[int], Deque[asyncio.Future]]" = OrderedDict()
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._streams: Dict[Hashable, _SharedStream] = {}
+
+        # --- метрики ---
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # --- Квоты ---
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    async def _wait_quota(self, user_id: Optional[int]) -> None:
+        if user_id is None:
+            return
+        bucket = self._bucket(user_id)
+        wait = bucket.reserve()
+        if wait > self.quota_max_wait:
+            bucket.refund()
+            self.rejected += 1
+            raise QuotaExceeded(wait)
+        if wait:
+            await asyncio.sleep(wait)
+
+    # --- Честный семафор ---
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._waiters.values())
+
+    @property
+    def in_flight(self) -> int:
+        return self.max_concurrency - self._free
+
+    def set_concurrency(self, max_concurrency: int) -> None:
+        """
+        Меняет общий лимит слотов (например, делит его между процессами-воркерами).
+        Уже занятые слоты не отзываются.
+        """
+        self._free += max_concurrency - self.max_concurrency
+        self.max_concurrency = max_concurrency
+
+    async def _acquire(self, user_id: Optional[int]) -> None:
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user_id, deque()).append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout=self.queue_timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if fut.done() and not fut.cancelled():
+                # слот успели выдать в момент отмены — возвращаем его
+                self._release()
+            else:
+                self._remove_waiter(user_id, fut)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise QuotaExceeded(self.queue_timeout) from None
+            raise
+
+    def _remove_waiter(self, user_id: Optional[int], fut: asyncio.Future) -> None:
+        queue = self._waiters.get(user_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(fut)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiters[user_id]
+
+    def _release(self) -> None:
+        # Слот передаётся напрямую следующему по кругу пользователю
+        while self._waiters:
+            user_id, queue = next(iter(self._waiters.items()))
+            fut = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(user_id)
+            else:
+                del self._waiters[user_id]
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._free += 1
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[int] = None):
+        """
+        Занимает слот на время блока — для стриминга, где ответ читается по частям.
+        """
+        await self._wait_quota(user_id)
+        async with self._slot(user_id):
+            yield
+
+    @asynccontextmanager
+    async def _slot(self, user_id: Optional[int]):
+        # слот без списания квоты: её уже проверил вызывающий код
+        started = time.monotonic()
+        await self._acquire(user_id)
+        waited = time.monotonic() - started
+        self.requests += 1
+        self.wait_count += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def run(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        user_id: Optional[int] = None,
+        key: Optional[Hashable] = None,
+    ) -> Any:
+        """
+        Выполняет factory() в слоте планировщика.
+        Если передан key и такой же запрос уже выполняется — ждёт его результата.
+        """
+        if key is None:
+            async with self.slot(user_id):
+                return await factory()
+
+        existing = self._inflight.get(key)
+        if existing is not None:
+            self.coalesced += 1
+            return await asyncio.shield(existing)
+
+        async def job():
+            async with self.slot(user_id):
+                return await factory()
+
+        task = asyncio.ensure_future(job())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного из ожидающих не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    async def stream(
+        self,
+        factory: Callable[[], AsyncIterator[Any]],
+        user_id: Optional[int] = None,
+        key: Optional[Hashable] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Потоковая версия run(): factory() — асинхронный генератор кусков ответа,
+        он читается в слоте планировщика. Если передан key и такой же запрос
+        уже идёт — ждущий получает куски того же стрима, без второго запроса
+        к API (квота с него не списывается). Ошибка стрима приходит всем
+        читателям; когда уходит последний, общий запрос отменяется.
+        """
+        if key is None:
+            async with self.slot(user_id):
+                async for part in factory():
+                    yield part
+            return
+
+        shared = self._streams.get(key)
+        if shared is None:
+            await self._wait_quota(user_id)
+            # пока ждали квоту, такой же запрос мог начаться
+            shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _SharedStream()
+            shared.task = asyncio.ensure_future(self._produce(shared, factory, user_id))
+            shared.task.add_done_callback(lambda _: self._forget_stream(key, shared))
+        else:
+            self.coalesced += 1
+
+        shared.readers += 1
+        try:
+            async for part in shared.read():
+                yield part
+        finally:
+            shared.readers -= 1
+            if not shared.readers and not shared.task.done():
+                # новые такие же запросы начнут свой стрим, а не дочитают отменённый
+                self._forget_stream(key, shared)
+                shared.task.cancel()
+
+    async def _produce(self, shared: _SharedStream, factory: Callable[[], AsyncIterator[Any]],
+                       user_id: Optional[int]) -> None:
+        try:
+            async with self._slot(user_id):
+                async for part in factory():
+                    shared.put(part)
+        except asyncio.CancelledError:
+            shared.finish(RuntimeError("Потоковый запрос отменён: читателей не осталось"))
+            raise
+        except Exception as e:
+            shared.finish(e)
+        else:
+            shared.finish()
+
+    def _forget_stream(self, key: Hashable, shared: _SharedStream) -> None:
+        if self._streams.get(key) is shared:
+            del self._streams[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "wait_avg": self.wait_total / self.wait_count if self.wait_count else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+
+# Общий планировщик бота
+llm_scheduler = LLMScheduler()
+registry.register_stats("bot_llm_scheduler", "Планировщик запросов к OpenAI", llm_scheduler.stats)
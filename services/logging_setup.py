@@ -0,0 +1,167 @@
+"""
+Логирование без блокировки event loop.
+
+- хендлеры логгеров кладут запись в очередь (QueueHandler) и сразу
+  возвращаются; форматирование и запись в файл/консоль делает
+  QueueListener в отдельном потоке;
+- к каждой записи внутри апдейта добавляются update_id, user_id,
+  хендлер и время с начала обработки (services.metrics.current_update);
+- в файл пишется JSON по строке на запись (LOG_FORMAT=json) или текст;
+- ротация по размеру: старые файлы сжимаются в .gz и хранятся
+  LOG_BACKUP_COUNT штук — при старте ничего не удаляется.
+"""
+
+import os
+import gzip
+import json
+import queue
+import atexit
+import shutil
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+
+from config import LOG_BACKUP_COUNT, LOG_COMPRESS, LOG_DIR, LOG_FORMAT, LOG_LEVEL, LOG_MAX_BYTES
+from services.metrics import current_update
+
+# Стандартные атрибуты LogRecord — всё остальное пришло через extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+def text_formatter(process_name: str = "") -> logging.Formatter:
+    """Прежний текстовый формат; имя процесса — для воркеров супервизора."""
+    prefix = f"{process_name} " if process_name else ""
+    return logging.Formatter(f"%(asctime)s [%(levelname)s] {prefix}%(name)s: %(message)s")
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler, который в потоке вызова (где виден contextvar апдейта)
+    дописывает контекст апдейта и заранее собирает текст сообщения и traceback:
+    аргументы и исключение не уходят в другой поток.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        update = current_update.get()
+        if update is not None:
+            record.update_id = update.update_id
+            record.user_id = update.user_id
+            record.router = update.router
+            record.handler = update.handler
+            record.elapsed_ms = round(update.elapsed() * 1000, 2)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение, контекст апдейта, extra."""
+
+    def __init__(self, process_name: str = ""):
+        super().__init__()
+        self.process_name = process_name
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if self.process_name:
+            payload["process"] = self.process_name
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def build_file_handler(
+    path: str,
+    fmt: str = LOG_FORMAT,
+    max_bytes: int = LOG_MAX_BYTES,
+    backup_count: int = LOG_BACKUP_COUNT,
+    compress: bool = LOG_COMPRESS,
+    process_name: str = "",
+) -> RotatingFileHandler:
+    """
+    Файловый хендлер с ротацией по размеру. compress=True — старые файлы
+    сжимаются в bot.log.1.gz, bot.log.2.gz, ... (сжатие идёт в потоке слушателя).
+    """
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    if compress:
+        handler.namer = lambda name: name + ".gz"
+        handler.rotator = _gzip_rotator
+    handler.setFormatter(JsonFormatter(process_name) if fmt == "json" else text_formatter(process_name))
+    return handler
+
+
+def start_queue_logging(handlers: List[logging.Handler], level: str = LOG_LEVEL) -> QueueListener:
+    """
+    Подключает к корневому логгеру очередь, которую разбирает QueueListener
+    с переданными хендлерами. Предыдущая конфигурация снимается.
+    """
+    global _listener, _queue_handler
+    stop_logging()
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _queue_handler = ContextQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def setup_logging(process_name: str = "bot") -> None:
+    """
+    Настраивает логирование процесса: файл LOG_DIR/<process_name>.log
+    (JSON или текст) и консоль, запись — в потоке QueueListener.
+    Воркеры супервизора пишут каждый в свой файл.
+    """
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = build_file_handler(os.path.join(LOG_DIR, f"{process_name}.log"), process_name=process_name)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(text_formatter(process_name if process_name != "bot" else ""))
+    start_queue_logging([file_handler, console_handler])
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+    logging.info("Логирование инициализировано: %s", file_handler.baseFilename)
+
+
+def stop_logging() -> None:
+    """
+    Дописывает оставшиеся в очереди записи и останавливает поток записи.
+    Записи после остановки уходят в stderr (logging.lastResort).
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    logging.getLogger().removeHandler(_queue_handler)
+    _queue_handler = None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -0,0 +1,304 @@
+"""
+Метрики бота в текстовом формате Prometheus.
+
+- счётчики, гистограммы и gauge без внешних зависимостей;
+- «спаны» — время БД и LLM внутри обработки апдейта: складываются
+  в гистограмму по типу и в разбивку по хендлеру (middlewares/metrics.py);
+- HTTP-сервер: GET /metrics и включение сэмплирующего профилировщика
+  на лету (POST /debug/profile/start, POST /debug/profile/stop).
+"""
+
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PORT, METRICS_TOKEN
+from services.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм, сек
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Registry:
+    """Набор метрик процесса; render() отдаёт их в формате Prometheus."""
+
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._stats: List[Tuple[str, str, Callable[[], dict]]] = []
+
+    def register(self, metric: "_Metric") -> None:
+        self._metrics.append(metric)
+
+    def register_stats(self, prefix: str, help_text: str, stats: Callable[[], dict]) -> None:
+        """
+        Экспортирует словарь stats() компонента (очередь отправки, планировщик LLM,
+        пул БД) как набор gauge: prefix_<ключ>.
+        """
+        self._stats.append((prefix, help_text, stats))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        for prefix, help_text, stats in self._stats:
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning("Не удалось снять метрики %s: %s", prefix, e)
+                continue
+            for key, value in values.items():
+                if not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# HELP {prefix}_{key} {help_text}: {key}")
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, value: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # key -> [счётчики по корзинам..., сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        data = self._values.get(key)
+        if data is None:
+            data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[i] += 1
+                break
+        data[-2] += value
+        data[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        data = self._values.get(self._key(labels))
+        return data[-1] if data else 0
+
+    def samples(self):
+        names = self.labelnames + ("le",)
+        for key, data in self._values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, data):
+                cumulative += n
+                yield f"{self.name}_bucket", _format_labels(names, key + (_format_value(bound),)), cumulative
+            yield f"{self.name}_bucket", _format_labels(names, key + ("+Inf",)), data[-1]
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, data[-2]
+            yield f"{self.name}_count", labels, data[-1]
+
+
+# --- Метрики бота ---
+
+handler_seconds = Histogram(
+    "bot_handler_seconds", "Время обработки апдейта хендлером", ("router", "handler"),
+)
+handler_errors = Counter(
+    "bot_handler_errors_total", "Необработанные исключения в хендлерах", ("router", "handler", "error"),
+)
+handler_span_seconds = Histogram(
+    "bot_handler_span_seconds", "Время БД/LLM за один апдейт", ("router", "handler", "span"),
+)
+span_seconds = Histogram(
+    "bot_span_seconds", "Длительность отдельных операций БД/LLM", ("span",),
+)
+fsm_transitions = Counter(
+    "bot_fsm_transitions_total", "Переходы между состояниями FSM", ("from_state", "to_state"),
+)
+llm_request_seconds = Histogram(
+    "bot_llm_request_seconds", "Длительность запросов к OpenAI", ("kind",),
+)
+llm_errors = Counter(
+    "bot_llm_errors_total", "Ошибки запросов к OpenAI", ("kind",),
+)
+llm_tokens = Counter(
+    "bot_llm_tokens_total", "Токены OpenAI", ("kind", "type"),
+)
+
+
+# --- Контекст текущего апдейта ---
+
+class UpdateContext:
+    """Апдейт, метки хендлера и накопленное время спанов (их же видят логи)."""
+
+    __slots__ = ("update_id", "user_id", "router", "handler", "spans", "started")
+
+    def __init__(self, update_id: Optional[int] = None, user_id: Optional[int] = None):
+        self.update_id = update_id
+        self.user_id = user_id
+        self.router = "-"
+        self.handler = "unhandled"
+        self.spans: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    def elapsed(self) -> float:
+        """Сколько секунд прошло с начала обработки апдейта."""
+        return time.perf_counter() - self.started
+
+
+current_update: ContextVar[Optional[UpdateContext]] = ContextVar("current_update", default=None)
+
+
+def record_span(kind: str, seconds: float) -> None:
+    """Учитывает операцию kind (db, llm) длительностью seconds."""
+    span_seconds.observe(seconds, span=kind)
+    update = current_update.get()
+    if update is not None:
+        update.spans[kind] = update.spans.get(kind, 0.0) + seconds
+
+
+@contextmanager
+def span(kind: str):
+    """
+    Замеряет блок как спан:
+
+        with span("llm"):
+            response = await client.chat.completions.create(...)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(kind, time.perf_counter() - started)
+
+
+def observe_llm_usage(kind: str, usage) -> None:
+    """Учитывает токены из response.usage (если API их вернул)."""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, kind=kind, type="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, kind=kind, type="completion")
+
+
+# --- HTTP-эндпоинт ---
+
+class MetricsServer:
+    """
+    Небольшой aiohttp-сервер метрик. port=0 — выключен.
+    Если задан METRICS_TOKEN, запросы должны нести заголовок
+    Authorization: Bearer <токен>.
+    """
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT, token: str = METRICS_TOKEN):
+        self.host = host
+        self.port = port
+        self.token = token
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        @web.middleware
+        async def check_token(request: web.Request, handler):
+            if self.token and request.headers.get("Authorization") != f"Bearer {self.token}":
+                return web.Response(status=401, text="unauthorized\n")
+            return await handler(request)
+
+        async def metrics(request: web.Request) -> web.Response:
+            return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+        async def profile_start(request: web.Request) -> web.Response:
+            interval = float(request.query.get("interval", profiler.interval))
+            profiler.start(interval)
+            return web.Response(text=f"profiler started, interval {profiler.interval}s\n")
+
+        async def profile_stop(request: web.Request) -> web.Response:
+            profiler.stop()
+            return web.Response(text=profiler.report(int(request.query.get("limit", 0))))
+
+        async def profile_report(request: web.Request) -> web.Response:
+            return web.Response(text=profiler.report(int(request.query.get("limit", 0))))
+
+        app = web.Application(middlewares=[check_token])
+        app.router.add_get("/metrics", metrics)
+        app.router.add_post("/debug/profile/start", profile_start)
+        app.router.add_post("/debug/profile/stop", profile_stop)
+        app.router.add_get("/debug/profile", profile_report)
+        return app
+
+    async def start(self) -> None:
+        if not self.port or self._runner is not None:
+            return
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("📈 Метрики: http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        profiler.stop()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer()
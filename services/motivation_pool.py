@@ -0,0 +1,136 @@
+"""
+Пул заранее сгенерированных мотивационных фраз.
+
+Фразы генерируются пачками (несколько штук за один запрос к API) фоновой
+задачей, когда пул опускается ниже нижней отметки. Хендлер берёт готовую
+фразу из памяти и отвечает сразу, без ожидания ChatGPT.
+"""
+
+import random
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, List, Optional
+
+from config import (
+    MOTIVATION_BATCH_SIZE,
+    MOTIVATION_HISTORY_SIZE,
+    MOTIVATION_POOL_LOW_WATER,
+    MOTIVATION_POOL_SIZE,
+)
+from services.chatgpt import generate_motivation_phrases
+
+logger = logging.getLogger(__name__)
+
+# Запасные фразы — если пул пуст, а API недоступен
+FALLBACK_PHRASES = [
+    "Сегодня отличный день для успеха! 💪",
+    "Каждый звонок приближает тебя к сделке! 📞",
+    "Отказ — это шаг к следующему «да»! 🚀",
+    "Лучшие продажи случаются у тех, кто не сдаётся! 🔥",
+]
+
+
+class MotivationPool:
+    """
+    Пул фраз с фоновым пополнением и защитой от повторов для пользователя.
+
+    generate_batch(n) — корутина, возвращающая до n новых фраз,
+    capacity — до скольких фраз пополняем пул,
+    low_water — ниже этого числа запускается пополнение,
+    history_size — сколько последних фраз пользователя не повторять.
+    """
+
+    def __init__(
+        self,
+        generate_batch: Callable[[int], Awaitable[List[str]]],
+        capacity: int = MOTIVATION_POOL_SIZE,
+        low_water: int = MOTIVATION_POOL_LOW_WATER,
+        batch_size: int = MOTIVATION_BATCH_SIZE,
+        history_size: int = MOTIVATION_HISTORY_SIZE,
+        max_users: int = 10000,
+        cold_wait: float = 10.0,
+    ):
+        self.generate_batch = generate_batch
+        self.capacity = capacity
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self.history_size = history_size
+        self.max_users = max_users
+        self.cold_wait = cold_wait
+        self._phrases: Deque[str] = deque()
+        self._history: "OrderedDict[int, Deque[str]]" = OrderedDict()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._refilled = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    def start(self) -> None:
+        """Запускает первичное наполнение пула (вызывается при старте бота)."""
+        self._schedule_refill()
+
+    async def stop(self) -> None:
+        if self._refill_task and not self._refill_task.done():
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+
+    def _schedule_refill(self) -> None:
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self) -> None:
+        """
+        Догенерирует фразы пачками, пока пул не заполнится.
+        Если API вернул пустую пачку (ошибка) — прекращаем до следующего запроса.
+        """
+        while len(self._phrases) < self.capacity:
+            batch = await self.generate_batch(self.batch_size)
+            fresh = [p for p in batch if p not in self._phrases]
+            if not fresh:
+                break
+            self._phrases.extend(fresh)
+            self._refilled.set()
+            logger.info("Пул мотивации пополнен: +%s, всего %s", len(fresh), len(self._phrases))
+        self._refilled.set()
+
+    async def get(self, user_id: int) -> str:
+        """
+        Возвращает фразу для пользователя, не совпадающую с его последними фразами.
+        """
+        if len(self._phrases) < self.low_water:
+            self._schedule_refill()
+        if not self._phrases:
+            # Холодный пул (сразу после старта) — ждём первую пачку, но недолго
+            self._refilled.clear()
+            try:
+                await asyncio.wait_for(self._refilled.wait(), timeout=self.cold_wait)
+            except asyncio.TimeoutError:
+                pass
+
+        history = self._history.get(user_id)
+        if history is None:
+            history = self._history[user_id] = deque(maxlen=self.history_size)
+            while len(self._history) > self.max_users:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(user_id)
+
+        phrase = self._take(history)
+        history.append(phrase)
+        return phrase
+
+    def _take(self, history: Deque[str]) -> str:
+        for phrase in self._phrases:
+            if phrase not in history:
+                self._phrases.remove(phrase)
+                return phrase
+        candidates = [p for p in FALLBACK_PHRASES if p not in history] or FALLBACK_PHRASES
+        return random.choice(candidates)
+
+
+# Общий пул бота
+motivation_pool = MotivationPool(generate_motivation_phrases)
@@ -0,0 +1,75 @@
+"""
+Сэмплирующий профилировщик: фоновый поток раз в interval секунд снимает
+стек потока event loop. Включается на лету (см. services/metrics.py),
+накладных расходов, пока выключен, нет.
+
+Отчёт — «свёрнутые» стеки (collapsed stacks): строка «f1;f2;f3 N»
+на каждый стек, формат flamegraph.pl и speedscope.
+"""
+
+import sys
+import logging
+import threading
+from collections import Counter
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    interval — период сэмплирования, сек; max_depth — сколько кадров стека хранить.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._target: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: Optional[float] = None, thread_id: Optional[int] = None) -> None:
+        """Начинает сэмплирование потока thread_id (по умолчанию — текущего)."""
+        if self.running:
+            return
+        if interval:
+            self.interval = max(0.001, interval)
+        self._target = thread_id or threading.get_ident()
+        self.samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info("Профилировщик включён, интервал %s сек", self.interval)
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        logger.info("Профилировщик выключен, сэмплов: %s", sum(self.samples.values()))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def report(self, limit: int = 0) -> str:
+        """Свёрнутые стеки, самые частые первыми; limit=0 — все."""
+        top = self.samples.most_common(limit or None)
+        return "".join(f"{stack} {count}\n" for stack, count in top)
+
+
+# Профилировщик процесса
+profiler = SamplingProfiler()
@@ -0,0 +1,56 @@
+"""
+Token bucket — общий примитив ограничения частоты (запросы к OpenAI, отправка в Telegram).
+"""
+
+import time
+import asyncio
+
+
+class TokenBucket:
+    """
+    rate — токенов в секунду, capacity — максимальный запас (размер всплеска).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, n: float = 1) -> float:
+        """Через сколько секунд станет доступно n токенов (0 — уже доступно)."""
+        self._refill()
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+    def try_take(self, n: float = 1) -> bool:
+        """Забирает n токенов, если они есть прямо сейчас."""
+        if self.delay(n) > 0:
+            return False
+        self.tokens -= n
+        return True
+
+    def reserve(self, n: float = 1) -> float:
+        """
+        Резервирует n токенов (баланс может уйти в минус) и возвращает,
+        сколько секунд нужно подождать. Очерёдность ожидающих сохраняется.
+        """
+        self._refill()
+        self.tokens -= n
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, n: float = 1) -> None:
+        """Возвращает зарезервированные, но не использованные токены."""
+        self.tokens = min(self.capacity, self.tokens + n)
+
+    async def take(self, n: float = 1) -> None:
+        """Ждёт и забирает n токенов."""
+        wait = self.reserve(n)
+        if wait:
+            await asyncio.sleep(wait)
@@ -0,0 +1,291 @@
+"""
+Напоминания о задачах по сроку tasks.due_at.
+
+Планировщик не опрашивает таблицу: он загружает окно ближайших
+напоминаний (due_at раньше now + REMINDER_WINDOW, не больше
+REMINDER_WINDOW_LIMIT строк) в кучу и спит до ближайшего срока.
+Следующее окно читается по ключу (due_at, id) с места, где закончилось
+предыдущее, по частичному индексу ix_tasks_due_pending. Памяти нужно
+не больше одного окна, сколько бы напоминаний ни ждало в таблице.
+
+Перед отправкой напоминания «забираются» одним UPDATE ... RETURNING
+(reminded_at IS NULL), поэтому несколько реплик не шлют одно и то же.
+Задача, созданная в этом процессе со сроком внутри уже загруженного окна,
+попадает в кучу через notify().
+
+После рестарта просроченные напоминания отправляются с темпом
+REMINDER_CATCHUP_RATE в секунду, а не все разом; просроченные больше
+чем на REMINDER_MAX_LATENESS помечаются без отправки.
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import and_, or_, select, update
+
+from config import (
+    REMINDER_CATCHUP_RATE,
+    REMINDER_MAX_LATENESS,
+    REMINDER_RETRY_DELAY,
+    REMINDER_WINDOW,
+    REMINDER_WINDOW_LIMIT,
+)
+from database.db import async_session
+from database.models import Task, User
+from services.due_time import as_utc
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Статус, при котором напоминание уже не нужно
+TASK_DONE = "Выполнена"
+# Сколько напоминаний забирать одним UPDATE
+CLAIM_BATCH = 100
+# Запас, с которым читается следующее окно, сек (не больше 1/10 окна)
+LOAD_AHEAD = 5.0
+
+# (время отправки, id задачи, chat_id, название, время задачи)
+_Entry = Tuple[float, int, int, str, str]
+
+
+class ReminderScheduler:
+    """
+    Куча напоминаний текущего окна и фоновая задача, которая их отправляет.
+
+    shard = (index, count) — в режиме supervisor воркер берёт только
+    пользователей своего шарда (tg_id % count == index), как и апдейты.
+    """
+
+    def __init__(
+        self,
+        window: float = REMINDER_WINDOW,
+        limit: int = REMINDER_WINDOW_LIMIT,
+        catchup_rate: float = REMINDER_CATCHUP_RATE,
+        max_lateness: float = REMINDER_MAX_LATENESS,
+        retry_delay: float = REMINDER_RETRY_DELAY,
+    ):
+        self.window = window
+        self.limit = limit
+        self.catchup_rate = catchup_rate
+        self.max_lateness = max_lateness
+        self.retry_delay = retry_delay
+        self.load_ahead = min(LOAD_AHEAD, window / 10)
+        self.shard: Optional[Tuple[int, int]] = None
+        self.bot: Optional[Bot] = None
+        self._heap: List[_Entry] = []
+        # Ключ (due_at, id), до которого таблица уже прочитана
+        self._loaded_until: Optional[Tuple[datetime, int]] = None
+        # Окно обрезано лимитом: следующее читаем, когда куча опустеет
+        self._window_full = False
+        self._next_catchup = 0.0
+        # Меняется при rescan(): окно, прочитанное до него, отбрасывается
+        self._generation = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # --- метрики ---
+        self.loads = 0
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def start(self, bot: Bot) -> None:
+        """Запускает фоновую задачу (вызывается при старте бота)."""
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._heap.clear()
+            self._loaded_until = None
+            self._window_full = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def notify(self, task_id: int, chat_id: int, title: str, time_text: str, due_at: Optional[datetime]) -> None:
+        """
+        Сообщает о новой задаче. Если её срок попадает в уже прочитанную
+        часть таблицы, напоминание сразу кладётся в кучу; иначе его
+        загрузит одно из следующих окон.
+        """
+        if self._task is None or due_at is None or self._loaded_until is None:
+            return
+        if (due_at, task_id) > self._loaded_until:
+            return
+        self._push(due_at, task_id, chat_id, title, time_text, time.time())
+        self._wakeup.set()
+
+    def rescan(self) -> None:
+        """
+        Перечитывает окно с начала — после массовой вставки задач
+        (импорт), чьи сроки могли попасть в уже прочитанную часть таблицы.
+        """
+        if self._task is None:
+            return
+        self._generation += 1
+        self._heap.clear()
+        self._loaded_until = None
+        self._window_full = False
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._heap),
+            "loads": self.loads,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
+
+    # --- внутреннее ---
+
+    def _push(self, due_at: datetime, task_id: int, chat_id: int, title: str, time_text: str, now: float) -> None:
+        fire_at = due_at.timestamp()
+        if fire_at <= now:
+            # Пропущенное напоминание — в очередь догоняющих с заданным темпом
+            fire_at = max(now, self._next_catchup)
+            self._next_catchup = fire_at + 1 / self.catchup_rate
+        heapq.heappush(self._heap, (fire_at, task_id, chat_id, title, time_text))
+
+    def _should_load(self, now: float) -> bool:
+        if self._loaded_until is None:
+            return True
+        if self._window_full:
+            return not self._heap
+        return now >= self._loaded_until[0].timestamp() - self.load_ahead
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                now = time.time()
+                if self._should_load(now):
+                    await self._load_window(now)
+                    continue
+                if self._heap and self._heap[0][0] <= now:
+                    await self._fire_due(now)
+                    continue
+                await self._sleep(now)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ошибка планировщика напоминаний")
+                await asyncio.sleep(self.retry_delay)
+
+    async def _sleep(self, now: float) -> None:
+        wake_at = self._heap[0][0] if self._heap else float("inf")
+        if not self._window_full:
+            wake_at = min(wake_at, self._loaded_until[0].timestamp() - self.load_ahead)
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, wake_at - now))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _load_window(self, now: float) -> None:
+        """Читает следующее окно напоминаний в кучу."""
+        horizon = datetime.fromtimestamp(now + self.window, timezone.utc)
+        stmt = (
+            select(Task.id, Task.title, Task.time, Task.due_at, User.tg_id)
+            .join(User, User.id == Task.user_id)
+            .where(
+                Task.due_at.is_not(None),
+                Task.reminded_at.is_(None),
+                Task.due_at < horizon,
+                Task.status != TASK_DONE,
+            )
+            .order_by(Task.due_at, Task.id)
+            .limit(self.limit)
+        )
+        if self._loaded_until is not None:
+            due_at, task_id = self._loaded_until
+            stmt = stmt.where(or_(Task.due_at > due_at, and_(Task.due_at == due_at, Task.id > task_id)))
+        if self.shard is not None:
+            index, count = self.shard
+            stmt = stmt.where(User.tg_id % count == index)
+
+        generation = self._generation
+        async with async_session() as session:
+            rows = (await session.execute(stmt)).all()
+        if generation != self._generation:
+            return
+
+        self.loads += 1
+        stale: List[int] = []
+        for task_id, title, time_text, due_at, chat_id in rows:
+            due_at = as_utc(due_at)
+            if due_at.timestamp() < now - self.max_lateness:
+                stale.append(task_id)
+            else:
+                self._push(due_at, task_id, chat_id, title, time_text, now)
+
+        self._window_full = len(rows) >= self.limit
+        if self._window_full:
+            task_id, due_at = rows[-1][0], as_utc(rows[-1][3])
+            self._loaded_until = (due_at, task_id)
+        else:
+            self._loaded_until = (horizon, 0)
+        if stale:
+            await self._claim(stale)
+            self.skipped += len(stale)
+            logger.info("Пропущено устаревших напоминаний: %s", len(stale))
+        if rows:
+            logger.debug("Окно напоминаний: %s строк до %s", len(rows), self._loaded_until[0])
+
+    async def _claim(self, task_ids: List[int]) -> List[int]:
+        """Помечает напоминания отправленными; возвращает те, что забрал этот процесс."""
+        stmt = (
+            update(Task)
+            .where(Task.id.in_(task_ids), Task.reminded_at.is_(None), Task.status != TASK_DONE)
+            .values(reminded_at=datetime.now(timezone.utc))
+            .returning(Task.id)
+        )
+        async with async_session() as session:
+            claimed = (await session.execute(stmt)).scalars().all()
+            await session.commit()
+        return list(claimed)
+
+    async def _release(self, task_id: int) -> None:
+        async with async_session() as session:
+            await session.execute(update(Task).where(Task.id == task_id).values(reminded_at=None))
+            await session.commit()
+
+    async def _fire_due(self, now: float) -> None:
+        """Забирает и отправляет все наступившие напоминания (пачками по CLAIM_BATCH)."""
+        batch: List[_Entry] = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < CLAIM_BATCH:
+            batch.append(heapq.heappop(self._heap))
+        claimed = set(await self._claim([entry[1] for entry in batch]))
+        entries = [entry for entry in batch if entry[1] in claimed]
+        await asyncio.gather(*(self._send(entry) for entry in entries))
+
+    async def _send(self, entry: _Entry) -> None:
+        _, task_id, chat_id, title, time_text = entry
+        try:
+            await self.bot.send_message(chat_id, f"⏰ Напоминание: {title}\n• Время: {time_text}")
+            self.sent += 1
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Бот заблокирован или чат недоступен — повторять бессмысленно
+            self.failed += 1
+            logger.info("Напоминание %s не доставлено: %s", task_id, e)
+        except Exception:
+            self.failed += 1
+            logger.exception("Ошибка отправки напоминания %s, повтор через %s с", task_id, self.retry_delay)
+            await self._release(task_id)
+            heapq.heappush(self._heap, (time.time() + self.retry_delay, *entry[1:]))
+            self._wakeup.set()
+
+
+# Общий планировщик напоминаний бота
+reminder_scheduler = ReminderScheduler()
+registry.register_stats("bot_reminders", "Планировщик напоминаний о задачах", reminder_scheduler.stats)
@@ -0,0 +1,129 @@
+"""
+Индекс диспетчеризации: кнопки меню и inline-кнопки находятся по ключу.
+
+aiogram проверяет хендлеры по очереди — роутер за роутером, фильтр за
+фильтром, — и стоимость апдейта растёт с числом хендлеров. Нажатия кнопок
+(большая часть апдейтов) ищутся в словаре:
+- сообщение — по точному тексту кнопки меню (keyboards/reply.py);
+- callback — по префиксу callback_data до первого «:»
+  (фабрики keyboards/callbacks.py), данные разбираются один раз.
+
+Роутеры разделов — IndexedRouter: хендлеры кнопок регистрируются через
+router.button(...) и router.callback(...). build_dispatch_index() сводит
+их в один словарь на тип апдейта (повтор ключа — ошибка при старте) и
+возвращает роутер, который подключается к диспетчеру первым. Команды и
+шаги FSM проверяются как раньше — если ключа в индексе нет.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Optional, Type
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import FilterObject, HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.filters import Filter
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+
+def _message_key(message: Message) -> Optional[str]:
+    return message.text
+
+
+def _callback_key(query: CallbackQuery) -> Optional[str]:
+    return query.data.partition(":")[0] if query.data else None
+
+
+def _handler_object(callback: Callable, filters: Iterable[Any], flags: Optional[Dict[str, Any]]) -> HandlerObject:
+    """HandlerObject, как его собирает TelegramEventObserver.register."""
+    flags = dict(flags or {})
+    for item in filters:
+        if isinstance(item, Filter):
+            item.update_handler_flags(flags=flags)
+    return HandlerObject(callback=callback, filters=[FilterObject(item) for item in filters], flags=flags)
+
+
+def _add(index: Dict[str, HandlerObject], key: str, handler: HandlerObject) -> None:
+    if key in index:
+        raise ValueError(
+            f"Ключ {key!r} уже занят хендлером {index[key].callback.__module__}.{index[key].callback.__name__}"
+        )
+    index[key] = handler
+
+
+class IndexedRouter(Router):
+    """Роутер раздела: кроме обычных хендлеров — хендлеры кнопок для индекса."""
+
+    def __init__(self, *, name: Optional[str] = None):
+        super().__init__(name=name)
+        self.buttons: Dict[str, HandlerObject] = {}
+        self.callbacks: Dict[str, HandlerObject] = {}
+
+    def button(self, text: str, *filters: Any, flags: Optional[Dict[str, Any]] = None):
+        """Хендлер кнопки меню с точным текстом text (вместо F.text == text)."""
+        def wrapper(callback: Callable) -> Callable:
+            _add(self.buttons, text, _handler_object(callback, filters, flags))
+            return callback
+        return wrapper
+
+    def callback(self, factory: Type[CallbackData], *filters: Any, flags: Optional[Dict[str, Any]] = None):
+        """Хендлер inline-кнопки фабрики factory; разобранные данные — в аргументе callback_data."""
+        def wrapper(callback: Callable) -> Callable:
+            _add(self.callbacks, factory.__prefix__, _handler_object(callback, (factory.filter(), *filters), flags))
+            return callback
+        return wrapper
+
+
+class IndexedObserver(TelegramEventObserver):
+    """
+    Наблюдатель, который выбирает хендлер по ключу апдейта, а не перебором.
+    Middleware родительских роутеров (UserIdMiddleware, метки метрик)
+    применяются как к обычным хендлерам.
+    """
+
+    def __init__(self, router: Router, event_name: str, key: Callable[[TelegramObject], Optional[str]]):
+        super().__init__(router=router, event_name=event_name)
+        self.key = key
+        self.index: Dict[str, HandlerObject] = {}
+
+    def add(self, key: str, handler: HandlerObject) -> None:
+        _add(self.index, key, handler)
+        # handlers не пуст — диспетчер учитывает тип апдейта в allowed_updates
+        self.handlers.append(handler)
+
+    async def trigger(self, event: TelegramObject, **kwargs: Any) -> Any:
+        key = self.key(event)
+        handler = self.index.get(key) if key is not None else None
+        if handler is None:
+            return UNHANDLED
+        kwargs["handler"] = handler
+        result, data = await handler.check(event, **kwargs)
+        if not result:
+            return UNHANDLED
+        kwargs.update(data)
+        try:
+            wrapped_inner = self.outer_middleware.wrap_middlewares(self._resolve_middlewares(), handler.call)
+            return await wrapped_inner(event, kwargs)
+        except SkipHandler:
+            return UNHANDLED
+
+
+def build_dispatch_index(routers: Iterable[Router]) -> Router:
+    """
+    Роутер-индекс для кнопок всех IndexedRouter из routers (и их подроутеров).
+    Подключается к диспетчеру раньше роутеров разделов.
+    """
+    index = Router(name="dispatch_index")
+    messages = IndexedObserver(index, "message", _message_key)
+    callbacks = IndexedObserver(index, "callback_query", _callback_key)
+    index.message = index.observers["message"] = messages
+    index.callback_query = index.observers["callback_query"] = callbacks
+
+    for router in routers:
+        for sub_router in router.chain_tail:
+            if isinstance(sub_router, IndexedRouter):
+                for text, handler in sub_router.buttons.items():
+                    messages.add(text, handler)
+                for prefix, handler in sub_router.callbacks.items():
+                    callbacks.add(prefix, handler)
+    return index
@@ -0,0 +1,242 @@
+"""
+Семантический кэш ответов ChatGPT на базе FAISS.
+
+Вопрос превращается в эмбеддинг, в индексе ищется ближайший сохранённый
+вопрос; если косинусная близость выше порога — возвращается готовый ответ
+без обращения к API. Размер кэша ограничен (вытесняется давно не
+использованная запись — LRU), содержимое сохраняется на диск.
+
+faiss и numpy импортируются при первом обращении к кэшу, а не при импорте
+модуля: бот стартует без них, а если кэш выключен — не грузит их вовсе.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional, Protocol
+
+from services.metrics import observe_llm_usage, span
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class Embedder(Protocol):
+    """Интерфейс эмбеддера: dim — размерность, embed — вектор для текста."""
+
+    dim: int
+
+    async def embed(self, text: str) -> "np.ndarray": ...
+
+
+def _normalize(vector: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    vector = np.asarray(vector, dtype="float32").reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class OpenAIEmbedder:
+    """
+    Эмбеддинги через OpenAI Embeddings API.
+    get_client — корутина, возвращающая клиента AsyncOpenAI: клиент
+    создаётся при первом эмбеддинге, а подмена клиента видна сразу.
+    """
+
+    def __init__(self, get_client: Callable[[], Awaitable[Any]], model: str = "text-embedding-3-small", dim: int = 1536):
+        self.get_client = get_client
+        self.model = model
+        self.dim = dim
+
+    async def embed(self, text: str) -> "np.ndarray":
+        client = await self.get_client()
+        with span("llm"):
+            response = await client.embeddings.create(model=self.model, input=text)
+        observe_llm_usage("embedding", getattr(response, "usage", None))
+        return _normalize(response.data[0].embedding)
+
+
+class HashingEmbedder:
+    """
+    Детерминированный локальный эмбеддер: хеширование символьных n-грамм.
+    Работает без сети — для тестов и офлайн-запуска.
+    """
+
+    def __init__(self, dim: int = 256, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+
+    async def embed(self, text: str) -> "np.ndarray":
+        import numpy as np
+
+        vector = np.zeros(self.dim, dtype="float32")
+        padded = f" {text} "
+        for i in range(max(len(padded) - self.ngram + 1, 1)):
+            gram = padded[i:i + self.ngram].encode("utf-8")
+            digest = int.from_bytes(hashlib.blake2b(gram, digest_size=8).digest(), "little")
+            sign = 1.0 if digest & 1 else -1.0
+            vector[(digest >> 1) % self.dim] += sign
+        return _normalize(vector)
+
+
+class SemanticCache:
+    """
+    Кэш «вопрос -> ответ» с поиском ближайшего соседа в FAISS.
+
+    threshold — минимальная косинусная близость для попадания,
+    max_size — предел числа записей (LRU-вытеснение),
+    path — префикс файлов на диске (<path>.index и <path>.json).
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        threshold: float = 0.92,
+        max_size: int = 1000,
+        path: Optional[Path] = None,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_size = max_size
+        self.path = Path(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        # Индекс создаётся при первой записи (_get_index)
+        self._index = None
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_id = 0
+
+    def _get_index(self):
+        if self._index is None:
+            import faiss
+
+            # IndexIDMap2 поверх точного IP-индекса: векторы нормированы,
+            # скалярное произведение = косинусная близость; id позволяют удалять
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.embedder.dim))
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    async def embed(self, question: str) -> "np.ndarray":
+        return _normalize(await self.embedder.embed(self.normalize_question(question)))
+
+    def search(self, vector: "np.ndarray") -> Optional[str]:
+        """
+        Возвращает закэшированный ответ для ближайшего вопроса
+        или None, если ничего достаточно похожего нет.
+        """
+        if self._entries:
+            scores, ids = self._index.search(vector.reshape(1, -1), 1)
+            entry_id, score = int(ids[0][0]), float(scores[0][0])
+            if entry_id != -1 and score >= self.threshold:
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return self._entries[entry_id]["answer"]
+        self.misses += 1
+        return None
+
+    def add(self, question: str, answer: str, vector: "np.ndarray") -> None:
+        """
+        Добавляет ответ в кэш, вытесняя давно не использованные записи.
+        """
+        import numpy as np
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self._get_index().add_with_ids(vector.reshape(1, -1), np.array([entry_id], dtype="int64"))
+        self._entries[entry_id] = {"question": question, "answer": answer}
+        self._evict()
+
+    def _evict(self) -> None:
+        import numpy as np
+
+        while len(self._entries) > self.max_size:
+            evicted_id, _ = self._entries.popitem(last=False)
+            self._index.remove_ids(np.array([evicted_id], dtype="int64"))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    # --- Сохранение на диск ---
+
+    def save(self) -> None:
+        """
+        Сохраняет индекс и записи на диск (атомарно, через временные файлы).
+        Если кэш не загружался и в него ничего не добавлялось, файлы на диске
+        не трогаются.
+        """
+        if self.path is None or self._index is None:
+            return
+        import faiss
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        index_path = self.path.with_suffix(".index")
+        meta_path = self.path.with_suffix(".json")
+
+        faiss.write_index(self._index, str(index_path) + ".tmp")
+        with open(str(meta_path) + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "dim": self.embedder.dim,
+                    "next_id": self._next_id,
+                    # порядок записей = порядок LRU (от старых к свежим)
+                    "entries": [[entry_id, e["question"], e["answer"]] for entry_id, e in self._entries.items()],
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(str(index_path) + ".tmp", index_path)
+        os.replace(str(meta_path) + ".tmp", meta_path)
+        logger.info("Семантический кэш сохранён: %s записей", len(self._entries))
+
+    def load(self) -> None:
+        """
+        Загружает кэш с диска (тёплый рестарт). Если файлов нет или
+        размерность эмбеддера изменилась — начинаем с пустого кэша.
+        """
+        if self.path is None:
+            return
+        index_path = self.path.with_suffix(".index")
+        meta_path = self.path.with_suffix(".json")
+        if not (index_path.exists() and meta_path.exists()):
+            return
+        try:
+            import faiss
+
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["dim"] != self.embedder.dim:
+                logger.warning("Размерность эмбеддера изменилась — семантический кэш сброшен.")
+                return
+            self._index = faiss.read_index(str(index_path))
+            self._entries = OrderedDict(
+                (entry_id, {"question": question, "answer": answer})
+                for entry_id, question, answer in meta["entries"]
+            )
+            self._next_id = meta["next_id"]
+            self._evict()
+        except Exception as e:
+            logger.error(f"Не удалось загрузить семантический кэш: {e}")
+            self._reset()
+            return
+        logger.info("Семантический кэш загружен: %s записей", len(self._entries))
@@ -0,0 +1,331 @@
+"""
+Очередь исходящих запросов к Telegram.
+
+Подключается как request-middleware сессии бота, поэтому хендлеры
+по-прежнему вызывают message.answer / edit_text как обычно:
+
+- token bucket на чат и общий на бота (лимиты Telegram ~1 сообщение/с
+  в чат, 20/мин в группу, ~30/с всего);
+- приоритеты: ответы на нажатия кнопок идут первыми, большие списки —
+  последними (см. send_priority);
+- в одном чате одновременно выполняется один запрос — порядок сохраняется;
+- RetryAfter: чат ставится на паузу, запрос повторяется автоматически;
+- правки одного и того же сообщения, ещё не ушедшие в Telegram,
+  склеиваются в одну (уходит последняя);
+- метрики: задержка в очереди, число склеенных правок и повторов.
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Hashable, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    AnswerCallbackQuery,
+    DeleteMessage,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    SendChatAction,
+    SendDocument,
+    SendMessage,
+    TelegramMethod,
+)
+
+from config import (
+    SEND_CHAT_BURST,
+    SEND_CHAT_RATE,
+    SEND_GLOBAL_RATE,
+    SEND_GROUP_RATE_PER_MIN,
+    SEND_MAX_RETRIES,
+)
+from services.metrics import registry
+from services.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# --- Приоритеты (меньше — раньше) ---
+PRIORITY_HIGH = 0     # ответы на нажатия кнопок
+PRIORITY_NORMAL = 1   # обычные ответы и правки
+PRIORITY_LOW = 2      # большие списки
+
+# Через очередь идут только запросы, которые что-то отправляют в чат;
+# getUpdates, getMe и т.п. выполняются напрямую
+QUEUED_METHODS = (
+    AnswerCallbackQuery,
+    DeleteMessage,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    SendChatAction,
+    SendDocument,
+    SendMessage,
+)
+# Правки, которые можно склеивать
+COALESCED_METHODS = (EditMessageText, EditMessageReplyMarkup)
+
+_priority: ContextVar[Optional[int]] = ContextVar("send_priority", default=None)
+
+
+@contextmanager
+def send_priority(priority: int):
+    """
+    Задаёт приоритет запросов, отправленных внутри блока:
+
+        with send_priority(PRIORITY_LOW):
+            await message.answer(big_list, reply_markup=markup)
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Job:
+    __slots__ = ("make_request", "bot", "method", "chat_id", "priority", "future", "enqueued", "attempts")
+
+    def __init__(self, make_request, bot: Bot, method: TelegramMethod, chat_id, priority: int):
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.chat_id = chat_id
+        self.priority = priority
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+class SendQueue(BaseRequestMiddleware):
+    """
+    global_rate — запросов в секунду на бота,
+    chat_rate / chat_burst — лимит личного чата,
+    group_rate_per_min — лимит группового чата,
+    max_retries — сколько раз повторять запрос после RetryAfter.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        chat_rate: float = SEND_CHAT_RATE,
+        chat_burst: int = SEND_CHAT_BURST,
+        group_rate_per_min: float = SEND_GROUP_RATE_PER_MIN,
+        max_retries: int = SEND_MAX_RETRIES,
+        max_chats: int = 10000,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_min / 60
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+
+        self._lanes: List[Deque[_Job]] = [deque() for _ in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)]
+        self._buckets: "OrderedDict[Any, TokenBucket]" = OrderedDict()
+        self._paused_until: Dict[Any, float] = {}   # чат -> до какого момента ждать после RetryAfter
+        self._global_paused_until = 0.0
+        self._busy: set = set()                     # чаты, в которых запрос уже выполняется
+        self._pending_edits: Dict[Hashable, _Job] = {}
+        self._sending: set = set()
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+
+        # --- метрики ---
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    # --- Вход: request-middleware ---
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        if not isinstance(method, QUEUED_METHODS):
+            return await make_request(bot, method)
+
+        edit_key = self._edit_key(method)
+        if edit_key is not None:
+            job = self._pending_edits.get(edit_key)
+            if job is not None and type(job.method) is type(method):
+                # Прошлая правка ещё в очереди — отправим только последнюю
+                job.method = method
+                self.coalesced += 1
+                return await asyncio.shield(job.future)
+
+        priority = _priority.get()
+        if priority is None:
+            priority = PRIORITY_HIGH if isinstance(method, AnswerCallbackQuery) else PRIORITY_NORMAL
+        job = _Job(make_request, bot, method, getattr(method, "chat_id", None), priority)
+        if edit_key is not None:
+            self._pending_edits[edit_key] = job
+        self._lanes[priority].append(job)
+        self._ensure_worker()
+        self._wakeup.set()
+        return await asyncio.shield(job.future)
+
+    @staticmethod
+    def _edit_key(method: TelegramMethod) -> Optional[Hashable]:
+        if not isinstance(method, COALESCED_METHODS):
+            return None
+        if method.inline_message_id:
+            return method.inline_message_id
+        return method.chat_id, method.message_id
+
+    # --- Лимиты ---
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._buckets[chat_id] = bucket
+            while len(self._buckets) > self.max_chats:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(chat_id)
+        return bucket
+
+    def _chat_delay(self, job: _Job, now: float) -> float:
+        """Сколько ждать, пока чат задания сможет принять запрос (inf — в чате уже идёт запрос)."""
+        if job.chat_id is None:
+            return 0.0
+        if job.chat_id in self._busy:
+            return float("inf")
+        paused = self._paused_until.get(job.chat_id, 0.0) - now
+        if paused > 0:
+            return paused
+        self._paused_until.pop(job.chat_id, None)
+        if isinstance(job.method, (AnswerCallbackQuery, SendChatAction)):
+            # не сообщения в чат — под лимит чата не попадают
+            return 0.0
+        return self._bucket(job.chat_id).delay()
+
+    # --- Диспетчер очереди ---
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def _pick(self) -> "tuple[Optional[_Job], float]":
+        """
+        Выбирает первое готовое задание с наивысшим приоритетом.
+        Если готовых нет — возвращает, сколько ждать до ближайшего.
+        """
+        now = time.monotonic()
+        wait = float("inf")
+        for lane in self._lanes:
+            for job in lane:
+                delay = self._chat_delay(job, now)
+                if delay == 0:
+                    lane.remove(job)
+                    return job, 0.0
+                wait = min(wait, delay)
+        return None, wait
+
+    async def _run(self) -> None:
+        while True:
+            global_pause = self._global_paused_until - time.monotonic()
+            if global_pause > 0:
+                await asyncio.sleep(global_pause)
+            job, wait = self._pick()
+            if job is None:
+                self._wakeup.clear()
+                timeout = None if wait == float("inf") else wait
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if job.chat_id is not None and not isinstance(job.method, (AnswerCallbackQuery, SendChatAction)):
+                self._bucket(job.chat_id).try_take()
+            await self.global_bucket.take()
+
+            if job.chat_id is not None:
+                self._busy.add(job.chat_id)
+            task = asyncio.create_task(self._send(job))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, job: _Job) -> None:
+        edit_key = self._edit_key(job.method)
+        if edit_key is not None and self._pending_edits.get(edit_key) is job:
+            # С этого момента новые правки встают в очередь отдельно
+            del self._pending_edits[edit_key]
+        if job.attempts == 0:
+            waited = time.monotonic() - job.enqueued
+            self.latency_count += 1
+            self.latency_total += waited
+            self.latency_max = max(self.latency_max, waited)
+        job.attempts += 1
+        try:
+            result = await job.make_request(job.bot, job.method)
+        except TelegramRetryAfter as e:
+            self._on_retry_after(job, e)
+            return
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._busy.discard(job.chat_id)
+            self._wakeup.set()
+
+    def _on_retry_after(self, job: _Job, e: TelegramRetryAfter) -> None:
+        until = time.monotonic() + e.retry_after
+        if job.chat_id is None:
+            self._global_paused_until = max(self._global_paused_until, until)
+        else:
+            self._paused_until[job.chat_id] = until
+        if job.attempts > self.max_retries:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+        self.retried += 1
+        logger.warning("RetryAfter %s сек для чата %s — повторим запрос", e.retry_after, job.chat_id)
+        # Повтор встаёт в начало своей очереди, чтобы не обогнать более поздние запросы чата
+        self._lanes[job.priority].appendleft(job)
+
+    # --- Остановка и метрики ---
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(lane) for lane in self._lanes)
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Ждёт, пока уйдут запросы из очереди (вызывается при остановке бота)."""
+        deadline = time.monotonic() + timeout
+        while (self.queue_depth or self._sending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.queue_depth:
+            logger.warning("При остановке в очереди отправки осталось %s запросов", self.queue_depth)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": len(self._sending),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failed": self.failed,
+            "latency_avg": self.latency_total / self.latency_count if self.latency_count else 0.0,
+            "latency_max": self.latency_max,
+        }
+
+
+# Общая очередь отправки бота
+send_queue = SendQueue()
+registry.register_stats("bot_send_queue", "Очередь отправки в Telegram", send_queue.stats)
@@ -0,0 +1,43 @@
+"""
+Замер старта бота по этапам.
+
+bot.py записывает время импорта модулей, этапы прогрева в on_startup
+(схема БД, пул соединений, getMe, кэш советов — идут параллельно)
+и общее время старта. Итог пишется в лог одной строкой и отдаётся
+в /metrics как bot_startup_<этап>_seconds.
+"""
+
+import time
+from typing import Awaitable, Dict, TypeVar
+
+from services.metrics import registry
+
+T = TypeVar("T")
+
+
+class StartupTimer:
+    """Длительности этапов старта в порядке записи, сек."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = seconds
+
+    async def measure(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Дожидается awaitable и записывает, сколько это заняло."""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {f"{name}_seconds": seconds for name, seconds in self.phases.items()}
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in self.phases.items())
+
+
+startup_timer = StartupTimer()
+registry.register_stats("bot_startup", "Этапы старта бота, сек", startup_timer.stats)
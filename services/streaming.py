@@ -0,0 +1,91 @@
+"""
+Прогрессивный вывод потокового ответа LLM в одно сообщение Telegram.
+"""
+
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, List
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from config import STREAM_EDIT_INTERVAL, STREAM_FINAL_EDIT_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+# Лимит длины текста сообщения в Telegram
+MESSAGE_LIMIT = 4096
+# Курсор «печатает» в конце незаконченного ответа
+TYPING_CURSOR = " ▌"
+
+
+def split_text(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Режет длинный текст на части не длиннее limit (по строкам, где возможно)."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+
+async def stream_to_message(
+    message: Message,
+    chunks: AsyncIterator[str],
+    header: str = "",
+    placeholder: str = "⏳",
+    interval: float = STREAM_EDIT_INTERVAL,
+    final_attempts: int = STREAM_FINAL_EDIT_ATTEMPTS,
+) -> str:
+    """
+    Отправляет плейсхолдер и редактирует его по мере прихода кусков текста,
+    не чаще одного раза в interval секунд (лимит Telegram на правки).
+    Первый кусок показывается сразу. Промежуточную правку при RetryAfter
+    можно пропустить, итоговую — нет: она повторяется после паузы
+    retry_after, всего до final_attempts попыток. Возвращает полный текст ответа.
+    """
+    sent = await message.answer(placeholder)
+    parts: List[str] = []
+    shown = placeholder
+    next_edit_at = 0.0
+
+    async def edit(text: str, attempts: int = 1) -> None:
+        nonlocal shown, next_edit_at
+        for attempt in range(1, attempts + 1):
+            if text == shown:
+                return
+            try:
+                await sent.edit_text(text)
+                shown = text
+            except TelegramRetryAfter as e:
+                if attempts == 1:
+                    # промежуточная правка: следующая будет после паузы
+                    next_edit_at = time.monotonic() + e.retry_after
+                    return
+                if attempt == attempts:
+                    logger.warning("Итоговая правка не прошла за %s попыток: %s", attempts, e)
+                    return
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                logger.warning("Не удалось обновить сообщение: %s", e)
+                return
+
+    async for delta in chunks:
+        parts.append(delta)
+        now = time.monotonic()
+        if now >= next_edit_at:
+            next_edit_at = now + interval
+            preview = header + "".join(parts)
+            if len(preview) + len(TYPING_CURSOR) <= MESSAGE_LIMIT:
+                await edit(preview + TYPING_CURSOR)
+
+    answer = "".join(parts).strip()
+    first, *rest = split_text(header + answer)
+    await edit(first, attempts=max(final_attempts, 1))
+    for part in rest:
+        await message.answer(part)
+    return answer
@@ -0,0 +1,7 @@
+from aiogram.fsm.state import StatesGroup, State
+
+class ImportState(StatesGroup):
+    """
+    Состояние импорта: бот ждёт CSV- или JSON-файл с задачами и сделками.
+    """
+    waiting_for_file = State()
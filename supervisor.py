@@ -0,0 +1,420 @@
+"""
+Режим supervisor: несколько процессов-воркеров на одного бота.
+
+Процесс-супервизор получает апдейты через getUpdates (сырой JSON, без
+разбора в pydantic) и раскладывает их по воркерам по from_user.id.
+Все апдейты пользователя попадают в один воркер и обрабатываются по
+порядку, поэтому FSM и кэши пользователя живут в одном процессе.
+Каждый воркер — отдельный процесс со своим event loop, engine, пулом
+соединений и Dispatcher; разбор апдейтов, клавиатуры, HTML и логирование
+распределяются по ядрам.
+
+Упавший воркер перезапускается с растущей паузой; если он падает чаще
+SUPERVISOR_MAX_RESTARTS раз за SUPERVISOR_RESTART_WINDOW — супервизор
+останавливается. Раз в SUPERVISOR_STATS_INTERVAL в лог пишется
+пропускная способность каждого воркера.
+"""
+
+import os
+import math
+import time
+import queue
+import signal
+import asyncio
+import logging
+import multiprocessing as mp
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from config import (
+    BOT_TOKEN,
+    SUPERVISOR_DRAIN_TIMEOUT,
+    SUPERVISOR_MAX_RESTARTS,
+    SUPERVISOR_QUEUE_SIZE,
+    SUPERVISOR_RESTART_WINDOW,
+    SUPERVISOR_STATS_INTERVAL,
+    SUPERVISOR_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/{method}"
+# Long polling: сколько Telegram держит запрос getUpdates, сек
+POLL_TIMEOUT = 30
+# Как часто воркер отправляет супервизору свои счётчики, сек
+WORKER_STATS_PERIOD = 5.0
+
+
+def shard_key(update: Dict[str, Any]) -> int:
+    """
+    Ключ шардирования апдейта: from_user.id, если он есть,
+    иначе id чата, иначе update_id.
+    """
+    for name, payload in update.items():
+        if name == "update_id" or not isinstance(payload, dict):
+            continue
+        user = payload.get("from") or payload.get("user")
+        if user:
+            return user["id"]
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return update["update_id"]
+
+
+# --- Воркер ---
+
+def worker_main(index: int, workers: int, inbox, stats) -> None:
+    """Точка входа процесса-воркера."""
+    # Ctrl+C приходит всей группе процессов — останавливает воркеров супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from services.logging_setup import setup_logging, stop_logging
+
+    # У каждого воркера свой файл логов: logs/worker-<i>.log
+    setup_logging(f"worker-{index}")
+    try:
+        asyncio.run(_run_worker(index, workers, inbox, stats))
+    finally:
+        stop_logging()
+
+
+async def _run_worker(index: int, workers: int, inbox, stats) -> None:
+    # Импорты здесь: каждый процесс создаёт свои engine, пул и диспетчер
+    from bot import build_bot, build_dispatcher
+    from config import (
+        LLM_MAX_CONCURRENCY,
+        METRICS_PORT,
+        MOTIVATION_POOL_LOW_WATER,
+        MOTIVATION_POOL_SIZE,
+        SEND_GLOBAL_RATE,
+    )
+    from database.db import engine
+    from services.chatgpt import marketing_cache
+    from services.llm_scheduler import llm_scheduler
+    from services.metrics import metrics_server
+    from services.motivation_pool import motivation_pool
+    from services.rate_limit import TokenBucket
+    from services.reminders import reminder_scheduler
+    from services.send_queue import send_queue
+
+    # Лимиты OpenAI и Telegram общие на бота — делим их между воркерами
+    llm_scheduler.set_concurrency(max(1, LLM_MAX_CONCURRENCY // workers))
+    send_queue.global_bucket = TokenBucket(SEND_GLOBAL_RATE / workers, SEND_GLOBAL_RATE / workers)
+    # Пул мотивации у каждого воркера свой (для пользователей шарда) —
+    # делим его размер, чтобы фоновых запросов к OpenAI не стало в workers раз больше
+    motivation_pool.capacity = math.ceil(MOTIVATION_POOL_SIZE / workers)
+    motivation_pool.low_water = min(math.ceil(MOTIVATION_POOL_LOW_WATER / workers), motivation_pool.capacity)
+    motivation_pool.batch_size = min(motivation_pool.batch_size, motivation_pool.capacity)
+    # Метрики воркера i — на порту METRICS_PORT + 1 + i
+    if METRICS_PORT:
+        metrics_server.port = METRICS_PORT + 1 + index
+    # Напоминания — только пользователям своего шарда, как и апдейты
+    reminder_scheduler.shard = (index, workers)
+    # У каждого воркера свой файл кэша, чтобы не перезаписывать чужой
+    if marketing_cache.path is not None:
+        marketing_cache.path = marketing_cache.path.with_name(f"{marketing_cache.path.name}_w{index}")
+
+    bot = build_bot()
+    dp = build_dispatcher()
+    loop = asyncio.get_running_loop()
+
+    locks: Dict[int, asyncio.Lock] = {}
+    pending: Dict[int, int] = {}
+    tasks: set = set()
+    counters = {"processed": 0, "errors": 0, "busy": 0.0}
+
+    async def handle(key: int, lock: asyncio.Lock, update: Dict[str, Any]) -> None:
+        try:
+            # Lock честный (FIFO): апдейты пользователя идут в порядке поступления
+            async with lock:
+                started = time.monotonic()
+                try:
+                    await dp.feed_raw_update(bot, update)
+                except Exception:
+                    # Трейсбек уже записал диспетчер
+                    counters["errors"] += 1
+                finally:
+                    counters["processed"] += 1
+                    counters["busy"] += time.monotonic() - started
+        finally:
+            pending[key] -= 1
+            if not pending[key]:
+                del pending[key]
+                del locks[key]
+
+    def report() -> None:
+        stats.put((index, os.getpid(), counters["processed"], counters["errors"], counters["busy"], len(tasks)))
+
+    async def report_periodically() -> None:
+        while True:
+            await asyncio.sleep(WORKER_STATS_PERIOD)
+            report()
+
+    await dp.emit_startup(bot=bot, dispatcher=dp, bots=[bot])
+    reporter = asyncio.create_task(report_periodically())
+    logger.info("Воркер %s запущен (pid %s)", index, os.getpid())
+    try:
+        while True:
+            item = await loop.run_in_executor(None, inbox.get)
+            if item is None:
+                break
+            key, update = item
+            lock = locks.setdefault(key, asyncio.Lock())
+            pending[key] = pending.get(key, 0) + 1
+            task = asyncio.create_task(handle(key, lock, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+    finally:
+        reporter.cancel()
+        report()
+        try:
+            await dp.emit_shutdown(bot=bot, dispatcher=dp, bots=[bot])
+        finally:
+            await bot.session.close()
+            await engine.dispose()
+    logger.info("Воркер %s остановлен", index)
+
+
+# --- Супервизор ---
+
+class Supervisor:
+    """
+    Держит процессы-воркеры, их очереди и статистику.
+    allowed_updates — типы апдейтов, которые обрабатывает диспетчер.
+    """
+
+    def __init__(self, token: str, workers: int, allowed_updates: Optional[List[str]] = None):
+        self.token = token
+        self.workers = workers
+        self.allowed_updates = allowed_updates
+        # spawn: воркер не наследует event loop и соединения супервизора
+        self.ctx = mp.get_context("spawn")
+        self.inboxes = [self.ctx.Queue(maxsize=SUPERVISOR_QUEUE_SIZE) for _ in range(workers)]
+        self.stats_queue = self.ctx.Queue()
+        self.processes: List[Optional[mp.Process]] = [None] * workers
+        self.crashes: List[deque] = [deque() for _ in range(workers)]
+        self.stopping = False
+        self.offset: Optional[int] = None
+
+        # --- метрики ---
+        self.routed = [0] * workers
+        self.worker_stats: Dict[int, tuple] = {}
+        self._reported: Dict[int, tuple] = {}
+        self._reported_routed = [0] * workers
+
+    # --- Процессы ---
+
+    def start_worker(self, index: int) -> None:
+        if self.stopping:
+            return
+        process = self.ctx.Process(
+            target=worker_main,
+            args=(index, self.workers, self.inboxes[index], self.stats_queue),
+            name=f"bot-worker-{index}",
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self.start_worker(index)
+        logger.info("Запущено воркеров: %s", self.workers)
+
+    async def watch(self) -> None:
+        """
+        Перезапускает упавшие воркеры: пауза 1, 2, 4... сек (до 30).
+        Если воркер падает слишком часто — бросает RuntimeError.
+        """
+        loop = asyncio.get_running_loop()
+        while not self.stopping:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self.processes):
+                if process is None or process.is_alive() or self.stopping:
+                    continue
+                now = time.monotonic()
+                crashes = self.crashes[index]
+                while crashes and now - crashes[0] > SUPERVISOR_RESTART_WINDOW:
+                    crashes.popleft()
+                if len(crashes) >= SUPERVISOR_MAX_RESTARTS:
+                    raise RuntimeError(
+                        f"Воркер {index} упал {len(crashes) + 1} раз за "
+                        f"{SUPERVISOR_RESTART_WINDOW:.0f} сек — останавливаемся."
+                    )
+                crashes.append(now)
+                delay = min(30, 2 ** (len(crashes) - 1))
+                logger.error(
+                    "Воркер %s (pid %s) завершился с кодом %s, перезапуск через %s сек",
+                    index, process.pid, process.exitcode, delay,
+                )
+                self.processes[index] = None
+                loop.call_later(delay, self.start_worker, index)
+
+    async def stop(self) -> None:
+        """Просит воркеры доделать принятые апдейты и ждёт их завершения."""
+        self.stopping = True
+        loop = asyncio.get_running_loop()
+        alive = [(i, p) for i, p in enumerate(self.processes) if p is not None and p.is_alive()]
+        for index, _ in alive:
+            try:
+                await loop.run_in_executor(None, self.inboxes[index].put, None, True, SUPERVISOR_DRAIN_TIMEOUT)
+            except queue.Full:
+                pass
+        deadline = time.monotonic() + SUPERVISOR_DRAIN_TIMEOUT
+        for index, process in alive:
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Воркер %s не остановился вовремя — завершаем принудительно.", index)
+                process.terminate()
+                await loop.run_in_executor(None, process.join, 5)
+        self._drain_stats()
+        self.log_stats(final=True)
+
+    # --- Приём и раскладка апдейтов ---
+
+    async def route(self, update: Dict[str, Any]) -> None:
+        key = shard_key(update)
+        index = key % self.workers
+        inbox = self.inboxes[index]
+        try:
+            inbox.put_nowait((key, update))
+        except queue.Full:
+            # Воркер не успевает — притормаживаем приём апдейтов
+            await asyncio.get_running_loop().run_in_executor(None, inbox.put, (key, update))
+        self.routed[index] += 1
+
+    async def _get_updates(self, session: aiohttp.ClientSession, timeout: int, **params: Any) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"timeout": timeout, **params}
+        if self.offset is not None:
+            payload["offset"] = self.offset
+        if self.allowed_updates is not None:
+            payload["allowed_updates"] = self.allowed_updates
+        url = TELEGRAM_API_URL.format(token=self.token, method="getUpdates")
+        async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout + 10)) as resp:
+            return await resp.json()
+
+    async def poll(self, session: aiohttp.ClientSession) -> None:
+        """Long polling getUpdates с паузой при ошибках сети и 429."""
+        backoff = 1.0
+        while True:
+            try:
+                body = await self._get_updates(session, POLL_TIMEOUT)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning("getUpdates: %s — повтор через %.0f сек", e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            if not body.get("ok"):
+                retry_after = (body.get("parameters") or {}).get("retry_after")
+                logger.warning("getUpdates: %s", body.get("description"))
+                await asyncio.sleep(retry_after or backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1.0
+            for update in body["result"]:
+                await self.route(update)
+                self.offset = update["update_id"] + 1
+
+    async def confirm_offset(self, session: aiohttp.ClientSession) -> None:
+        """Подтверждает Telegram уже разложенные апдейты, чтобы после рестарта они не пришли снова."""
+        if self.offset is None:
+            return
+        try:
+            await self._get_updates(session, 0, limit=1)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning("Не удалось подтвердить offset: %s", e)
+
+    # --- Статистика ---
+
+    def _drain_stats(self) -> None:
+        while True:
+            try:
+                index, *values = self.stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.worker_stats[index] = tuple(values)
+
+    async def collect_stats(self) -> None:
+        next_log = time.monotonic() + SUPERVISOR_STATS_INTERVAL
+        while True:
+            await asyncio.sleep(1)
+            self._drain_stats()
+            if time.monotonic() >= next_log:
+                next_log += SUPERVISOR_STATS_INTERVAL
+                self.log_stats()
+
+    def log_stats(self, final: bool = False) -> None:
+        """
+        Пишет в лог по каждому воркеру: принято/обработано апдейтов в секунду,
+        ошибки, загрузку (доля времени в хендлерах), апдейты в работе и в очереди.
+        """
+        interval = SUPERVISOR_STATS_INTERVAL
+        for index in range(self.workers):
+            pid, processed, errors, busy, in_flight = self.worker_stats.get(index, (None, 0, 0, 0.0, 0))
+            prev_pid, prev_processed, prev_errors, prev_busy, _ = self._reported.get(index, (pid, 0, 0, 0.0, 0))
+            if pid != prev_pid:
+                # воркер перезапускался — его счётчики начались с нуля
+                prev_processed, prev_errors, prev_busy = 0, 0, 0.0
+            routed = self.routed[index] - self._reported_routed[index]
+            try:
+                backlog = self.inboxes[index].qsize()
+            except NotImplementedError:
+                # macOS не умеет qsize у multiprocessing.Queue
+                backlog = -1
+            if final:
+                logger.info(
+                    "Воркер %s: всего принято %s, обработано %s, ошибок %s, перезапусков %s",
+                    index, self.routed[index], processed, errors, len(self.crashes[index]),
+                )
+            else:
+                logger.info(
+                    "Воркер %s (pid %s): принято %.1f/с, обработано %.1f/с, ошибок %s, "
+                    "загрузка %.0f%%, в работе %s, в очереди %s",
+                    index, pid, routed / interval, (processed - prev_processed) / interval,
+                    errors - prev_errors, 100 * (busy - prev_busy) / interval, in_flight, backlog,
+                )
+            self._reported[index] = (pid, processed, errors, busy, in_flight)
+            self._reported_routed[index] = self.routed[index]
+
+
+async def run_supervisor(allowed_updates: Optional[List[str]] = None) -> None:
+    """
+    Запускает воркеры и приём апдейтов; работает до SIGINT/SIGTERM
+    или до того, как воркер исчерпает лимит перезапусков.
+    """
+    workers = SUPERVISOR_WORKERS or os.cpu_count() or 1
+    supervisor = Supervisor(BOT_TOKEN, workers, allowed_updates)
+    supervisor.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C придёт как KeyboardInterrupt
+            pass
+
+    async with aiohttp.ClientSession() as session:
+        tasks = [
+            asyncio.create_task(supervisor.poll(session)),
+            asyncio.create_task(supervisor.watch()),
+            asyncio.create_task(supervisor.collect_stats()),
+            asyncio.create_task(stop.wait()),
+        ]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            logger.info("Остановка супервизора...")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await supervisor.confirm_offset(session)
+            await supervisor.stop()
+    # Пробрасываем ошибку watch(), если остановились из-за неё
+    for task in done:
+        if not task.cancelled() and task.exception():
+            raise task.exception()
@@ -0,0 +1,67 @@
+"""
+База SQLite в памяти для тестов: схема из моделей, одна фабрика сессий
+и добавление записей тем же путём, что и в хендлерах (со счётчиками /report).
+"""
+
+from typing import List
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Deal, Task, User, utcnow
+from database.stats import DEAL_CLOSED, TASK_DONE, deal_status_changed, task_status_changed
+
+
+async def create_session_factory():
+    """(engine, фабрика сессий) над новой пустой базой; engine закрывает тест."""
+    # StaticPool: база в памяти живёт, пока открыто её единственное соединение
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def add_user(session: AsyncSession, tg_id: int) -> int:
+    user = User(tg_id=tg_id, username=f"user{tg_id}")
+    session.add(user)
+    await session.flush()
+    return user.id
+
+
+async def add_task(session: AsyncSession, user_id: int, title: str, status: str = "Не выполнена") -> int:
+    """Задача как из add_task_save: строка и счётчики в одной сессии."""
+    created_at = utcnow()
+    task = Task(
+        user_id=user_id,
+        title=title,
+        time="18:00",
+        status=status,
+        created_at=created_at,
+        closed_at=created_at if status == TASK_DONE else None,
+    )
+    session.add(task)
+    await task_status_changed(session, user_id, None, status, created_at, task.closed_at)
+    await session.flush()
+    return task.id
+
+
+async def add_deal(session: AsyncSession, user_id: int, title: str, amount: int, status: str = "Открыта") -> int:
+    """Сделка как из add_deal_save."""
+    created_at = utcnow()
+    deal = Deal(
+        user_id=user_id,
+        title=title,
+        amount=amount,
+        status=status,
+        created_at=created_at,
+        closed_at=created_at if status == DEAL_CLOSED else None,
+    )
+    session.add(deal)
+    await deal_status_changed(session, user_id, None, status, amount, created_at, deal.closed_at)
+    await session.flush()
+    return deal.id
+
+
+async def add_tasks(session: AsyncSession, user_id: int, count: int) -> List[int]:
+    return [await add_task(session, user_id, f"Задача {number}") for number in range(count)]
@@ -0,0 +1,59 @@
+"""
+Разбор срока задачи: services/due_time.parse_due_at.
+
+Запуск:
+    python -m unittest discover -s tests -t .
+"""
+
+import unittest
+from datetime import datetime
+
+from services.due_time import TZ, parse_due_at
+
+# 25 октября 2026, 11:00 по BOT_TIMEZONE
+NOW = datetime(2026, 10, 25, 11, 0, tzinfo=TZ)
+
+
+def local(text: str):
+    due = parse_due_at(text, now=NOW)
+    return None if due is None else due.astimezone(TZ).replace(tzinfo=None)
+
+
+class ParseDueAtTest(unittest.TestCase):
+
+    def test_date_with_time(self):
+        self.assertEqual(local("12.11 18:00"), datetime(2026, 11, 12, 18, 0))
+        self.assertEqual(local("05.11 18:00"), datetime(2026, 11, 5, 18, 0))
+        self.assertEqual(local("25.10 18:00"), datetime(2026, 10, 25, 18, 0))
+        self.assertEqual(local("18:00 12.11"), datetime(2026, 11, 12, 18, 0))
+
+    def test_date_without_time_is_not_a_time(self):
+        self.assertEqual(local("12.11"), datetime(2026, 11, 12, 9, 0))
+
+    def test_dotted_time(self):
+        self.assertEqual(local("18.00"), datetime(2026, 10, 25, 18, 0))
+        self.assertEqual(local("12.11 18.30"), datetime(2026, 11, 12, 18, 30))
+
+    def test_time_only_is_nearest(self):
+        self.assertEqual(local("18:00"), datetime(2026, 10, 25, 18, 0))
+        self.assertEqual(local("10:00"), datetime(2026, 10, 26, 10, 0))
+
+    def test_day_words(self):
+        self.assertEqual(local("завтра 10:30"), datetime(2026, 10, 26, 10, 30))
+        self.assertEqual(local("сегодня 12:00"), datetime(2026, 10, 25, 12, 0))
+
+    def test_past_time_today_is_rejected(self):
+        self.assertIsNone(local("сегодня 10:00"))
+        self.assertIsNone(local("25.10 10:00"))
+        self.assertIsNone(local("2026-10-01 10:00"))
+
+    def test_past_date_without_year_is_next_year(self):
+        self.assertEqual(local("25.01 18:00"), datetime(2027, 1, 25, 18, 0))
+
+    def test_invalid_and_unparsed(self):
+        self.assertIsNone(local("31.02"))
+        self.assertIsNone(local("после обеда"))
+
+
+if __name__ == "__main__":
+    unittest.main()
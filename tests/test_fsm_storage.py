@@ -0,0 +1,74 @@
+"""
+Write-back кэш PostgresStorage (database/fsm_storage.py) на SQLite:
+неудачный flush не теряет состояния.
+
+Запуск:
+    python -m unittest discover -s tests -t .
+"""
+
+import asyncio
+import unittest
+
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import select
+
+from database.fsm_storage import PostgresStorage
+from database.models import FsmState
+from tests.sqlite import create_session_factory
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+class FailingSession:
+    """Сессия, которая дожидается release и падает на первом запросе."""
+
+    def __init__(self, release: asyncio.Event, bind):
+        self.release = release
+        self.bind = bind
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, *args, **kwargs):
+        await self.release.wait()
+        raise ConnectionError("база недоступна")
+
+
+class WriteBackFlushTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine, self.session_factory = await create_session_factory()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_failed_flush_keeps_records_for_retry(self):
+        storage = PostgresStorage(self.session_factory, write_back=True, flush_interval=3600, cache_size=1)
+        await storage.set_data(key(1), {"title": "Позвонить клиенту"})
+
+        release = asyncio.Event()
+        storage.session_factory = lambda: FailingSession(release, self.engine)
+        flushing = asyncio.ensure_future(storage.flush())
+        await asyncio.sleep(0)
+        # пока пачка пишется, другие пользователи вытесняют записи из кэша
+        storage.session_factory = self.session_factory
+        for user_id in (2, 3, 4):
+            await storage.get_state(key(user_id))
+        release.set()
+        await flushing
+
+        await storage.flush()
+        await storage.close()
+
+        async with self.session_factory() as session:
+            rows = (await session.execute(select(FsmState.key, FsmState.data))).all()
+        self.assertEqual([data for _, data in rows], [{"title": "Позвонить клиенту"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Склейка потоковых запросов: llm_scheduler.stream и stream_marketing_advice
+на FakeStreamingClient.
+
+Запуск:
+    python -m unittest discover -s tests -t .
+"""
+
+import asyncio
+import unittest
+
+from services import chatgpt
+from services.fake_openai import FakeStreamingClient
+from services.llm_scheduler import LLMScheduler
+
+
+async def collect(stream) -> str:
+    return "".join([part async for part in stream])
+
+
+class StreamCoalescingTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_same_question_shares_one_upstream_stream(self):
+        client = FakeStreamingClient(text="Запустите реферальную программу.", chunk_size=4, delay=0.01)
+        chatgpt.set_client(client)
+        question = "Как привлечь клиентов через рекомендации?"
+
+        first = asyncio.ensure_future(collect(chatgpt.stream_marketing_advice(question, user_id=1)))
+        await asyncio.sleep(0.03)
+        # второй вопрос приходит посреди стрима и получает ответ с начала
+        second = await collect(chatgpt.stream_marketing_advice(question.upper() + "  ", user_id=2))
+
+        self.assertEqual(await first, client.text)
+        self.assertEqual(second, client.text)
+        self.assertEqual(sum(1 for request in client.requests if request["stream"]), 1)
+
+    async def test_error_reaches_every_reader(self):
+        scheduler = LLMScheduler()
+
+        async def failing():
+            yield "начало "
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream")
+
+        async def read():
+            parts = []
+            with self.assertRaises(RuntimeError):
+                async for part in scheduler.stream(failing, key="k"):
+                    parts.append(part)
+            return parts
+
+        results = await asyncio.gather(read(), read())
+
+        self.assertEqual(results, [["начало "], ["начало "]])
+        self.assertEqual(scheduler.stats()["coalesced"], 1)
+        self.assertEqual(scheduler.stats()["in_flight"], 0)
+
+    async def test_upstream_is_cancelled_when_last_reader_leaves(self):
+        scheduler = LLMScheduler()
+        produced = []
+
+        async def endless():
+            while True:
+                produced.append(1)
+                yield "кусок"
+                await asyncio.sleep(0.01)
+
+        async def read_two():
+            stream = scheduler.stream(endless, key="k")
+            parts = [await stream.__anext__(), await stream.__anext__()]
+            await stream.aclose()
+            return parts
+
+        await asyncio.gather(read_two(), read_two())
+        await asyncio.sleep(0.05)
+
+        count = len(produced)
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(produced), count)
+        self.assertEqual(scheduler.stats()["in_flight"], 0)
+        self.assertFalse(scheduler._streams)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Keyset-пагинация списков (database/pagination.fetch_page) на SQLite:
+первая, средняя и последняя страницы, листание назад и смена статуса
+между загрузками страниц.
+
+Запуск:
+    python -m unittest discover -s tests -t .
+"""
+
+import unittest
+
+from sqlalchemy import select, update
+
+from database.models import Task
+from database.pagination import PAGE_NEXT, PAGE_PREV, fetch_page, status_rank
+from database.stats import TASK_DONE
+from tests.sqlite import add_tasks, add_user, create_session_factory
+
+PAGE = 10
+
+
+class FetchPageTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine, self.session_factory = await create_session_factory()
+        async with self.session_factory() as session:
+            self.user_id = await add_user(session, 1)
+            other = await add_user(session, 2)
+            self.ids = await add_tasks(session, self.user_id, 25)
+            await add_tasks(session, other, 3)
+            await session.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def page(self, cursor=None, direction=PAGE_NEXT):
+        """(id задач страницы, есть_предыдущая, есть_следующая, первый курсор, последний курсор)."""
+        rank = status_rank(Task.status, TASK_DONE)
+        stmt = select(Task.id, rank).where(Task.user_id == self.user_id)
+        async with self.session_factory() as session:
+            rows, has_prev, has_next = await fetch_page(session, stmt, rank, Task.id, cursor, direction, PAGE)
+        ids = [task_id for task_id, _ in rows]
+        return ids, has_prev, has_next, (rows[0][1], rows[0][0]), (rows[-1][1], rows[-1][0])
+
+    async def complete(self, *task_ids: int) -> None:
+        async with self.session_factory() as session:
+            await session.execute(update(Task).where(Task.id.in_(task_ids)).values(status=TASK_DONE))
+            await session.commit()
+
+    async def test_first_middle_and_last_pages(self):
+        first, has_prev, has_next, _, last_cursor = await self.page()
+        self.assertEqual((first, has_prev, has_next), (self.ids[:10], False, True))
+
+        middle, has_prev, has_next, _, last_cursor = await self.page(last_cursor)
+        self.assertEqual((middle, has_prev, has_next), (self.ids[10:20], True, True))
+
+        last, has_prev, has_next, _, _ = await self.page(last_cursor)
+        self.assertEqual((last, has_prev, has_next), (self.ids[20:], True, False))
+
+    async def test_paging_backwards(self):
+        _, _, _, _, cursor = await self.page()
+        _, _, _, _, cursor = await self.page(cursor)
+        _, _, _, first_cursor, _ = await self.page(cursor)
+
+        middle, has_prev, has_next, first_cursor, _ = await self.page(first_cursor, PAGE_PREV)
+        self.assertEqual((middle, has_prev, has_next), (self.ids[10:20], True, True))
+
+        first, has_prev, has_next, _, _ = await self.page(first_cursor, PAGE_PREV)
+        self.assertEqual((first, has_prev, has_next), (self.ids[:10], False, True))
+
+    async def test_done_tasks_go_last(self):
+        await self.complete(self.ids[0], self.ids[5])
+
+        first, _, _, _, _ = await self.page()
+        self.assertEqual(first, [i for i in self.ids if i not in (self.ids[0], self.ids[5])][:10])
+
+    async def test_status_change_between_page_loads(self):
+        _, _, _, _, cursor = await self.page()
+        # задача с первой страницы и задача со второй выполнены, пока первая открыта
+        await self.complete(self.ids[3], self.ids[12])
+
+        seen = []
+        has_next = True
+        while has_next:
+            ids, _, has_next, _, cursor = await self.page(cursor)
+            seen += ids
+
+        # ни пропусков, ни повторов: открытые задачи после первой страницы, затем выполненные
+        expected_open = [i for i in self.ids[10:] if i != self.ids[12]]
+        self.assertEqual(seen, expected_open + [self.ids[3], self.ids[12]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+Изменение задач и сделок (database/repository.py) на SQLite:
+чужие записи не меняются и не возвращаются, счётчики user_stats
+и user_daily_stats двигаются только для реально изменённых строк.
+
+Запуск:
+    python -m unittest discover -s tests -t .
+"""
+
+import unittest
+
+from sqlalchemy import func, select
+
+from database import repository
+from database.models import Deal, Task, UserDailyStats, UserStats
+from database.stats import DEAL_CLOSED, TASK_DONE
+from tests.sqlite import add_deal, add_task, add_user, create_session_factory
+
+
+class RepositoryTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine, self.session_factory = await create_session_factory()
+        async with self.session_factory() as session:
+            self.alice = await add_user(session, 1)
+            self.bob = await add_user(session, 2)
+            self.alice_tasks = [await add_task(session, self.alice, f"Задача A{n}") for n in range(3)]
+            self.bob_task = await add_task(session, self.bob, "Задача B")
+            self.alice_deals = [await add_deal(session, self.alice, f"Сделка A{n}", 100) for n in range(2)]
+            self.bob_deal = await add_deal(session, self.bob, "Сделка B", 5000)
+            await session.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def snapshot(self):
+        """Все задачи, сделки и счётчики — чтобы сравнить до и после."""
+        async with self.session_factory() as session:
+            return (
+                (await session.execute(select(Task.id, Task.user_id, Task.status).order_by(Task.id))).all(),
+                (await session.execute(select(Deal.id, Deal.user_id, Deal.status).order_by(Deal.id))).all(),
+                (await session.execute(
+                    select(UserStats.user_id, UserStats.tasks_done, UserStats.deals_closed, UserStats.deals_closed_sum)
+                    .order_by(UserStats.user_id)
+                )).all(),
+                (await session.execute(
+                    select(
+                        UserDailyStats.user_id,
+                        UserDailyStats.tasks_created,
+                        UserDailyStats.tasks_done,
+                        UserDailyStats.deals_created,
+                        UserDailyStats.deals_closed,
+                        UserDailyStats.deals_closed_sum,
+                    ).order_by(UserDailyStats.user_id, UserDailyStats.day)
+                )).all(),
+            )
+
+    async def user_stats(self, user_id: int):
+        async with self.session_factory() as session:
+            stats = await session.get(UserStats, user_id)
+            daily = (await session.execute(
+                select(
+                    func.sum(UserDailyStats.tasks_created),
+                    func.sum(UserDailyStats.tasks_done),
+                    func.sum(UserDailyStats.deals_created),
+                    func.sum(UserDailyStats.deals_closed),
+                    func.sum(UserDailyStats.deals_closed_sum),
+                ).where(UserDailyStats.user_id == user_id)
+            )).one()
+        totals = (stats.tasks_done, stats.deals_closed, stats.deals_closed_sum) if stats else (0, 0, 0)
+        return totals, tuple(value or 0 for value in daily)
+
+    async def run_op(self, operation, *args):
+        async with self.session_factory() as session:
+            result = await operation(session, *args)
+            await session.commit()
+        return result
+
+    # --- Одна запись ---
+
+    async def test_single_row_operations_skip_foreign_rows(self):
+        before = await self.snapshot()
+
+        self.assertIsNone(await self.run_op(repository.toggle_task, self.alice, self.bob_task))
+        self.assertIsNone(await self.run_op(repository.delete_task, self.alice, self.bob_task))
+        self.assertIsNone(await self.run_op(repository.set_deal_status, self.alice, self.bob_deal, DEAL_CLOSED))
+        self.assertIsNone(await self.run_op(repository.delete_deal, self.alice, self.bob_deal))
+
+        self.assertEqual(await self.snapshot(), before)
+
+    async def test_toggle_task_moves_stats(self):
+        task_id = self.alice_tasks[0]
+
+        row = await self.run_op(repository.toggle_task, self.alice, task_id)
+        self.assertEqual((row.id, row.old_status, row.status), (task_id, "Не выполнена", TASK_DONE))
+        self.assertIsNotNone(row.closed_at)
+        self.assertEqual(await self.user_stats(self.alice), ((1, 0, 0), (3, 1, 2, 0, 0)))
+
+        row = await self.run_op(repository.toggle_task, self.alice, task_id)
+        self.assertEqual((row.old_status, row.status, row.closed_at), (TASK_DONE, "Не выполнена", None))
+        self.assertEqual(await self.user_stats(self.alice), ((0, 0, 0), (3, 0, 2, 0, 0)))
+
+    async def test_deal_status_and_delete_move_stats(self):
+        deal_id = self.alice_deals[0]
+
+        row = await self.run_op(repository.set_deal_status, self.alice, deal_id, DEAL_CLOSED)
+        self.assertEqual((row.old_status, row.status), ("Открыта", DEAL_CLOSED))
+        self.assertEqual(await self.user_stats(self.alice), ((0, 1, 100), (3, 0, 2, 1, 100)))
+
+        row = await self.run_op(repository.delete_deal, self.alice, deal_id)
+        self.assertEqual((row.id, row.status, row.old_status), (deal_id, None, DEAL_CLOSED))
+        self.assertEqual(await self.user_stats(self.alice), ((0, 0, 0), (3, 0, 1, 0, 0)))
+
+    # --- Пачки id ---
+
+    async def test_bulk_status_changes_only_own_rows(self):
+        bob_before = await self.user_stats(self.bob)
+        ids = self.alice_tasks[:2] + [self.bob_task]
+
+        rows = await self.run_op(repository.set_tasks_status, self.alice, ids, TASK_DONE)
+        self.assertEqual(sorted(row.id for row in rows), sorted(self.alice_tasks[:2]))
+        self.assertEqual(await self.user_stats(self.alice), ((2, 0, 0), (3, 2, 2, 0, 0)))
+
+        # повтор ничего не меняет: строки уже в этом статусе
+        self.assertEqual(await self.run_op(repository.set_tasks_status, self.alice, ids, TASK_DONE), [])
+        self.assertEqual(await self.user_stats(self.alice), ((2, 0, 0), (3, 2, 2, 0, 0)))
+
+        rows = await self.run_op(repository.set_deals_status, self.alice, self.alice_deals + [self.bob_deal], DEAL_CLOSED)
+        self.assertEqual(sorted(row.id for row in rows), sorted(self.alice_deals))
+        self.assertEqual(await self.user_stats(self.alice), ((2, 2, 200), (3, 2, 2, 2, 200)))
+
+        self.assertEqual(await self.user_stats(self.bob), bob_before)
+        async with self.session_factory() as session:
+            self.assertEqual((await session.get(Task, self.bob_task)).status, "Не выполнена")
+            self.assertEqual((await session.get(Deal, self.bob_deal)).status, "Открыта")
+
+    async def test_bulk_delete_removes_only_own_rows(self):
+        bob_before = await self.user_stats(self.bob)
+
+        rows = await self.run_op(repository.delete_tasks, self.alice, [self.alice_tasks[0], self.bob_task])
+        self.assertEqual([row.id for row in rows], [self.alice_tasks[0]])
+        rows = await self.run_op(repository.delete_deals, self.alice, [self.alice_deals[0], self.bob_deal])
+        self.assertEqual([row.id for row in rows], [self.alice_deals[0]])
+
+        self.assertEqual(await self.user_stats(self.alice), ((0, 0, 0), (2, 0, 1, 0, 0)))
+        self.assertEqual(await self.user_stats(self.bob), bob_before)
+        async with self.session_factory() as session:
+            self.assertIsNotNone(await session.get(Task, self.bob_task))
+            self.assertIsNotNone(await session.get(Deal, self.bob_deal))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Семантический кэш (services/semantic_cache.py) на HashingEmbedder, без сети:
+попадание по порогу близости, LRU-вытеснение и сохранение на диск.
+
+Запуск:
+    python -m unittest discover -s tests -t .
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from services.semantic_cache import HashingEmbedder, SemanticCache
+
+QUESTION = "Как привлечь клиентов в кофейню?"
+SIMILAR = "как привлечь клиентов в кофейню"
+
+
+class SemanticCacheTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.embedder = HashingEmbedder()
+
+    async def filled(self, questions, **options) -> SemanticCache:
+        cache = SemanticCache(self.embedder, **options)
+        for question in questions:
+            cache.add(question, f"ответ: {question}", await cache.embed(question))
+        return cache
+
+    async def test_hit_and_miss_at_threshold(self):
+        probe = SemanticCache(self.embedder)
+        score = float(await probe.embed(QUESTION) @ await probe.embed(SIMILAR))
+        self.assertLess(score, 1.0)
+
+        at_threshold = await self.filled([QUESTION], threshold=score - 1e-5)
+        self.assertEqual(at_threshold.search(await at_threshold.embed(SIMILAR)), f"ответ: {QUESTION}")
+
+        above = await self.filled([QUESTION], threshold=score + 1e-3)
+        self.assertIsNone(above.search(await above.embed(SIMILAR)))
+        # регистр и пробелы нормализуются — тот же вопрос попадает при любом пороге
+        self.assertIsNotNone(above.search(await above.embed("  как ПРИВЛЕЧЬ клиентов в кофейню? ")))
+        self.assertEqual((above.hits, above.misses), (1, 1))
+
+    async def test_lru_eviction_removes_ids_from_index(self):
+        cache = await self.filled(["первый вопрос", "второй вопрос"], max_size=2)
+        # обращение к первому делает его свежим — вытесняется второй
+        self.assertIsNotNone(cache.search(await cache.embed("первый вопрос")))
+        cache.add("третий вопрос", "ответ 3", await cache.embed("третий вопрос"))
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache._index.ntotal, 2)
+        self.assertIsNone(cache.search(await cache.embed("второй вопрос")))
+        self.assertIsNotNone(cache.search(await cache.embed("первый вопрос")))
+        self.assertIsNotNone(cache.search(await cache.embed("третий вопрос")))
+
+    async def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = Path(workdir) / "cache"
+            cache = await self.filled(["первый вопрос", "второй вопрос", "третий вопрос"], path=path)
+            cache.search(await cache.embed("первый вопрос"))
+            cache.save()
+
+            loaded = SemanticCache(self.embedder, path=path, max_size=2)
+            loaded.load()
+
+            # при меньшем max_size вытесняются самые старые по LRU
+            self.assertEqual(len(loaded), 2)
+            self.assertIsNone(loaded.search(await loaded.embed("второй вопрос")))
+            self.assertEqual(loaded.search(await loaded.embed("первый вопрос")), "ответ: первый вопрос")
+            # новые id продолжают сохранённые и не затирают записи в индексе
+            loaded.add("четвёртый вопрос", "ответ 4", await loaded.embed("четвёртый вопрос"))
+            self.assertEqual(loaded.search(await loaded.embed("четвёртый вопрос")), "ответ 4")
+            self.assertEqual(loaded._index.ntotal, len(loaded))
+
+    async def test_load_resets_on_dim_mismatch(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = Path(workdir) / "cache"
+            (await self.filled([QUESTION], path=path)).save()
+
+            other = SemanticCache(HashingEmbedder(dim=64), path=path)
+            with self.assertLogs("services.semantic_cache", "WARNING"):
+                other.load()
+
+            self.assertEqual(len(other), 0)
+            self.assertIsNone(other.search(await other.embed(QUESTION)))
+            other.add(QUESTION, "новый ответ", await other.embed(QUESTION))
+            self.assertEqual(other.search(await other.embed(QUESTION)), "новый ответ")
+
+    async def test_save_without_index_keeps_files(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = Path(workdir) / "cache"
+            (await self.filled([QUESTION], path=path)).save()
+
+            # кэш не загружался и пуст — сохранение не затирает файлы
+            SemanticCache(self.embedder, path=path).save()
+
+            loaded = SemanticCache(self.embedder, path=path)
+            loaded.load()
+            self.assertEqual(len(loaded), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Инкрементальные счётчики /report (database/stats.py) на SQLite:
+после цепочки созданий, смен статуса и удалений reconcile()
+не находит расхождений с tasks и deals — ни в user_stats,
+ни в user_daily_stats.
+
+Запуск:
+    python -m unittest discover -s tests -t .
+"""
+
+import unittest
+
+from sqlalchemy import delete, select, update
+
+from database import repository
+from database.models import UserDailyStats, UserStats
+from database.stats import DEAL_CLOSED, TASK_DONE, reconcile
+from tests.sqlite import add_deal, add_task, add_user, create_session_factory
+
+
+class RollupConsistencyTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine, self.session_factory = await create_session_factory()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def drift(self, fix: bool = False) -> int:
+        async with self.session_factory() as session:
+            return await reconcile(session, fix=fix)
+
+    async def test_operations_keep_rollup_consistent(self):
+        async with self.session_factory() as session:
+            alice = await add_user(session, 1)
+            bob = await add_user(session, 2)
+            tasks = [await add_task(session, alice, f"Задача {n}") for n in range(4)]
+            tasks.append(await add_task(session, alice, "Сразу выполнена", TASK_DONE))
+            deals = [await add_deal(session, alice, f"Сделка {n}", 100 * (n + 1)) for n in range(3)]
+            deals.append(await add_deal(session, alice, "Сразу закрыта", 900, DEAL_CLOSED))
+            bob_task = await add_task(session, bob, "Чужая")
+            bob_deal = await add_deal(session, bob, "Чужая", 50, DEAL_CLOSED)
+            await session.commit()
+
+        operations = [
+            (repository.toggle_task, alice, tasks[0]),
+            (repository.toggle_task, alice, tasks[0]),
+            (repository.toggle_task, alice, tasks[1]),
+            (repository.toggle_task, alice, bob_task),
+            (repository.set_tasks_status, alice, tasks + [bob_task], TASK_DONE),
+            (repository.set_tasks_status, alice, tasks[:2], repository.TASK_OPEN),
+            (repository.delete_task, alice, tasks[2]),
+            (repository.delete_tasks, alice, [tasks[3], tasks[4], bob_task]),
+            (repository.set_deal_status, alice, deals[0], DEAL_CLOSED),
+            (repository.set_deal_status, alice, deals[0], "В процессе"),
+            (repository.set_deals_status, alice, deals + [bob_deal], DEAL_CLOSED),
+            (repository.delete_deal, alice, deals[1]),
+            (repository.set_deal_status, alice, bob_deal, "Открыта"),
+            (repository.delete_deals, alice, [deals[2], bob_deal]),
+        ]
+        for operation, *args in operations:
+            async with self.session_factory() as session:
+                await operation(session, *args)
+                await session.commit()
+            with self.subTest(operation=operation.__name__, args=args):
+                self.assertEqual(await self.drift(), 0)
+
+    async def test_reconcile_finds_and_fixes_drift(self):
+        async with self.session_factory() as session:
+            user_id = await add_user(session, 1)
+            await add_task(session, user_id, "Выполнена", TASK_DONE)
+            await session.commit()
+            await session.execute(update(UserStats).values(tasks_done=5))
+            await session.commit()
+
+        with self.assertLogs("database.stats", "WARNING"):
+            self.assertEqual(await self.drift(), 1)
+            self.assertEqual(await self.drift(fix=True), 1)
+        self.assertEqual(await self.drift(), 0)
+
+    async def test_reconcile_covers_daily_rollup(self):
+        async with self.session_factory() as session:
+            user_id = await add_user(session, 1)
+            await add_task(session, user_id, "Выполнена", TASK_DONE)
+            await add_deal(session, user_id, "Закрыта", 300, DEAL_CLOSED)
+            await session.commit()
+            # дневные счётчики разошлись, итоги за всё время — нет
+            await session.execute(update(UserDailyStats).values(tasks_done=0, deals_closed_sum=1))
+            await session.commit()
+
+        with self.assertLogs("database.stats", "WARNING"):
+            self.assertEqual(await self.drift(fix=True), 1)
+        self.assertEqual(await self.drift(), 0)
+        async with self.session_factory() as session:
+            row = (await session.execute(select(UserDailyStats))).scalar_one()
+        self.assertEqual((row.tasks_created, row.tasks_done, row.deals_closed, row.deals_closed_sum), (1, 1, 1, 300))
+
+    async def test_rebuild_restores_missing_daily_rows(self):
+        async with self.session_factory() as session:
+            user_id = await add_user(session, 1)
+            await add_task(session, user_id, "Задача")
+            await session.commit()
+            await session.execute(delete(UserDailyStats))
+            await session.commit()
+
+        with self.assertLogs("database.stats", "WARNING"):
+            self.assertEqual(await self.drift(fix=True), 1)
+        self.assertEqual(await self.drift(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
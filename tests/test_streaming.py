@@ -0,0 +1,121 @@
+"""
+stream_to_message (services/streaming.py) на FakeStreamingClient:
+частота правок, разбиение длинного ответа и RetryAfter.
+
+Запуск:
+    python -m unittest discover -s tests -t .
+"""
+
+import time
+import unittest
+from typing import Callable, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText
+
+from services.fake_openai import FakeStreamingClient
+from services.streaming import MESSAGE_LIMIT, TYPING_CURSOR, split_text, stream_to_message
+
+
+class FakeMessage:
+    """
+    Сообщение aiogram в объёме, нужном stream_to_message: answer и edit_text.
+    answer возвращает само сообщение, поэтому answers[0] — плейсхолдер,
+    остальное — продолжения длинного ответа. retry_after(text, attempt)
+    решает, ответить ли на правку RetryAfter (число секунд) или принять её (None).
+    """
+
+    def __init__(self, retry_after: Optional[Callable[[str, int], Optional[int]]] = None):
+        self.retry_after = retry_after or (lambda text, attempt: None)
+        self.answers: List[str] = []
+        self.attempts: List[str] = []
+        self.edits: List[Tuple[float, str]] = []
+
+    async def answer(self, text: str) -> "FakeMessage":
+        self.answers.append(text)
+        return self
+
+    async def edit_text(self, text: str) -> None:
+        self.attempts.append(text)
+        retry_after = self.retry_after(text, self.attempts.count(text))
+        if retry_after is not None:
+            raise TelegramRetryAfter(EditMessageText(text=text), "Too Many Requests", retry_after)
+        self.edits.append((time.monotonic(), text))
+
+
+async def deltas(client: FakeStreamingClient):
+    """Куски текста из потокового ответа — как в services/chatgpt.py."""
+    stream = await client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": "Как поднять продажи?"}],
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+class StreamToMessageTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_edits_are_throttled(self):
+        client = FakeStreamingClient(text="слово " * 60, chunk_size=6, delay=0.005)
+        message = FakeMessage()
+        interval = 0.05
+
+        answer = await stream_to_message(message, deltas(client), interval=interval)
+
+        self.assertEqual(answer, client.text.strip())
+        *previews, final = message.edits
+        self.assertEqual(final[1], answer)
+        self.assertTrue(previews)
+        self.assertTrue(all(text.endswith(TYPING_CURSOR) for _, text in previews))
+        # 60 кусков за ~0.3 с, правка не чаще раза в interval
+        self.assertLess(len(previews), 60 // 3)
+        for (previous, _), (current, _) in zip(previews, previews[1:]):
+            self.assertGreaterEqual(current - previous, interval * 0.9)
+
+    async def test_long_answer_is_split(self):
+        client = FakeStreamingClient(text="строка ответа\n" * 700, chunk_size=500)
+        message = FakeMessage()
+
+        answer = await stream_to_message(message, deltas(client), header="💡 ", interval=0)
+
+        parts = split_text("💡 " + answer)
+        self.assertGreater(len(parts), 1)
+        self.assertTrue(all(len(text) <= MESSAGE_LIMIT for _, text in message.edits))
+        self.assertEqual(message.edits[-1][1], parts[0])
+        self.assertEqual(message.answers[1:], parts[1:])
+
+    async def test_final_edit_is_retried_after_retry_after(self):
+        client = FakeStreamingClient(text="Проведите летнюю акцию.", chunk_size=5)
+        message = FakeMessage(lambda text, attempt: 0 if text == client.text and attempt < 3 else None)
+
+        answer = await stream_to_message(message, deltas(client), interval=0, final_attempts=3)
+
+        self.assertEqual(message.attempts.count(answer), 3)
+        self.assertEqual(message.edits[-1][1], answer)
+
+    async def test_final_edit_attempts_are_bounded(self):
+        client = FakeStreamingClient(text="Проведите летнюю акцию.", chunk_size=5)
+        message = FakeMessage(lambda text, attempt: 0 if text == client.text else None)
+
+        answer = await stream_to_message(message, deltas(client), interval=0, final_attempts=3)
+
+        self.assertEqual(answer, client.text)
+        self.assertEqual(message.attempts.count(answer), 3)
+        self.assertNotEqual(message.edits[-1][1], answer)
+
+    async def test_intermediate_edit_is_skipped_after_retry_after(self):
+        client = FakeStreamingClient(text="слово " * 20, chunk_size=6, delay=0.01)
+        message = FakeMessage(lambda text, attempt: 1 if text.endswith(TYPING_CURSOR) else None)
+
+        answer = await stream_to_message(message, deltas(client), interval=0)
+
+        # после RetryAfter промежуточных правок нет до конца паузы (1 с > длины стрима)
+        previews = [text for text in message.attempts if text.endswith(TYPING_CURSOR)]
+        self.assertEqual(len(previews), 1)
+        self.assertEqual(message.edits[-1][1], answer)
+
+
+if __name__ == "__main__":
+    unittest.main()
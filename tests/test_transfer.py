@@ -0,0 +1,74 @@
+"""
+Импорт задач и сделок (handlers/transfer.py) на SQLite: проверка строк
+и отчёт об ошибках по номерам строк.
+
+Запуск:
+    python -m unittest discover -s tests -t .
+"""
+
+import io
+import unittest
+from unittest import mock
+
+from sqlalchemy import func, select
+
+from database.models import Deal, Task, User
+from handlers import transfer
+from handlers.transfer import RowError, import_rows, iter_csv, parse_row
+from tests.sqlite import create_session_factory
+
+CSV = """type,title,time,amount,status
+task,Позвонить клиенту,завтра 10:30,,
+deal,Поставка,,1500,
+deal,Квадрат,,²,
+deal,Дробная,,12.5,
+task,,18:00,,
+deal,Закрытая,,700,Закрыта
+"""
+
+
+class ParseRowTest(unittest.TestCase):
+
+    def test_amount_must_be_decimal_digits(self):
+        for amount in ("²", "12.5", "-3", "1e3", ""):
+            with self.subTest(amount=amount), self.assertRaises(RowError):
+                parse_row({"type": "deal", "title": "Сделка", "amount": amount})
+
+    def test_valid_deal(self):
+        self.assertEqual(parse_row({"title": "Сделка", "amount": "42"}), ("deal", ("Сделка", 42, "Открыта")))
+
+
+class ImportRowsTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine, self.session_factory = await create_session_factory()
+        async with self.session_factory() as session:
+            user = User(tg_id=1, username="tester")
+            session.add(user)
+            await session.commit()
+            self.user_id = user.id
+        patcher = mock.patch.object(transfer, "async_session", self.session_factory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_bad_rows_are_reported_and_skipped(self):
+        result = await import_rows(self.user_id, iter_csv(io.StringIO(CSV)))
+
+        self.assertEqual((result.tasks, result.deals), (1, 2))
+        self.assertEqual([line for line, _ in result.errors], [4, 5, 6])
+        self.assertIn("целым неотрицательным числом", result.errors[0][1])
+        self.assertIn("пустое название", result.errors[2][1])
+        self.assertIn("line,error", result.error_report().decode("utf-8-sig"))
+
+        async with self.session_factory() as session:
+            tasks = await session.scalar(select(func.count()).select_from(Task))
+            amounts = (await session.scalars(select(Deal.amount).order_by(Deal.id))).all()
+        self.assertEqual(tasks, 1)
+        self.assertEqual(amounts, [1500, 700])
+
+
+if __name__ == "__main__":
+    unittest.main()
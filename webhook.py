@@ -0,0 +1,132 @@
+"""
+Режим webhook: aiohttp-сервер принимает апдейты от Telegram.
+
+В отличие от long polling, несколько реплик бота могут стоять за одним
+балансировщиком. Апдейт обрабатывается в фоне — Telegram получает ответ 200
+сразу, а хендлеры продолжают работу.
+
+Эндпоинты:
+    POST {WEBHOOK_PATH}  — апдейты (проверяется X-Telegram-Bot-Api-Secret-Token)
+    GET  /healthz        — проверка живости для балансировщика
+"""
+
+import signal
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import (
+    WEBHOOK_BASE_URL,
+    WEBHOOK_DRAIN_TIMEOUT,
+    WEBHOOK_HOST,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    Перед закрытием сессии бота дожидается апдейтов, которые уже приняты
+    и обрабатываются в фоне, — чтобы рестарт не обрывал ответы пользователям.
+    """
+
+    def __init__(self, *args, drain_timeout: float = WEBHOOK_DRAIN_TIMEOUT, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drain_timeout = drain_timeout
+
+    @property
+    def pending(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def close(self) -> None:
+        tasks = set(self._background_feed_update_tasks)
+        if tasks:
+            logger.info("Ждём завершения %s апдейтов перед остановкой...", len(tasks))
+            _, not_done = await asyncio.wait(tasks, timeout=self.drain_timeout)
+            if not_done:
+                logger.warning("Не дождались %s апдейтов — останавливаемся.", len(not_done))
+        await super().close()
+
+
+def validate_webhook_config() -> None:
+    """
+    Проверяет настройки webhook-режима. Бросает ValueError с понятным текстом.
+    """
+    if not WEBHOOK_BASE_URL.startswith("https://"):
+        raise ValueError("WEBHOOK_BASE_URL должен быть публичным https:// адресом бота.")
+    if not WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_SECRET пуст — без него любой сможет слать боту поддельные апдейты.")
+
+
+def build_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """
+    Собирает aiohttp-приложение: webhook, /healthz и жизненный цикл диспетчера.
+    """
+    app = web.Application()
+    app["shutting_down"] = False
+
+    handler = DrainingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=True,
+    )
+
+    async def healthz(request: web.Request) -> web.Response:
+        # Во время остановки отвечаем 503, чтобы балансировщик снял трафик
+        if request.app["shutting_down"]:
+            return web.json_response({"status": "stopping"}, status=503)
+        return web.json_response({"status": "ok", "pending_updates": handler.pending})
+
+    async def mark_shutting_down(app: web.Application) -> None:
+        app["shutting_down"] = True
+
+    async def set_webhook(bot: Bot) -> None:
+        # Идемпотентно: все реплики регистрируют один и тот же адрес
+        await bot.set_webhook(
+            url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info("Webhook зарегистрирован: %s%s", WEBHOOK_BASE_URL, WEBHOOK_PATH)
+
+    app.on_shutdown.append(mark_shutting_down)
+    app.router.add_get("/healthz", healthz)
+    handler.register(app, path=WEBHOOK_PATH)
+    dp.startup.register(set_webhook)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """
+    Запускает webhook-сервер и работает до SIGINT/SIGTERM,
+    после чего корректно останавливается.
+    """
+    validate_webhook_config()
+    app = build_app(dp, bot)
+    runner = web.AppRunner(app, shutdown_timeout=WEBHOOK_DRAIN_TIMEOUT)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info("🌐 Webhook-сервер слушает %s:%s", WEBHOOK_HOST, WEBHOOK_PORT)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C придёт как KeyboardInterrupt
+            pass
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Остановка webhook-сервера...")
+        await runner.cleanup()